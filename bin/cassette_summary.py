@@ -0,0 +1,38 @@
+#!/usr/bin/python
+
+import sys
+
+from nifiapi import cassette
+from nifiapi.table import format_table
+
+##
+# Print request counts and timings of one or more cassettes recorded with deploy_template.py --record, side by side,
+# so runs of different versions can be compared.
+#
+# Usage:
+# cassette_summary before.cassette after.cassette
+##
+
+
+def main():
+    if len(sys.argv) < 2:
+        print("Usage: cassette_summary file [file ...]")
+        sys.exit(2)
+
+    summaries = [cassette.summarize(filename) for filename in sys.argv[1:]]
+    rows = [("", [filename for filename in sys.argv[1:]]),
+            ("requests", [str(s["requests"]) for s in summaries]),
+            ("wall time (s)", ["{:.2f}".format(s["wall_time"]) for s in summaries]),
+            ("request time (s)", ["{:.2f}".format(s["request_time"]) for s in summaries])]
+    classes = sorted(set(c for s in summaries for c in s["classes"]))
+    for endpoint_class in classes:
+        stats = [s["classes"].get(endpoint_class, {"requests": 0, "request_time": 0.0}) for s in summaries]
+        rows.append(("{} requests".format(endpoint_class), [str(st["requests"]) for st in stats]))
+        rows.append(("{} time (s)".format(endpoint_class), ["{:.2f}".format(st["request_time"]) for st in stats]))
+
+    print(format_table(rows))
+
+
+##############################
+if __name__ == "__main__":
+    main()
@@ -4,11 +4,26 @@ import getopt
 import logging
 import logging.config
 import sys
-import json
 import configparser
+import hashlib
+import os
 import random
+import tempfile
+import time
 
+from nifiapi.auth import auth_from_options
+from nifiapi import backup
+from nifiapi.bulletins import BulletinWatcher
+from nifiapi import guard
+from nifiapi.journal import DeployJournal
+from nifiapi.model import revision_version
 from nifiapi.nifiapi import NifiApi
+from nifiapi import overlay
+from nifiapi import preflight
+from nifiapi.plan import DeployPlan, PlanExecutor, PlanError
+from nifiapi.trace import Tracer
+from nifiapi.tree import status_snapshots
+from nifiapi.walker import WalkError
 
 logging.config.fileConfig("config/logging.conf")
 logger = logging.getLogger(__name__)
@@ -20,6 +35,9 @@ logger = logging.getLogger(__name__)
 # Usage:
 # deploy_template -u http://localhost:8080/nifi-api -t /path/to/template.xml --start
 #
+# For a cluster, -u takes a comma separated list of node urls: reads are spread across the nodes and mutations go to
+# the first healthy one.
+#
 # At a high level this is what this script will do:
 # * Load the template XML file
 # * Stop existing process group processors
@@ -31,10 +49,65 @@ logger = logging.getLogger(__name__)
 # * Modify processors that have sensitive properties
 # * Start all processors
 # * Start all input/output ports
+#
+# These steps are compiled into a DAG of operations (see build_deploy_plan) and steps that don't depend on each
+# other run in parallel, e.g. the old template is replaced while the queues of the old process group drain.
+# --plan prints the DAG and its critical path without touching the server. --workers sets how many operations may
+# run at the same time (default 4).
+#
+# For secured clusters pass --user (password from NIFI_PASSWORD or prompted) or --kerberos. The access token is
+# cached in ~/.nifiapi/tokens.json and shared by all the scripts until it is about to expire.
+#
+# --record FILE writes every request and response (sensitive values redacted) to a cassette. --replay FILE runs the
+# deploy offline against a cassette, with the recorded latencies scaled by --replay-speed (0 for no delay). Compare
+# cassettes with bin/cassette_summary.py.
+#
+# Non-sensitive properties from the sensitive config are written into the template XML before it is uploaded, so
+# only properties the template marks as sensitive are set with PUTs afterwards. --no-overlay disables this.
+#
+# Every operation that completes is written to a journal (--journal, default deploy.journal) together with the ids it
+# produced. If a deploy dies midway, rerun it with --resume: journaled operations are verified against the server
+# (the uploaded template and new process group still exist, the old one is gone, ...) and skipped, and the deploy
+# continues from the first operation that didn't complete. The journal is deleted once a deploy succeeds.
+#
+# --trace FILE times every operation and the phases within it (stop, drain, sensitive config, controller updates,
+# start, ...) per process group, writes them to FILE in the Chrome trace event format (open it in chrome://tracing or
+# https://ui.perfetto.dev) and logs the slowest phases and process groups. Compare traces with bin/trace_summary.py.
+#
+# Before the existing process group is deleted it is backed up to --backup-dir (default backups) as a gzipped
+# template, while its queues drain. Roll back with bin/restore_backup.py. --no-backup skips the backup.
+#
+# --guard SECONDS (with --start) samples the throughput, backlog and error bulletins of the existing process group
+# before it is stopped, and of the new one for SECONDS after it started (every --guard-interval seconds, default 30).
+# If the new flow falls behind, i.e. its flowfiles out per second drop below --min-throughput (default 0.8) times the
+# old rate, its backlog exceeds --max-queued (default 2.0) times the old backlog plus 1000 flowfiles, or it raises
+# more than --max-errors (default 0) error bulletins on top of the old error rate, it is rolled back to the backup
+# and the deploy fails. The before and after numbers are logged either way.
+#
+# Stopped processors finish the task they are running, and one stuck in I/O would keep the old process group from
+# being removed. Their active threads are polled for up to --stop-deadline seconds (default 60) and then terminated,
+# on servers that support it. Processors that had to be forced are logged.
+#
+# Before anything on the server is touched the template is validated locally in one streaming pass (see
+# nifiapi/preflight.py): duplicate ids, connections to components that aren't in the template, references to
+# controller services that aren't in the template, and required sensitive properties that neither the template nor the
+# sensitive config set fail the deploy. Sensitive config sections and properties that match nothing in the template
+# are logged as warnings. --no-preflight logs the errors but deploys anyway.
+#
+# While the deploy runs the bulletin board is polled every --watch-interval seconds (default 2, 0 disables it) for
+# new bulletins from the components of the new process group, and they are logged as they come in. With
+# --abort-on-error the first ERROR bulletin aborts the deploy: no further operations are started, so no time is spent
+# configuring or starting a flow that is already failing. Fix the cause and rerun with --resume.
 ##
 def main():
     try:
-        opts, args = getopt.getopt(sys.argv[1:], "u:t:", ['start', 'sensitive='])
+        opts, args = getopt.getopt(sys.argv[1:], "u:t:", ['start', 'sensitive=', 'plan', 'workers=', 'user=',
+                                                          'kerberos', 'record=', 'replay=', 'replay-speed=',
+                                                          'no-overlay', 'journal=', 'resume', 'trace=',
+                                                          'backup-dir=', 'no-backup', 'guard=', 'guard-interval=',
+                                                          'min-throughput=', 'max-queued=', 'max-errors=',
+                                                          'stop-deadline=', 'no-preflight', 'watch-interval=',
+                                                          'abort-on-error'])
     except getopt.GetoptError as e:
         logger.error(str(e))
         sys.exit(2)
@@ -43,6 +116,25 @@ def main():
     template = None
     url = None
     sensitive_file = "config/sensitive.cfg"
+    show_plan = False
+    workers = 4
+    user = None
+    kerberos = False
+    record_file = None
+    replay_file = None
+    replay_speed = 1.0
+    overlay_properties = True
+    journal_file = "deploy.journal"
+    resume = False
+    trace_file = None
+    backup_dir = "backups"
+    guard_window = None
+    guard_interval = 30.0
+    thresholds = guard.Thresholds()
+    stop_deadline = 60.0
+    check = True
+    watch_interval = 2.0
+    abort_on_error = False
     for opt, arg in opts:
         if opt == "-u":
             url = arg
@@ -52,147 +144,422 @@ def main():
             start = True
         elif opt == "--sensitive":
             sensitive_file = arg
+        elif opt == "--plan":
+            show_plan = True
+        elif opt == "--workers":
+            workers = int(arg)
+        elif opt == "--user":
+            user = arg
+        elif opt == "--kerberos":
+            kerberos = True
+        elif opt == "--record":
+            record_file = arg
+        elif opt == "--replay":
+            replay_file = arg
+        elif opt == "--replay-speed":
+            replay_speed = float(arg)
+        elif opt == "--no-overlay":
+            overlay_properties = False
+        elif opt == "--journal":
+            journal_file = arg
+        elif opt == "--resume":
+            resume = True
+        elif opt == "--trace":
+            trace_file = arg
+        elif opt == "--backup-dir":
+            backup_dir = arg
+        elif opt == "--no-backup":
+            backup_dir = None
+        elif opt == "--guard":
+            guard_window = float(arg)
+        elif opt == "--guard-interval":
+            guard_interval = float(arg)
+        elif opt == "--min-throughput":
+            thresholds.min_throughput = float(arg)
+        elif opt == "--max-queued":
+            thresholds.max_queued = float(arg)
+        elif opt == "--max-errors":
+            thresholds.max_errors = int(arg)
+        elif opt == "--stop-deadline":
+            stop_deadline = float(arg)
+        elif opt == "--no-preflight":
+            check = False
+        elif opt == "--watch-interval":
+            watch_interval = float(arg)
+        elif opt == "--abort-on-error":
+            abort_on_error = True
         else:
             sys.exit(2)
 
-    nifiapi = NifiApi(url)
+    if guard_window is not None and not start:
+        print("--guard requires --start.")
+        sys.exit(2)
 
-    config = configparser.RawConfigParser()
-    config.optionxform = str  # Preserve case
+    started = time.time()
+    logger.info("Validating template {}".format(template))
+    info = validate_template(template, sensitive_file)
+    if not info.name or not info.process_group_name or (check and info.errors):
+        logger.error("Template {} failed preflight, nothing was changed.".format(template))
+        sys.exit(3)
+    templ_name = info.name
+    pg_name = info.process_group_name
+    logger.debug('Will look for template name: {}'.format(templ_name))
 
-    root_process_group = nifiapi.get_root_process_group()
-    if root_process_group is None:
-        logger.error("Could not get the root process group!")
-        exit()
+    tracer = Tracer() if trace_file is not None else None
+    nifiapi = NifiApi(url, auth=auth_from_options(user, kerberos), tracer=tracer)
+    if replay_file is not None:
+        logger.info("Replaying responses from {}".format(replay_file))
+        nifiapi.replay(replay_file, replay_speed)
+    elif record_file is not None:
+        logger.info("Recording requests to {}".format(record_file))
+        nifiapi.record(record_file, sensitive_property_names(sensitive_file))
 
-    root_process_group_id = root_process_group["processGroupFlow"]["id"]
-    logger.info("Root process group id: {}".format(root_process_group_id))
+    plan = build_deploy_plan(nifiapi, template, templ_name, pg_name, sensitive_file, start, overlay_properties,
+                             backup_dir, guard_window, thresholds, guard_interval, stop_deadline)
+    if show_plan:
+        print(plan.describe())
+        return
 
-    logger.info("Loading template from file {}".format(template))
-    root = nifiapi.load_template_from_file(template)
+    journal = DeployJournal(journal_file, journal_key(nifiapi, template, overlay_properties), resume)
+    executor = PlanExecutor(plan, workers, journal, tracer)
+    watcher = None
+    # A replayed deploy has no live bulletin board to watch.
+    if watch_interval > 0 and replay_file is None:
+        watcher = BulletinWatcher(nifiapi, lambda: plan.result('instantiate_template'), watch_interval)
+        if abort_on_error:
+            watcher.on_error = lambda entity: executor.abort("{} raised an error bulletin".format(
+                (entity.get("bulletin") or {}).get("sourceName") or entity.get("sourceId")))
+        watcher.start()
+    success = executor.run()
+    if watcher is not None:
+        errors = watcher.stop()
+        if errors:
+            logger.warning("The new process group raised {} error bulletins during the deploy.".format(len(errors)))
+            success = success and not abort_on_error
+    nifiapi.session.close()
+    if tracer is not None:
+        tracer.export(trace_file)
+        logger.info("Wrote trace to {}\n{}".format(trace_file, tracer.summary()))
+    if not success:
+        journal.close()
+        logger.error("Deploy failed. Rerun with --resume to continue from journal {}.".format(journal_file))
+        sys.exit(3)
+    journal.remove()
 
-    templ_name_elem = root.find('name')
-    templ_name = templ_name_elem.text
-    pg_name_elem = root.find('snippet/processGroups/name')
-    pg_name = pg_name_elem.text
-    logger.debug('Will look for template name: {}'.format(templ_name))
+    path, total = plan.critical_path()
+    logger.info("Critical path {:.2f}s: {}".format(total, " -> ".join(op.name for op in path)))
+    logger.info("Requests: {}".format(nifiapi.governor.describe()))
+    logger.info("Done in {:.2f}s".format(time.time() - started))
+
+
+def build_deploy_plan(nifiapi, template, templ_name, pg_name, sensitive_file, start, overlay_properties=True,
+                      backup_dir=None, guard_window=None, thresholds=None, guard_interval=30.0, stop_deadline=None):
+    """
+    Compile a deploy into a DAG of API operations.
+    :param nifiapi: NifiApi instance
+    :param template: filename of the XML template
+    :param templ_name: name of the template
+    :param pg_name: name of the process group the template contains
+    :param sensitive_file: config file with the sensitive properties
+    :param start: True to start all processors once everything is configured
+    :param overlay_properties: write non-sensitive properties into the template before uploading it
+    :param backup_dir: directory to back the existing process group up to before it is removed, None for no backup
+    :param guard_window: seconds to watch the started flow for regressions, None for no guard. Needs start.
+    :param thresholds: guard.Thresholds the new flow is held to
+    :param guard_interval: seconds between the samples of the guard
+    :param stop_deadline: seconds to wait for the stopped processors to finish their threads before terminating them,
+    None to not wait
+    :return: DeployPlan
+    """
+    plan = DeployPlan()
+    # Controller services already updated. Groups are configured concurrently and may share parent-scoped services.
+    configured = set()
+
+    def overlay_template():
+        # Write the non-sensitive environment properties straight into the template, so the flow arrives configured
+        # and only truly sensitive properties need a PUT after instantiation.
+        if not overlay_properties:
+            return template, None
+        config = configparser.RawConfigParser()
+        config.optionxform = str  # Preserve case
+        config.read(sensitive_file)
+        fd, overlaid = tempfile.mkstemp(suffix='.xml')
+        os.close(fd)
+        applied = overlay.overlay_template(template, overlaid, config)
+        logger.info("Wrote {} processor and {} controller service properties into the template".format(
+            sum(len(names) for names in applied[overlay.PROCESSORS].values()),
+            sum(len(names) for names in applied[overlay.CONTROLLER_SERVICES].values())))
+        return overlaid, applied
 
-    # Remove the process group from the canvas.
-    pg = nifiapi.find_process_group(pg_name)
-    if pg is None:
-        logger.info("Could not find existing process group.")
-    else:
-        logger.info('Process group found. Id {}'.format(pg['id']))
-        flow_pg = nifiapi.get_process_group_by_id(pg['id'])
+    def get_root_process_group():
+        root_process_group = nifiapi.get_root_process_group()
+        if root_process_group is None:
+            raise PlanError("Could not get the root process group!")
+        root_process_group_id = root_process_group["processGroupFlow"]["id"]
+        logger.info("Root process group id: {}".format(root_process_group_id))
+        return root_process_group_id
 
+    def find_process_group():
+        pg = nifiapi.find_process_group(pg_name)
+        if pg is None:
+            logger.info("Could not find existing process group.")
+        else:
+            logger.info('Process group found. Id {}'.format(pg['id']))
+        return pg
+
+    def process_group_current(pg):
+        # Later operations send the journaled group, with its revision, so only reuse it while it is current.
+        if pg is None:
+            return nifiapi.find_process_group(pg_name) is None
+        if nifiapi.process_group_exists(pg['id']) is not True:
+            return False
+        current = nifiapi.remote_get('/process-groups/', pg['id'])
+        return current is not None and revision_version(current) == revision_version(pg)
+
+    def sample_baseline():
+        pg = plan.result('find_process_group')
+        before = guard.baseline(nifiapi, pg['id'] if pg is not None else None)
+        if before is None:
+            raise PlanError("Could not sample the existing process group for the guard!")
+        return before
+
+    def stop_process_group():
+        pg = plan.result('find_process_group')
+        if pg is None:
+            return None
+        flow_pg = nifiapi.get_process_group_model(pg['id'])
         # First stop all processors. We need to call the /flow/process-group/id endpoint to get this info
         logger.info('Changing status on all processors to {}'.format(nifiapi.PROCESSOR_STOPPED))
-        nifiapi.status_change_all_processors(flow_pg, nifiapi.PROCESSOR_STOPPED, nifiapi.CONTROLLER_DISABLED)
+        forced = []
+        if not nifiapi.status_change_all_processors(flow_pg, nifiapi.PROCESSOR_STOPPED, nifiapi.CONTROLLER_DISABLED,
+                                                    deadline=stop_deadline, forced=forced):
+            raise PlanError("Stopping process group {} failed! Not removing it.".format(pg_name))
+        # The processors whose threads had to be terminated stay in the result, and in the journal.
+        return {'group': flow_pg, 'forced': forced}
 
+    def process_group_stopped(stopped):
+        if stopped is None:
+            return True
+        status = nifiapi.get_process_group_status(stopped['group'], recursive=True)
+        if status is None:
+            return False
+        for snapshot, parent, path, depth in status_snapshots(status):
+            for processor in snapshot.get('processorStatusSnapshots') or []:
+                processor = processor['processorStatusSnapshot']
+                if processor.get('runStatus', '').upper() == nifiapi.PROCESSOR_RUNNING or \
+                        processor.get('activeThreadCount', 0) > 0:
+                    return False
+        return True
+
+    def empty_queues():
+        stopped = plan.result('stop_process_group')
+        if stopped is None:
+            return
+        # Either the ProcessGroup stopped above or, when resumed from the journal, its id.
+        flow_pg = stopped['group']
         # Make sure all connection queues are empty
         logger.info('Empying all queues')
-        nifiapi.empty_all_queues(flow_pg)
+        try:
+            nifiapi.empty_all_queues(flow_pg)
+        except WalkError as e:
+            raise PlanError(str(e))
+
+    def backup_process_group():
+        pg = plan.result('find_process_group')
+        if pg is None or backup_dir is None:
+            return None
+        entry = backup.backup_process_group(nifiapi, pg, backup_dir)
+        if entry is None:
+            raise PlanError("Backing up the process group failed! Not removing it.")
+        return entry
 
+    def backup_written(entry):
+        return entry is None or backup.verify_backup(backup_dir, entry)
+
+    def remove_process_group():
+        pg = plan.result('find_process_group')
+        if pg is None:
+            return
         # Now try to remove the process group
         logger.info('Attempting removal of process group')
-        response = nifiapi.remove_process_group(pg)
-        if response is None:
-            logger.error('Removing the process group failed!')
-            sys.exit(3)
-        else:
-            logger.info('Remove process group succeeded. Now will try to import from template.')
+        if nifiapi.remove_process_group(pg) is None:
+            raise PlanError('Removing the process group failed!')
+        logger.info('Remove process group succeeded.')
 
-    # Remove existing template with same name/id and upload the new one
-    template_entity = nifiapi.remove_and_upload_template(root_process_group_id, template, templ_name)
-    if template_entity is None:
-        logger.error("remove and upload returned None.")
-        sys.exit(3)
-    template_id = template_entity.find('template/id').text
-    logger.info('Template upload succeeded. Entity {}'.format(template_id))
-
-    # Now instantiate (add to the canvas) the new template.
-    x = random.uniform(0, 200)
-    y = random.uniform(0, 200)
-    response = nifiapi.do_instantiate_template(root_process_group_id, template_id, x, y)
-    if response is None:
-        logger.error("Instantiate template failed!")
-        sys.exit(3)
-    # logger.debug("{}".format(json.dumps(response)))
-    logger.info("Template instantiated. Configuring controller services...")
+    def process_group_removed(result):
+        pg = plan.result('find_process_group')
+        return pg is None or nifiapi.process_group_exists(pg['id']) is False
 
-    # Grab the ProcessGroup by it's id.
-    new_pg_id = response["flow"]["processGroups"][0]["component"]["id"]
-    new_pg = nifiapi.get_process_group_by_id(new_pg_id)
-    logger.debug(json.dumps(new_pg))
+    def template_uploaded(template_id):
+        remote_template = nifiapi.get_remote_template(templ_name)
+        return remote_template is not None and remote_template['id'] == template_id
 
-    # recursively go through nested process groups and perform actions
-    # like write sensitive properties and update controllers
-    recurse_process_groups(new_pg, config, sensitive_file, nifiapi)
+    def remove_overlay():
+        # upload_template removes the overlaid template, unless the upload was resumed from the journal.
+        upload_file = plan.result('overlay_template')[0]
+        if upload_file != template and os.path.exists(upload_file):
+            os.remove(upload_file)
 
-    if start:
+    def remove_template():
+        # Remove existing template with same name/id. Nothing on the canvas references it once instantiated.
+        nifiapi.remove_template_by_name(templ_name)
+
+    def upload_template():
+        upload_file = plan.result('overlay_template')[0]
+        try:
+            template_entity = nifiapi.upload_template_entity(plan.result('root_process_group'), upload_file)
+        finally:
+            if upload_file != template:
+                os.remove(upload_file)
+        if template_entity is None:
+            raise PlanError("Template upload failed.")
+        template_id = template_entity.find('template/id').text
+        logger.info('Template upload succeeded. Entity {}'.format(template_id))
+        return template_id
+
+    def instantiate_template():
+        # Now instantiate (add to the canvas) the new template.
+        x = random.uniform(0, 200)
+        y = random.uniform(0, 200)
+        response = nifiapi.do_instantiate_template(plan.result('root_process_group'),
+                                                   plan.result('upload_template'), x, y)
+        if response is None:
+            raise PlanError("Instantiate template failed!")
+        logger.info("Template instantiated. Configuring controller services...")
+        return response["flow"]["processGroups"][0]["component"]["id"]
+
+    def configure():
+        # Write sensitive properties and update controllers for every process group. The tree is walked lazily and
+        # each group becomes its own operation, so groups are configured concurrently while the walk continues.
+        applied = plan.result('overlay_template')[1]
+        try:
+            for pg in nifiapi.walk_process_groups(plan.result('instantiate_template'), strict=True):
+                plan.add('configure:{}'.format(pg.id),
+                         lambda pg_id=pg.id, pg_name=pg.name: configure_process_group(pg_id, pg_name, applied),
+                         depends_on=['instantiate_template'], required_by=['configured'])
+        except WalkError as e:
+            raise PlanError(str(e))
+
+    def configure_process_group(pg_id, pg_name, applied):
+        with nifiapi.tracer.span("sensitive_config", group=pg_name, id=pg_id):
+            if not nifiapi.write_sensitive_properties(pg_id, sensitive_file, applied, configured):
+                raise PlanError("Configuring process group {} ({}) failed!".format(pg_name, pg_id))
+
+    def start_process_group():
         logger.info("Now starting all processor and ports.")
         # refetch the process group in case any of the processors were modified we will need the new revision version.
-        pg = nifiapi.get_process_group_by_id(new_pg_id)
-        nifiapi.status_change_all_processors(pg, nifiapi.PROCESSOR_RUNNING, nifiapi.CONTROLLER_ENABLED)
-    logger.info("Done")
-
-
-def recurse_process_groups(flow_pg, config, sensitive_file, nifiapi):
-    flow_pg_id = flow_pg["processGroupFlow"]["id"]
-    nifiapi.write_sensitive_properties(flow_pg_id, sensitive_file)
-    for pg in flow_pg["processGroupFlow"]["flow"]["processGroups"]:
-        new_flow_pg = nifiapi.get_process_group_by_id(pg["component"]["id"])
-        recurse_process_groups(new_flow_pg, config, sensitive_file, nifiapi)
-
-def update_controllers(pg_id, config, nifiapi):
-    controller_services = nifiapi.get_controller_services(pg_id)
-    for controller in controller_services:
-        controller_name = controller["component"]["name"]
-        logging.debug("updating controller {}".format(controller_name))
-        controller_file_name = controller_name.replace(" ", '_')
-        data = config.read("config/controller/{}.cfg".format(controller_file_name))
-        if len(data) == 0:
-            logging.error("Could not read controller config file {}".format(controller_file_name))
-            return
-        controller_obj = {
-            "component": {
-                "id": controller["component"]["id"],
-                "properties": {
-
-                }
-            },
-            "revision": {
-                "version": controller["revision"]["version"]
-            }
-        }
-        for name, value in config.items(controller_name):
-            if not name.startswith("_"):
-                controller_obj["component"]["properties"][name] = value
-        logging.debug("{}".format(controller_obj))
-        controller_rtn = nifiapi.update_controller_service(controller_obj)
-
-        if controller_rtn is None:
-            logger.error("There was an error updating the controller: {}".format(controller_name))
+        pg = nifiapi.get_process_group_model(plan.result('instantiate_template'))
+        if not nifiapi.status_change_all_processors(pg, nifiapi.PROCESSOR_RUNNING, nifiapi.CONTROLLER_ENABLED):
+            raise PlanError("Starting the process group failed!")
+
+    def guard_process_group():
+        pg_id = plan.result('instantiate_template')
+        after, deltas = guard.watch(nifiapi, pg_id, plan.result('baseline'), thresholds, guard_window, guard_interval)
+        if deltas is None:
+            logger.error("Could not sample the new process group.")
+        else:
+            logger.info("Guard after {:.0f}s:\n{}".format(after["elapsed"], guard.format_deltas(deltas)))
+        if not guard.regressed(deltas):
+            return deltas
+        entry = plan.result('backup_process_group')
+        if entry is None:
+            raise PlanError("The new flow regressed and there is no backup to roll back to!")
+        logger.warning("The new flow regressed. Rolling back to backup {}".format(entry["id"]))
+        if backup.replace_with_backup(nifiapi, backup_dir, entry, pg_id, start=True,
+                                      sensitive_file=sensitive_file) is None:
+            raise PlanError("Rolling back to backup {} failed!".format(entry["id"]))
+        raise PlanError("The new flow regressed. Rolled back to backup {} of {}.".format(entry["id"], entry["name"]))
+
+    plan.add('root_process_group', get_root_process_group,
+             description="GET /flow/process-groups/root")
+    plan.add('find_process_group', find_process_group, verify=process_group_current,
+             description="search for existing process group {}".format(pg_name))
+    guarded = start and guard_window is not None
+    if guarded:
+        plan.add('baseline', sample_baseline, depends_on=['find_process_group'],
+                 description="sample throughput, backlog and errors of the existing process group")
+    plan.add('stop_process_group', stop_process_group,
+             depends_on=['find_process_group', 'baseline'] if guarded else ['find_process_group'], cost=2.0,
+             verify=process_group_stopped, description="stop processors, disable controllers")
+    plan.add('empty_queues', empty_queues, depends_on=['stop_process_group'], cost=5.0,
+             description="drop flowfiles from all connection queues")
+    plan.add('backup_process_group', backup_process_group, depends_on=['find_process_group'], cost=3.0,
+             verify=backup_written, description="stream a template of the existing process group to {}".format(
+                 backup_dir))
+    plan.add('remove_process_group', remove_process_group, depends_on=['empty_queues', 'backup_process_group'],
+             verify=process_group_removed, description="DELETE existing process group")
+    plan.add('remove_template', remove_template,
+             description="DELETE existing template {}".format(templ_name))
+    plan.add('overlay_template', overlay_template, checkpoint=False,
+             description="write non-sensitive properties into the template")
+    plan.add('upload_template', upload_template,
+             depends_on=['root_process_group', 'remove_template', 'overlay_template'], cost=2.0,
+             verify=template_uploaded, description="upload {}".format(template))
+    plan.add('remove_overlay', remove_overlay, depends_on=['upload_template'], cost=0.0, checkpoint=False,
+             description="remove the overlaid template file")
+    plan.add('instantiate_template', instantiate_template, depends_on=['upload_template', 'remove_process_group'],
+             cost=2.0, verify=lambda pg_id: nifiapi.process_group_exists(pg_id) is True,
+             description="add template to the canvas")
+    plan.add('configure', configure, depends_on=['instantiate_template'], checkpoint=False,
+             description="sensitive properties and controllers; expands per nested process group")
+    plan.add('configured', lambda: None, depends_on=['configure'], cost=0.0, checkpoint=False,
+             description="all process groups configured")
+    if start:
+        plan.add('start', start_process_group, depends_on=['configured'], cost=2.0,
+                 description="start processors and ports, enable controllers")
+    if guarded:
+        plan.add('guard', guard_process_group, depends_on=['start'], cost=guard_window, checkpoint=False,
+                 description="watch the new flow for {:.0f}s, roll back if it regressed".format(guard_window))
+    return plan
+
+
+def journal_key(nifiapi, template, overlay_properties):
+    """
+    Identifies a deploy, so a journal is only resumed by the same deploy of the same template to the same server.
+    :return: dict
+    """
+    digest = hashlib.sha1()
+    with open(template, 'rb') as f:
+        for chunk in iter(lambda: f.read(65536), b''):
+            digest.update(chunk)
+    return {'url': nifiapi.url, 'template': os.path.abspath(template), 'sha1': digest.hexdigest(),
+            'overlay': overlay_properties}
+
+
+def validate_template(template, sensitive_file):
+    """
+    Run the preflight checks and log what they found.
+    :param template: template XML file
+    :param sensitive_file: config file with the sensitive properties. Its checks are skipped if it can't be read.
+    :return: preflight.TemplateInfo
+    """
+    config = configparser.RawConfigParser()
+    config.optionxform = str  # Preserve case
+    if not config.read(sensitive_file):
+        logger.warning("Could not read {}, its properties aren't checked against the template".format(sensitive_file))
+        config = None
+    info = preflight.validate_template(template, config)
+    for problem in info.problems:
+        if problem.level == preflight.ERROR:
+            logger.error(problem.message)
         else:
-            # Services like the DistributedMapCacheClientService require a global service to be running
-            # Check for that in the config and create/start if necessary.
-            required_service = None
-            if config.has_option(controller_name, "_requires_service"):
-                required_service = config.get(controller_name, "_requires_service")
-            if required_service is not None:
-                config.read("config/controller/{}.cfg".format(required_service))
-                if not nifiapi.controller_exists(None, required_service):
-                    required_svc_rtn = \
-                        nifiapi.create_controller_service(name=required_service,
-                                                          properties=config.items(required_service))
-                    if required_svc_rtn is None:
-                        logger.error("ERROR Creating required service! {}".format(required_service))
-                    else:
-                        logger.info("Required service created {}/{}".format(required_service,
-                                                                            json.dumps(required_svc_rtn)))
-                        nifiapi.update_controller_status(required_svc_rtn, nifiapi.CONTROLLER_ENABLED())
-            # We need to (UNFORTUNATELY) update the state separately from the properties.
-            nifiapi.update_controller_status(controller_rtn, nifiapi.CONTROLLER_ENABLED())
+            logger.warning(problem.message)
+    return info
+
+
+def sensitive_property_names(sensitive_file):
+    """
+    All property names set from the sensitive config. Their values are redacted from recordings.
+    :param sensitive_file: config file with the sensitive properties
+    :return: set of property names
+    """
+    config = configparser.RawConfigParser()
+    config.optionxform = str  # Preserve case
+    config.read(sensitive_file)
+    names = set()
+    for section in config.sections():
+        names.update(config.options(section))
+    return names
 
 
 ##############################
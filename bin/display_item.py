@@ -7,15 +7,30 @@ import json
 
 ##
 # This script is used to just display the json for a given process group name and processor name.
+#
+# It can also query a local snapshot of the whole flow, which answers in milliseconds without touching the cluster:
+#
+# display_item -u http://localhost:8080/nifi-api --refresh
+# display_item --type PutSlack --property 'channel=nifi-*'
+# display_item --kind controller-service --name '*Cache*' --group '/Ingest/*' --show-properties
+#
+# --refresh re-exports the snapshot from the live flow (to --snapshot, default nifi_snapshot.db). All filters are
+# globs. --property NAME=VALUE can be repeated; --property NAME only requires the property to be set.
 ##
+from nifiapi.auth import auth_from_options
 from nifiapi.nifiapi import NifiApi
+from nifiapi import snapshot
 
 logger = logging.getLogger(__name__)
 
+DEFAULT_SNAPSHOT = "nifi_snapshot.db"
+
 
 def main():
     try:
-        opts, args = getopt.getopt(sys.argv[1:], "u:", ['kv=', 'process-group=', 'processor='])
+        opts, args = getopt.getopt(sys.argv[1:], "u:", ['kv=', 'process-group=', 'processor=', 'user=', 'kerberos',
+                                                        'snapshot=', 'refresh', 'name=', 'type=', 'property=',
+                                                        'group=', 'kind=', 'show-properties'])
     except getopt.GetoptError as e:
         logger.error(str(e))
         sys.exit(2)
@@ -23,6 +38,16 @@ def main():
     url = None
     processor_name = None
     process_group_name = None
+    user = None
+    kerberos = False
+    snapshot_file = None
+    refresh = False
+    name = None
+    type = None
+    properties = []
+    group = None
+    kind = snapshot.PROCESSOR
+    show_properties = False
 
     for opt, arg in opts:
         if opt == "--processor":
@@ -31,8 +56,56 @@ def main():
             process_group_name = arg
         elif opt == "-u":
             url = arg
+        elif opt == "--user":
+            user = arg
+        elif opt == "--kerberos":
+            kerberos = True
+        elif opt == "--snapshot":
+            snapshot_file = arg
+        elif opt == "--refresh":
+            refresh = True
+        elif opt == "--name":
+            name = arg
+        elif opt == "--type":
+            type = arg
+        elif opt == "--property":
+            if "=" in arg:
+                prop_name, prop_value = arg.split("=", 1)
+                properties.append((prop_name, prop_value))
+            else:
+                properties.append((arg, None))
+        elif opt == "--group":
+            group = arg
+        elif opt == "--kind":
+            kind = None if arg == "any" else arg
+        elif opt == "--show-properties":
+            show_properties = True
+
+    query = snapshot_file is not None or refresh or name is not None or type is not None or properties or \
+        group is not None
+    if snapshot_file is None:
+        snapshot_file = DEFAULT_SNAPSHOT
+
+    if refresh:
+        nifiapi = NifiApi(url, auth=auth_from_options(user, kerberos))
+        if snapshot.export_snapshot(nifiapi, snapshot_file) is None:
+            sys.exit(1)
+
+    if query:
+        store = snapshot.SnapshotStore(snapshot_file)
+        results = store.find(kind=kind, name=name if name is not None else processor_name, type=type,
+                             properties=properties, group=group, group_name=process_group_name)
+        for result in results:
+            print("{}\t{}\t{}\t{}\t{}".format(result["path"], result["name"], result["type"], result["state"],
+                                              result["id"]))
+            if show_properties:
+                for prop_name, prop_value in sorted(result["properties"].items()):
+                    print("\t{} = {}".format(prop_name, prop_value))
+        logging.info("{} matches".format(len(results)))
+        store.close()
+        return
 
-    nifiapi = NifiApi(url)
+    nifiapi = NifiApi(url, auth=auth_from_options(user, kerberos))
     logging.debug("Looking for process group: {}".format(process_group_name))
     process_group = nifiapi.find_process_group(process_group_name)
     logging.info("Process Group: {}".format(json.dumps(process_group, indent=4)))
@@ -51,4 +124,4 @@ def main():
 if __name__ == "__main__":
     logging.basicConfig()
     logging.getLogger().setLevel(logging.DEBUG)
-    main()
\ No newline at end of file
+    main()
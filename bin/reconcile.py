@@ -0,0 +1,108 @@
+#!/usr/bin/python
+
+import getopt
+import logging
+import sys
+
+##
+# Bring the run state of the canvas in line with a desired state file, e.g. from cron.
+#
+# reconcile -u http://localhost:8080/nifi-api -f config/desired.cfg
+# reconcile -u http://localhost:8080/nifi-api -f config/desired.cfg --dry-run
+#
+# The file has a section per process group path glob (starting with /) or component name glob:
+#
+#   [/Ingest]
+#   state = RUNNING
+#   controllers = ENABLED
+#
+#   [PutSlack]
+#   state = STOPPED
+#
+# See nifiapi/reconcile.py for the precedence rules. The actual state is read with one status request for the whole
+# canvas (plus one for the controller services if the file sets any), and only components that drifted are changed:
+# in dependency order, in parallel (--workers, default 4). When nothing drifted that's all it costs. --dry-run only
+# prints the changes. Exits with 3 if a change failed.
+##
+from nifiapi.auth import auth_from_options
+from nifiapi.nifiapi import NifiApi
+from nifiapi import reconcile
+
+logger = logging.getLogger(__name__)
+
+
+def main():
+    try:
+        opts, args = getopt.getopt(sys.argv[1:], "u:f:", ['dry-run', 'workers=', 'user=', 'kerberos'])
+    except getopt.GetoptError as e:
+        logger.error(str(e))
+        sys.exit(2)
+
+    url = None
+    desired_file = None
+    dry_run = False
+    workers = 4
+    user = None
+    kerberos = False
+
+    for opt, arg in opts:
+        if opt == "-u":
+            url = arg
+        elif opt == "-f":
+            desired_file = arg
+        elif opt == "--dry-run":
+            dry_run = True
+        elif opt == "--workers":
+            workers = int(arg)
+        elif opt == "--user":
+            user = arg
+        elif opt == "--kerberos":
+            kerberos = True
+        else:
+            sys.exit(2)
+
+    if desired_file is None:
+        print("-f [desired_state_file] is required.")
+        sys.exit(2)
+    try:
+        desired = reconcile.DesiredState.read(desired_file)
+    except ValueError as e:
+        logger.error(str(e))
+        sys.exit(2)
+
+    nifiapi = NifiApi(url, auth=auth_from_options(user, kerberos))
+    flow = reconcile.read_flow_state(nifiapi)
+    if flow is None:
+        logger.error("Could not read the state of the flow.")
+        sys.exit(3)
+    services = []
+    if desired.wants_controllers():
+        services = nifiapi.get_controller_service_models("root", include_descendants=True)
+        if services is None:
+            logger.error("Could not read the controller services.")
+            sys.exit(3)
+
+    transitions = reconcile.diff(desired, flow, services)
+    if not transitions:
+        logger.info("In sync, nothing to change.")
+        return
+    if not dry_run:
+        reconcile.apply(nifiapi, transitions, flow, workers)
+    for transition in transitions:
+        component = transition.component
+        print("{}\t{}\t{} -> {}\t{}".format(transition.path, component.name, component.state, transition.desired,
+                                            "" if transition.ok is None else "ok" if transition.ok else
+                                            transition.error))
+    if dry_run:
+        return
+    failed = [transition for transition in transitions if transition.ok is False]
+    logger.info("{} components changed, {} failed".format(len(transitions) - len(failed), len(failed)))
+    if failed:
+        sys.exit(3)
+
+
+##############################
+if __name__ == "__main__":
+    logging.basicConfig()
+    logging.getLogger().setLevel(logging.INFO)
+    main()
@@ -0,0 +1,106 @@
+#!/usr/bin/python
+
+import getopt
+import logging
+import sys
+import time
+
+##
+# Restore a process group backed up by deploy_template.py before it removed the group.
+#
+# restore_backup --list
+# restore_backup -u http://localhost:8080/nifi-api --name "My Group" --replace --start -s config/sensitive.cfg
+# restore_backup -u http://localhost:8080/nifi-api --id 0f6c... --parent root
+#
+# --name restores the latest backup of that process group, --id a specific one. The group is restored into the group
+# it was backed up from unless --parent is given. --replace first stops, drains and removes the process group that
+# currently has the same name, e.g. a broken deploy. --start starts the restored group.
+#
+# Templates never carry the values of sensitive properties, so they are written into the restored groups from the
+# sensitive config (-s, default config/sensitive.cfg) before anything is started, as deploy_template does.
+##
+from nifiapi.auth import auth_from_options
+from nifiapi.nifiapi import NifiApi
+from nifiapi import backup
+
+logger = logging.getLogger(__name__)
+
+
+def main():
+    try:
+        opts, args = getopt.getopt(sys.argv[1:], "u:s:", ['backup-dir=', 'list', 'id=', 'name=', 'parent=', 'replace',
+                                                        'start', 'user=', 'kerberos'])
+    except getopt.GetoptError as e:
+        logger.error(str(e))
+        sys.exit(2)
+
+    url = None
+    backup_dir = "backups"
+    show_list = False
+    backup_id = None
+    name = None
+    parent = None
+    replace = False
+    start = False
+    user = None
+    kerberos = False
+    sensitive_file = "config/sensitive.cfg"
+
+    for opt, arg in opts:
+        if opt == "-u":
+            url = arg
+        elif opt == "-s":
+            sensitive_file = arg
+        elif opt == "--backup-dir":
+            backup_dir = arg
+        elif opt == "--list":
+            show_list = True
+        elif opt == "--id":
+            backup_id = arg
+        elif opt == "--name":
+            name = arg
+        elif opt == "--parent":
+            parent = arg
+        elif opt == "--replace":
+            replace = True
+        elif opt == "--start":
+            start = True
+        elif opt == "--user":
+            user = arg
+        elif opt == "--kerberos":
+            kerberos = True
+        else:
+            sys.exit(2)
+
+    if show_list:
+        for entry in backup.read_index(backup_dir):
+            print("{}\t{}\t{}\t{}".format(time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(entry["created"])),
+                                          entry["name"], entry["bytes"], entry["id"]))
+        return
+
+    if backup_id is None and name is None:
+        print("One of --list, --id or --name is required.")
+        sys.exit(2)
+    entry = backup.find_backup(backup_dir, backup_id, name)
+    if entry is None:
+        logger.error("No backup found in {}".format(backup_dir))
+        sys.exit(1)
+
+    nifiapi = NifiApi(url, auth=auth_from_options(user, kerberos))
+    current_id = None
+    if replace:
+        existing = nifiapi.find_process_group(entry["name"])
+        if existing is not None:
+            current_id = existing["id"]
+
+    pg_id = backup.replace_with_backup(nifiapi, backup_dir, entry, current_id, parent, start, sensitive_file)
+    if pg_id is None:
+        logger.error("Restore failed.")
+        sys.exit(3)
+
+
+##############################
+if __name__ == "__main__":
+    logging.basicConfig()
+    logging.getLogger().setLevel(logging.INFO)
+    main()
@@ -0,0 +1,42 @@
+#!/usr/bin/python
+
+import sys
+
+from nifiapi import trace
+from nifiapi.table import format_table
+
+##
+# Print the phase timings of one or more traces written with deploy_template.py --trace, side by side, so deploys of
+# different releases can be compared. Times are self times in seconds: the time spent in a phase minus the time spent
+# in the phases nested in it.
+#
+# Usage:
+# trace_summary before.json after.json
+##
+
+
+def main():
+    if len(sys.argv) < 2:
+        print("Usage: trace_summary file [file ...]")
+        sys.exit(2)
+
+    summaries = [trace.summarize(trace.load_trace(filename)) for filename in sys.argv[1:]]
+    if len(summaries) == 1:
+        print(trace.format_summary(summaries[0]))
+        return
+
+    rows = [("", [filename for filename in sys.argv[1:]]),
+            ("wall time (s)", ["{:.2f}".format(s["wall_time"]) for s in summaries])]
+    # Operations expanded per process group (configure:<id>) differ between deploys, so only compare phases.
+    phases = sorted(set(name for s in summaries for name in s["phases"] if ":" not in name),
+                    key=lambda name: -max(s["phases"].get(name, {"self": 0.0})["self"] for s in summaries))
+    for name in phases:
+        rows.append((name, ["{:.2f}".format(s["phases"][name]["self"]) if name in s["phases"] else "-"
+                            for s in summaries]))
+
+    print(format_table(rows))
+
+
+##############################
+if __name__ == "__main__":
+    main()
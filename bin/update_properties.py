@@ -0,0 +1,118 @@
+#!/usr/bin/python
+
+import getopt
+import getpass
+import logging
+import os
+import sys
+
+##
+# Set a property on every matching processor across the whole canvas, e.g. to rotate a credential or move an endpoint.
+#
+# update_properties -u http://localhost:8080/nifi-api --type PutSlack --property webhook-url --new-value-env WEBHOOK
+# update_properties --property 'Hostname' --value 'old-db.*' --group '/Ingest/*' --new-value new-db.example.com
+#
+# All filters are globs: --type (fully qualified or simple class name), --property (name), --value (current value)
+# and --group (process group path). Matches are resolved from a single walk of the flow and updated concurrently
+# (--workers, default 8). Running processors are stopped for the update and started again; others are left as they
+# are. Every update is verified afterwards. --dry-run only lists the matches.
+#
+# Pass secrets with --new-value-env VAR or --prompt rather than --new-value, to keep them out of the shell history.
+##
+from nifiapi.auth import auth_from_options
+from nifiapi.nifiapi import NifiApi
+from nifiapi import bulk
+from nifiapi.walker import WalkError
+
+logger = logging.getLogger(__name__)
+
+
+def main():
+    try:
+        opts, args = getopt.getopt(sys.argv[1:], "u:", ['type=', 'property=', 'value=', 'group=', 'new-value=',
+                                                        'new-value-env=', 'prompt', 'dry-run', 'workers=', 'user=',
+                                                        'kerberos'])
+    except getopt.GetoptError as e:
+        logger.error(str(e))
+        sys.exit(2)
+
+    url = None
+    type = None
+    property = None
+    value = None
+    group = None
+    new_value = None
+    dry_run = False
+    workers = 8
+    user = None
+    kerberos = False
+
+    for opt, arg in opts:
+        if opt == "-u":
+            url = arg
+        elif opt == "--type":
+            type = arg
+        elif opt == "--property":
+            property = arg
+        elif opt == "--value":
+            value = arg
+        elif opt == "--group":
+            group = arg
+        elif opt == "--new-value":
+            new_value = arg
+        elif opt == "--new-value-env":
+            new_value = os.environ.get(arg)
+            if new_value is None:
+                print("Environment variable {} is not set.".format(arg))
+                sys.exit(2)
+        elif opt == "--prompt":
+            new_value = getpass.getpass("New value: ")
+        elif opt == "--dry-run":
+            dry_run = True
+        elif opt == "--workers":
+            workers = int(arg)
+        elif opt == "--user":
+            user = arg
+        elif opt == "--kerberos":
+            kerberos = True
+        else:
+            sys.exit(2)
+
+    if property is None:
+        print("--property [name] is required.")
+        sys.exit(2)
+    if new_value is None and not dry_run:
+        print("One of --new-value, --new-value-env or --prompt is required.")
+        sys.exit(2)
+
+    nifiapi = NifiApi(url, auth=auth_from_options(user, kerberos))
+    try:
+        updates = bulk.resolve(nifiapi, bulk.Selector(property, type=type, value=value, group=group))
+    except WalkError as e:
+        logger.error("{}. Not updating a partial set of processors.".format(e))
+        sys.exit(3)
+    logger.info("{} matching processors".format(len(updates)))
+    if dry_run:
+        for update in updates:
+            print("{}\t{}\t{}\t{}\t{}".format(update.path, update.processor.name, update.processor.state,
+                                              ",".join(update.names), update.processor.id))
+        return
+
+    bulk.apply_updates(nifiapi, updates, new_value, workers)
+    verified = bulk.verify_updates(nifiapi, updates, new_value, workers)
+    for update in updates:
+        print("{}\t{}\t{}{}\t{}".format(update.path, update.processor.name, update.status,
+                                        " (restarted)" if update.restarted else "", update.error or ""))
+    failed = [update for update in updates if update.status == bulk.FAILED]
+    logger.info("{} updated, {} unchanged, {} failed".format(
+        len([update for update in updates if update.status == bulk.UPDATED]),
+        len([update for update in updates if update.status == bulk.UNCHANGED]), len(failed)))
+    if failed or not verified:
+        sys.exit(3)
+
+
+##############################
+if __name__ == "__main__":
+    logging.basicConfig()
+    logging.getLogger().setLevel(logging.INFO)
+    main()
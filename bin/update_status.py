@@ -3,35 +3,52 @@
 import getopt
 import logging
 import sys
-import json
+import time
+
+from concurrent.futures import ThreadPoolExecutor
 
 ##
-# Change the state of all processors in a process group.
+# Change the state of all processors in one or more process groups.
+#
+# update_status -u http://localhost:8080/nifi-api -p Ingest -p 'Export-*' -p 're:^Load-\d+$' -p '/Staging/*' --start
+#
+# -p can be given several times and takes an exact name, a glob over the name, a regular expression (re: prefix) or
+# a glob over the group path (leading /, the root group is /). Targets are resolved from a single request for the
+# status of the whole tree; a group nested in another target is changed with it. The targets are changed
+# concurrently (--workers, default 4) and a result per group is printed at the end. Exits with 3 if a group failed or
+# a -p matched nothing.
 ##
+from nifiapi.auth import auth_from_options
 from nifiapi.nifiapi import NifiApi
+from nifiapi import targets
+from nifiapi import tree
 
 logger = logging.getLogger(__name__)
 
 
 def main():
     try:
-        opts, args = getopt.getopt(sys.argv[1:], "p:n:u:", ["start", "stop", "enable", "disable"])
+        opts, args = getopt.getopt(sys.argv[1:], "p:n:u:", ["start", "stop", "enable", "disable", "workers=",
+                                                            "user=", "kerberos"])
     except getopt.GetoptError as e:
         logger.error(str(e))
         sys.exit(2)
 
-    process_group_name = None
+    patterns = []
     start = False
     stop = False
     enable = False
     url = None
     controller_state = None
+    user = None
+    kerberos = False
+    workers = 4
 
     for opt, arg in opts:
         if opt == "-n":
             processor_name = arg
         elif opt == '-p':
-            process_group_name = arg
+            patterns.append(targets.GroupPattern(arg))
         elif opt == "-u":
             url = arg
         elif opt == "--start":
@@ -43,10 +60,16 @@ def main():
             controller_state = NifiApi.CONTROLLER_ENABLED
         elif opt == '--disable':
             controller_state = NifiApi.CONTROLLER_DISABLED
+        elif opt == "--workers":
+            workers = int(arg)
+        elif opt == "--user":
+            user = arg
+        elif opt == "--kerberos":
+            kerberos = True
         else:
             sys.exit(2)
 
-    if process_group_name is None:
+    if not patterns:
         print("-p [process_group_name] is required.")
         sys.exit(2)
 
@@ -54,20 +77,41 @@ def main():
         print("One of --enable, --start or --stop is required.")
         sys.exit(2)
 
-    nifiapi = NifiApi(url)
+    nifiapi = NifiApi(url, auth=auth_from_options(user, kerberos))
 
-    process_group = nifiapi.find_process_group(process_group_name)
-    if process_group is None:
-        return None
-    pgf = nifiapi.get_process_group_by_id(process_group["id"])
+    groups = tree.list_process_groups(nifiapi)
+    if groups is None:
+        logger.error("Could not list the process groups.")
+        sys.exit(3)
+    process_groups, unmatched = targets.resolve_targets(groups, patterns)
+    for pattern in unmatched:
+        logger.warning("No process group matches {}".format(pattern.pattern))
+    if not process_groups:
+        sys.exit(3)
 
     state = NifiApi.PROCESSOR_STOPPED
     if start:
         state = NifiApi.PROCESSOR_RUNNING
         controller_state = NifiApi.CONTROLLER_ENABLED
 
-    nifiapi.status_change_all_processors(pgf, state, controller_state)
-
+    def change(process_group):
+        started = time.time()
+        try:
+            changed = nifiapi.status_change_all_processors(process_group[0], state, controller_state)
+        except Exception:
+            logger.exception("Changing {} failed".format(process_group[2]))
+            changed = False
+        return changed, time.time() - started
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(change, process_groups))
+
+    for (group_id, name, path), (changed, elapsed) in zip(process_groups, results):
+        print("{}\t{}\t{}\t{:.1f}s".format(path, group_id, "ok" if changed else "failed", elapsed))
+    failed = len([result for result in results if not result[0]])
+    logger.info("{} process groups changed, {} failed".format(len(results) - failed, failed))
+    if failed or unmatched:
+        sys.exit(3)
 
 
 ##############################
@@ -0,0 +1,204 @@
+import base64
+import getpass
+import json
+import logging
+import os
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Not available on Windows. Fall back to thread locking only.
+    fcntl = None
+
+try:
+    from requests_kerberos import HTTPKerberosAuth, OPTIONAL
+except ImportError:
+    HTTPKerberosAuth = None
+
+DEFAULT_CACHE_FILE = os.path.join(os.path.expanduser("~"), ".nifiapi", "tokens.json")
+
+
+class AuthError(Exception):
+    pass
+
+
+def auth_from_options(username, kerberos):
+    """
+    Build the TokenAuth for the --user/--kerberos options of the bin scripts. The password is read from the
+    NIFI_PASSWORD environment variable, or prompted for.
+    :param username: --user value or None
+    :param kerberos: True if --kerberos was given
+    :return: TokenAuth, or None for an unsecured cluster
+    """
+    if username is None and not kerberos:
+        return None
+    password = None
+    if not kerberos:
+        password = os.environ.get("NIFI_PASSWORD")
+        if password is None:
+            password = getpass.getpass("Password for {}: ".format(username))
+    return TokenAuth(username, password, kerberos)
+
+
+def token_expiry(token, default_ttl=3600):
+    """
+    Read the expiry time out of a JWT without verifying it.
+    :param token: JWT string
+    :param default_ttl: seconds to assume if the token can't be decoded
+    :return: expiry as epoch seconds
+    """
+    try:
+        payload = token.split(".")[1]
+        payload += "=" * (-len(payload) % 4)
+        return float(json.loads(base64.urlsafe_b64decode(payload.encode("ascii")))["exp"])
+    except (IndexError, ValueError, KeyError, TypeError):
+        return time.time() + default_ttl
+
+
+##
+# Token authentication against /access/token (LDAP and other username/password providers) or /access/kerberos.
+#
+# Tokens are cached in memory and in a JSON file keyed by api url and identity (the username, or kerberos), so every
+# bin/*.py invocation and every thread logged in as the same identity shares one login until the token is about to
+# expire, and a different --user never picks up someone else's token. The file is only readable by the owner and is
+# locked while it is read or written, so concurrent processes don't log in at the same time.
+##
+class TokenAuth:
+
+    def __init__(self, username=None, password=None, kerberos=False, cache_file=DEFAULT_CACHE_FILE,
+                 refresh_margin=300):
+        """
+        :param username: username for /access/token
+        :param password: password for /access/token
+        :param kerberos: True to log in with SPNEGO via /access/kerberos (needs requests_kerberos)
+        :param cache_file: file tokens are shared through, None to only cache in memory
+        :param refresh_margin: seconds before expiry a token is considered stale and refreshed
+        """
+        if kerberos and HTTPKerberosAuth is None:
+            raise AuthError("Kerberos login requires the requests_kerberos package")
+        if not kerberos and username is None:
+            raise AuthError("A username is required unless kerberos is used")
+        self.username = username
+        self.password = password
+        self.kerberos = kerberos
+        self.cache_file = cache_file
+        self.refresh_margin = refresh_margin
+        self.token = None
+        self.expires = 0.0
+        self.lock = threading.Lock()
+        self.logger = logging.getLogger(__name__)
+
+    def get_token(self, session, url):
+        """
+        Return a valid token, logging in only if neither memory nor the cache file has a fresh one.
+        :param session: requests session to log in with
+        :param url: Nifi API url of the node to log in against
+        :return: JWT string
+        """
+        if self.token is not None and self._fresh(self.expires):
+            return self.token
+        with self.lock:
+            if self.token is not None and self._fresh(self.expires):
+                return self.token
+            with self._file_lock():
+                cached = self._read_cache().get(self._cache_key(url))
+                if cached is not None and self._fresh(cached["expires"]):
+                    self.token, self.expires = cached["token"], cached["expires"]
+                else:
+                    self.token = self._login(session, url)
+                    self.expires = token_expiry(self.token)
+                    self._write_cache(self._cache_key(url), self.token, self.expires)
+            return self.token
+
+    def invalidate(self, token, url):
+        """
+        Called when the server rejected a token with a 401. Only the first caller that saw the rejected token drops
+        it, so concurrent failures lead to a single new login.
+        :param token: the token that was rejected
+        :param url: Nifi API url the token was issued by
+        """
+        with self.lock:
+            if self.token != token:
+                return
+            self.token = None
+            self.expires = 0.0
+            with self._file_lock():
+                cache = self._read_cache()
+                key = self._cache_key(url)
+                if key in cache and cache[key]["token"] == token:
+                    self._write_cache(key, None, None)
+
+    def _cache_key(self, url):
+        # Usernames may contain anything but urls have no spaces, so the key can't be ambiguous.
+        return "{} {}".format(url, "kerberos" if self.kerberos else "user:" + self.username)
+
+    def _fresh(self, expires):
+        return expires - time.time() > self.refresh_margin
+
+    def _login(self, session, url):
+        self.logger.info("Requesting access token from {}".format(url))
+        if self.kerberos:
+            response = session.post(url + "/access/kerberos", auth=HTTPKerberosAuth(mutual_authentication=OPTIONAL))
+        else:
+            response = session.post(url + "/access/token", data={"username": self.username,
+                                                                  "password": self.password})
+        if response.status_code > 299:
+            raise AuthError("Login failed. Status code {} returned. {}".format(response.status_code, response.text))
+        return response.text.strip()
+
+    def _read_cache(self):
+        if self.cache_file is None or not os.path.exists(self.cache_file):
+            return {}
+        try:
+            with open(self.cache_file) as f:
+                return json.load(f)
+        except ValueError:
+            self.logger.warning("Ignoring corrupt token cache {}".format(self.cache_file))
+            return {}
+
+    def _write_cache(self, key, token, expires):
+        if self.cache_file is None:
+            return
+        cache = self._read_cache()
+        if token is None:
+            cache.pop(key, None)
+        else:
+            cache[key] = {"token": token, "expires": expires}
+        directory = os.path.dirname(self.cache_file)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory, 0o700)
+        tmp_file = self.cache_file + ".tmp"
+        fd = os.open(tmp_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w") as f:
+            json.dump(cache, f)
+        os.replace(tmp_file, self.cache_file)
+
+    def _file_lock(self):
+        return _FileLock(None if self.cache_file is None else self.cache_file + ".lock")
+
+
+##
+# Exclusive lock on a file, used to serialise token cache access between processes.
+##
+class _FileLock:
+
+    def __init__(self, path):
+        self.path = path
+        self.fd = None
+
+    def __enter__(self):
+        if self.path is None or fcntl is None:
+            return self
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory, 0o700)
+        self.fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        fcntl.flock(self.fd, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        if self.fd is not None:
+            fcntl.flock(self.fd, fcntl.LOCK_UN)
+            os.close(self.fd)
+            self.fd = None
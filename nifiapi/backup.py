@@ -0,0 +1,239 @@
+import gzip
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import time
+import uuid
+
+from nifiapi.model import ProcessGroup
+from nifiapi.walker import WalkError
+
+INDEX_FILE = "index.jsonl"
+
+
+class _DigestWriter:
+    """
+    Binary file wrapper that keeps a sha256 of everything written through it.
+    """
+
+    def __init__(self, out):
+        self.out = out
+        self.digest = hashlib.sha256()
+
+    def write(self, data):
+        self.digest.update(data)
+        return self.out.write(data)
+
+    def flush(self):
+        self.out.flush()
+
+
+def backup_process_group(api, process_group, directory):
+    """
+    Save a process group as a gzipped template. A snippet of the group is turned into a temporary template on the
+    server, which is streamed to disk in chunks and deleted again. The backup is added to the index in directory.
+    :param api: NifiApi instance
+    :param process_group: JSON process group object or ProcessGroup (Not process group flow...)
+    :param directory: backup directory
+    :return: the index entry (dict) or None if the backup failed
+    """
+    logger = logging.getLogger(__name__)
+    pg = ProcessGroup.of(process_group)
+    created = time.time()
+    backup_id = str(uuid.uuid4())
+    name = "{} backup {}".format(pg.name, time.strftime("%Y%m%d-%H%M%S", time.localtime(created)))
+    snippet_id = api.create_snippet(pg)
+    if snippet_id is None:
+        return None
+    template_id = api.create_template(pg.parent_group_id, snippet_id, name,
+                                      "Backup of process group {} ({})".format(pg.name, pg.id))
+    if template_id is None:
+        return None
+
+    os.makedirs(directory, exist_ok=True)
+    filename = os.path.join(directory, "{}.xml.gz".format(backup_id))
+    try:
+        with open(filename + ".tmp", "wb") as raw:
+            writer = _DigestWriter(raw)
+            with gzip.GzipFile(fileobj=writer, mode="wb") as out:
+                size = api.download_template(template_id, out)
+        if size is None:
+            os.remove(filename + ".tmp")
+            return None
+        os.replace(filename + ".tmp", filename)
+    finally:
+        # The backup lives on disk; the template was only needed for the download.
+        api.delete_template(template_id)
+
+    entry = {"id": backup_id, "name": pg.name, "group_id": pg.id, "parent_group_id": pg.parent_group_id,
+             "template_name": name, "file": os.path.basename(filename), "bytes": size,
+             "sha256": writer.digest.hexdigest(), "created": created}
+    with open(os.path.join(directory, INDEX_FILE), "a") as index:
+        index.write(json.dumps(entry) + "\n")
+    logger.info("Backed up process group {} to {} ({} bytes)".format(pg.name, filename, size))
+    return entry
+
+
+def read_index(directory):
+    """
+    :param directory: backup directory
+    :return: list of index entries, oldest first
+    """
+    filename = os.path.join(directory, INDEX_FILE)
+    if not os.path.exists(filename):
+        return []
+    with open(filename) as index:
+        return [json.loads(line) for line in index if line.strip()]
+
+
+def find_backup(directory, backup_id=None, name=None):
+    """
+    Look up a backup in the index.
+    :param directory: backup directory
+    :param backup_id: (optional) id of the backup
+    :param name: (optional) process group name. The latest backup of that group is returned.
+    :return: index entry or None
+    """
+    for entry in reversed(read_index(directory)):
+        if (backup_id is None or entry["id"] == backup_id) and (name is None or entry["name"] == name):
+            return entry
+    return None
+
+
+def verify_backup(directory, entry):
+    """
+    Check a backup file is complete.
+    :param directory: backup directory
+    :param entry: index entry
+    :return: True if the file exists and matches the checksum in the index
+    """
+    filename = os.path.join(directory, entry["file"])
+    if not os.path.exists(filename):
+        return False
+    digest = hashlib.sha256()
+    with open(filename, "rb") as f:
+        for chunk in iter(lambda: f.read(65536), b""):
+            digest.update(chunk)
+    return digest.hexdigest() == entry["sha256"]
+
+
+def restore_backup(api, directory, entry, parent_group_id=None, x=0.0, y=0.0, sensitive_file=None):
+    """
+    Instantiate a backup: the template is decompressed to a temporary file, uploaded, instantiated and removed from
+    the server again.
+    :param api: NifiApi instance
+    :param directory: backup directory
+    :param entry: index entry, see find_backup
+    :param parent_group_id: (optional) group to restore into. Defaults to the group the backup was taken from.
+    :param x: (optional) x coordinate on the canvas
+    :param y: (optional) y coordinate on the canvas
+    :param sensitive_file: (optional) sensitive config to apply to the restored groups, see apply_sensitive_config.
+    Without it the restored flow has no passwords and won't start.
+    :return: id of the restored process group or None if the restore failed. A restored group that could not be
+    configured is removed again.
+    """
+    logger = logging.getLogger(__name__)
+    if not verify_backup(directory, entry):
+        logger.error("Backup {} is missing or corrupt".format(entry["id"]))
+        return None
+    if parent_group_id is None:
+        parent_group_id = entry["parent_group_id"]
+    fd, template_file = tempfile.mkstemp(suffix=".xml")
+    try:
+        with os.fdopen(fd, "wb") as out, gzip.open(os.path.join(directory, entry["file"]), "rb") as backup:
+            shutil.copyfileobj(backup, out)
+        # A template with the backup's name is left behind if an earlier restore failed halfway.
+        api.remove_template_by_name(entry["template_name"])
+        template_entity = api.upload_template_entity(parent_group_id, template_file)
+    finally:
+        os.remove(template_file)
+    if template_entity is None:
+        return None
+    template_id = template_entity.find("template/id").text
+    try:
+        response = api.do_instantiate_template(parent_group_id, template_id, x, y)
+    finally:
+        api.delete_template(template_id)
+    if response is None:
+        return None
+    pg_id = response["flow"]["processGroups"][0]["component"]["id"]
+    logger.info("Restored {} from backup {} as process group {}".format(entry["name"], entry["id"], pg_id))
+    if sensitive_file is not None and not apply_sensitive_config(api, pg_id, sensitive_file):
+        logger.error("Restored process group {} could not be configured from {}. Removing it.".format(
+            pg_id, sensitive_file))
+        _remove_restored(api, pg_id)
+        return None
+    return pg_id
+
+
+def _remove_restored(api, pg_id):
+    # Don't leave a half configured copy next to the group it was meant to replace. Configuring may have enabled
+    # some of its controller services, which NiFi won't remove, so disable them first.
+    api.status_change_all_processors(pg_id, api.PROCESSOR_STOPPED, api.CONTROLLER_DISABLED)
+    pg = api.remote_get('/process-groups/', pg_id)
+    if pg is None or api.remove_process_group(pg) is None:
+        logging.getLogger(__name__).error("Removing restored process group {} failed. Remove it by hand.".format(
+            pg_id))
+
+
+def apply_sensitive_config(api, pg_id, sensitive_file):
+    """
+    Templates never carry the values of sensitive properties, so a restored flow has no passwords. Write them from
+    the sensitive config into a restored group and every group nested in it, the way a deploy configures a new flow.
+    :param api: NifiApi instance
+    :param pg_id: id of the restored process group
+    :param sensitive_file: config file with the sensitive properties
+    :return: True if successful, False otherwise
+    """
+    configured = set()
+    try:
+        for pg in api.walk_process_groups(pg_id, strict=True):
+            if not api.write_sensitive_properties(pg.id, sensitive_file, configured=configured):
+                return False
+    except WalkError as e:
+        logging.getLogger(__name__).error(str(e))
+        return False
+    return True
+
+
+def replace_with_backup(api, directory, entry, current_id, parent_group_id=None, start=False, sensitive_file=None):
+    """
+    Roll a process group back to a backup: the backup is restored next to the current group and configured, and only
+    then is the current group stopped, drained and removed. If the backup can't be restored the current group is
+    left as it is, so a failed roll back doesn't take the current flow down with it.
+    :param api: NifiApi instance
+    :param directory: backup directory
+    :param entry: index entry, see find_backup
+    :param current_id: id of the process group to replace, None if there is nothing to remove
+    :param parent_group_id: (optional) group to restore into. Defaults to the group the backup was taken from.
+    :param start: (optional) True to start the restored group
+    :param sensitive_file: (optional) sensitive config to apply to the restored groups before they are started
+    :return: id of the restored process group or None if the roll back failed
+    """
+    logger = logging.getLogger(__name__)
+    pg_id = restore_backup(api, directory, entry, parent_group_id, sensitive_file=sensitive_file)
+    if pg_id is None:
+        logger.error("Restoring backup {} failed. Leaving the current process group in place.".format(entry["id"]))
+        return None
+    if current_id is not None:
+        logger.info("Removing current process group {}".format(current_id))
+        try:
+            stopped = api.status_change_all_processors(current_id, api.PROCESSOR_STOPPED, api.CONTROLLER_DISABLED)
+            if stopped:
+                api.empty_all_queues(current_id)
+        except WalkError as e:
+            logger.error(str(e))
+            stopped = False
+        # Stopping changed the group's revision, so fetch it again.
+        current = api.remote_get('/process-groups/', current_id) if stopped else None
+        if current is None or api.remove_process_group(current) is None:
+            logger.error("Removing the current process group failed! The backup was restored as {} but not "
+                         "started.".format(pg_id))
+            return None
+    if start and not api.status_change_all_processors(pg_id, api.PROCESSOR_RUNNING, api.CONTROLLER_ENABLED):
+        logger.error("Starting the restored process group failed.")
+        return None
+    return pg_id
@@ -0,0 +1,212 @@
+import logging
+import time
+import uuid
+
+from concurrent.futures import ThreadPoolExecutor
+from fnmatch import fnmatchcase
+
+from nifiapi.model import Processor
+from nifiapi.nifiapi import NifiApi
+from nifiapi.tree import group_path
+
+# NiFi returns sensitive property values masked.
+MASKED = "********"
+
+UPDATED = "updated"
+UNCHANGED = "unchanged"
+FAILED = "failed"
+
+
+##
+# Selects processor properties by globs (*, ?, [...]) over the processor type, the property name, the current value
+# and the path of the process group. Every filter that is set must match.
+##
+class Selector:
+
+    def __init__(self, property, type=None, value=None, group=None):
+        """
+        :param property: property name glob
+        :param type: (optional) type glob. Matches either the fully qualified type or the simple class name.
+        :param value: (optional) glob the current value must match. Unset properties never match.
+        :param group: (optional) glob over the process group path, e.g. /Ingest/*
+        """
+        self.property = property
+        self.type = type
+        self.value = value
+        self.group = group
+
+    def properties(self, processor, path):
+        """
+        :param processor: Processor
+        :param path: path of the process group the processor is in
+        :return: names of the matching properties, empty if the processor doesn't match
+        """
+        if self.group is not None and not fnmatchcase(path, self.group):
+            return []
+        if self.type is not None and not (fnmatchcase(processor.type or "", self.type) or
+                                          fnmatchcase(processor.type or "", "*." + self.type)):
+            return []
+        return [name for name, value in processor.properties.items()
+                if fnmatchcase(name, self.property) and
+                (self.value is None or (value is not None and fnmatchcase(value, self.value)))]
+
+
+##
+# Outcome of updating one processor.
+##
+class PropertyUpdate:
+
+    def __init__(self, processor, path, names):
+        self.processor = processor
+        self.path = path
+        self.names = names
+        self.status = None
+        self.restarted = False
+        self.verified = None
+        self.error = None
+
+
+def resolve(api, selector, root_id="root"):
+    """
+    Find every processor property the selector matches, from a single walk of the process group tree.
+    :param api: NifiApi instance
+    :param selector: Selector
+    :param root_id: id of the group to start from
+    :return: list of PropertyUpdate, one per matching processor
+    :raises WalkError: if a process group could not be fetched. Updating only the groups that could would leave the
+    rest with the old value.
+    """
+    paths = {}
+    matches = []
+    for pg in api.walk_process_groups(root_id, strict=True):
+        path = group_path(paths.get(pg.parent_group_id), pg.name or pg.id)
+        paths[pg.id] = path
+        for processor in pg.processors:
+            names = selector.properties(processor, path)
+            if names:
+                matches.append(PropertyUpdate(processor, path, names))
+    return matches
+
+
+def apply_updates(api, updates, value, workers=8, retries=5, backoff=0.5):
+    """
+    Set the selected properties to a new value, updating processors concurrently. A processor is only stopped (and
+    started again afterwards) if it is running, since NiFi refuses to change the configuration of a running
+    processor. Revision conflicts, e.g. because someone else changed the processor meanwhile or it still had active
+    threads, are retried with the current revision.
+    :param api: NifiApi instance
+    :param updates: list of PropertyUpdate returned by resolve
+    :param value: new value
+    :param workers: number of processors updated at the same time
+    :param retries: attempts after a revision conflict before giving up on a processor
+    :param backoff: seconds to wait before the first retry, doubled for every further retry
+    :return: the updates, with status UPDATED, UNCHANGED or FAILED
+    """
+    client_id = str(uuid.uuid4())
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(lambda update: _apply(api, update, value, client_id, retries, backoff), updates))
+    return updates
+
+
+def verify_updates(api, updates, value, workers=8):
+    """
+    Fetch every updated processor again and check the new value is set and it is back in the state it was in.
+    Sensitive values are masked by NiFi, so for those only the mask can be checked.
+    :param api: NifiApi instance
+    :param updates: list of PropertyUpdate returned by apply_updates
+    :param value: value that was set
+    :param workers: number of processors fetched at the same time
+    :return: True if every update was verified
+    """
+    def verify(update):
+        if update.status != UPDATED:
+            return
+        processor = Processor.of(api.remote_get(Processor.endpoint, update.processor.id))
+        if processor is None:
+            update.verified = False
+            update.error = "processor could not be fetched"
+            return
+        mismatched = [name for name in update.names if processor.properties.get(name) not in (value, MASKED)]
+        if mismatched:
+            update.verified = False
+            update.error = "not set: {}".format(", ".join(mismatched))
+        elif (processor.state == NifiApi.PROCESSOR_RUNNING) != (update.processor.state == NifiApi.PROCESSOR_RUNNING):
+            update.verified = False
+            update.error = "state {} instead of {}".format(processor.state, update.processor.state)
+        else:
+            update.verified = True
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(verify, updates))
+    return all(update.verified for update in updates if update.status == UPDATED)
+
+
+def _apply(api, update, value, client_id, retries, backoff):
+    logger = logging.getLogger(__name__)
+    processor = update.processor
+    if all(processor.properties.get(name) == value for name in update.names):
+        update.status = UNCHANGED
+        return
+    properties = dict((name, value) for name in update.names)
+    stopped = False
+    try:
+        for attempt in range(retries + 1):
+            if attempt > 0:
+                time.sleep(backoff * 2 ** (attempt - 1))
+                processor = Processor.of(api.remote_get(Processor.endpoint, processor.id))
+                if processor is None:
+                    update.status = FAILED
+                    update.error = "processor could not be fetched"
+                    return
+            if processor.state == NifiApi.PROCESSOR_RUNNING:
+                response = _put(api, processor, {"state": NifiApi.PROCESSOR_STOPPED}, client_id)
+                if response.status_code == 409:
+                    continue
+                if response.status_code > 299:
+                    update.status = FAILED
+                    update.error = "stop returned {}: {}".format(response.status_code, response.text)
+                    return
+                processor = Processor.of(response.json())
+                stopped = True
+            response = _put(api, processor, {"config": {"properties": properties}}, client_id)
+            if response.status_code == 409:
+                logger.debug("Conflict updating {}, retrying: {}".format(processor.id, response.text))
+                continue
+            if response.status_code > 299:
+                update.status = FAILED
+                update.error = "update returned {}: {}".format(response.status_code, response.text)
+                return
+            processor = Processor.of(response.json())
+            update.status = UPDATED
+            logger.info("Updated {} on {}/{}".format(", ".join(update.names), update.path.rstrip("/"),
+                                                     processor.name))
+            return
+        update.status = FAILED
+        update.error = "still conflicting after {} retries".format(retries)
+    finally:
+        if stopped:
+            update.restarted = _start(api, processor, client_id, retries, backoff)
+            if not update.restarted:
+                logger.error("Could not start {} ({}) again".format(processor.name, processor.id))
+
+
+def _start(api, processor, client_id, retries, backoff):
+    for attempt in range(retries + 1):
+        if attempt > 0:
+            time.sleep(backoff * 2 ** (attempt - 1))
+            processor = Processor.of(api.remote_get(Processor.endpoint, processor.id))
+            if processor is None:
+                return False
+        response = _put(api, processor, {"state": NifiApi.PROCESSOR_RUNNING}, client_id)
+        if response.status_code <= 299:
+            return True
+        if response.status_code != 409:
+            return False
+    return False
+
+
+def _put(api, processor, component, client_id):
+    component = dict(component, id=processor.id)
+    entity = {"revision": {"version": processor.revision.version, "clientId": client_id}, "component": component}
+    return api.send('PUT', Processor.endpoint + processor.id, json=entity,
+                    headers={'Accept': 'application/json', 'Content-Type': 'application/json'})
@@ -0,0 +1,106 @@
+import logging
+import threading
+
+from nifiapi import guard
+from nifiapi import tree
+
+ERROR = "ERROR"
+WARNING = "WARNING"
+
+_LOG_LEVELS = {ERROR: logging.ERROR, WARNING: logging.WARNING, "INFO": logging.INFO, "DEBUG": logging.DEBUG}
+
+
+##
+# Polls the bulletin board in the background while a process group is deployed and reports the bulletins its
+# components raise as they come in.
+#
+# The latest bulletin id on the board is taken as the cursor when the watch starts, and every poll only asks for
+# bulletins after the last one seen, so each poll returns just the new entries. The group to watch usually doesn't
+# exist yet when the watch starts: group is a callable that returns its id once it does, and until then the board
+# isn't polled. The group and the groups nested in it are then listed once, from a single status request, and only
+# bulletins from components in those groups are reported.
+##
+class BulletinWatcher:
+
+    def __init__(self, api, group, interval=2.0, on_error=None):
+        """
+        :param api: NifiApi instance
+        :param group: callable returning the id of the process group to watch, or None while there is none
+        :param interval: seconds between polls
+        :param on_error: (optional) called with every ERROR bulletin entity, from the watcher thread
+        """
+        self.api = api
+        self.group = group
+        self.interval = interval
+        self.on_error = on_error
+        self.cursor = None
+        self.group_id = None
+        self.group_ids = set()
+        self.bulletins = []
+        self.errors = []
+        self.stopped = threading.Event()
+        self.thread = None
+        self.lock = threading.Lock()
+        self.logger = logging.getLogger(__name__)
+
+    def start(self):
+        """
+        Take the cursor and start polling in a daemon thread.
+        """
+        self.cursor = guard.bulletin_cursor(self.api)
+        self.thread = threading.Thread(target=self._run, name="bulletin-watcher", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """
+        Stop polling, after a last poll for the bulletins raised since the previous one.
+        :return: list of every ERROR bulletin entity seen
+        """
+        if self.thread is None:
+            return self.errors
+        self.stopped.set()
+        self.thread.join()
+        self.poll()
+        return self.errors
+
+    def poll(self):
+        """
+        Fetch the bulletins raised since the last poll and report the ones of the watched group.
+        :return: list of the new bulletin entities of the watched group
+        """
+        with self.lock:
+            group_id = self.group()
+            if group_id is None:
+                return []
+            if group_id != self.group_id:
+                groups = tree.list_process_groups(self.api, group_id)
+                if groups is None:
+                    return []
+                self.group_id = group_id
+                self.group_ids = set(group[0] for group in groups)
+            entities = self.api.get_bulletins(self.cursor)
+            if not entities:
+                return []
+            self.cursor = entities[-1]["id"]
+            new = [entity for entity in entities if entity.get("groupId") in self.group_ids]
+            for entity in new:
+                self._report(entity)
+            return new
+
+    def _report(self, entity):
+        bulletin = entity.get("bulletin") or {}
+        level = bulletin.get("level")
+        self.logger.log(_LOG_LEVELS.get(level, logging.INFO), "Bulletin from {} ({}): {}".format(
+            bulletin.get("sourceName"), entity.get("sourceId"), bulletin.get("message")))
+        self.bulletins.append(entity)
+        if level == ERROR:
+            self.errors.append(entity)
+            if self.on_error is not None:
+                self.on_error(entity)
+
+    def _run(self):
+        while not self.stopped.wait(self.interval):
+            try:
+                self.poll()
+            except Exception:
+                self.logger.exception("Polling the bulletin board failed")
@@ -0,0 +1,235 @@
+import gzip
+import json
+import logging
+import re
+import threading
+import time
+
+from collections import defaultdict, deque
+
+from urllib.parse import urlsplit
+
+from requests.structures import CaseInsensitiveDict
+
+from nifiapi import governor
+
+REDACTED = "*REDACTED*"
+
+# Recorded in place of the body of streamed and XML responses, i.e. template downloads.
+STREAMED = "*STREAMED*"
+
+# Property names that are redacted even if they aren't listed explicitly.
+SENSITIVE_NAME = re.compile(r"pass|secret|token|credential|private", re.IGNORECASE)
+
+# Endpoints whose request and response bodies are never recorded.
+SECRET_PATHS = ("/access/",)
+
+CASSETTE_VERSION = 1
+
+
+def _path(url):
+    parts = urlsplit(url)
+    path = parts.path
+    # Strip the api root so recordings from one node replay against any url.
+    index = path.find("/nifi-api")
+    if index >= 0:
+        path = path[index + len("/nifi-api"):]
+    if parts.query:
+        path += "?" + parts.query
+    return path
+
+
+def redact(obj, names):
+    """
+    Copy of a JSON object with the values of sensitive properties replaced.
+    :param obj: JSON object
+    :param names: property names to redact in addition to the ones matching SENSITIVE_NAME
+    :return: redacted copy
+    """
+    if isinstance(obj, dict):
+        copy = {}
+        for key, value in obj.items():
+            if key == "properties" and isinstance(value, dict):
+                copy[key] = dict((name, REDACTED if value[name] is not None and
+                                  (name in names or SENSITIVE_NAME.search(name)) else value[name])
+                                 for name in value)
+            else:
+                copy[key] = redact(value, names)
+        return copy
+    if isinstance(obj, list):
+        return [redact(item, names) for item in obj]
+    return obj
+
+
+##
+# Wraps a requests session and writes every request and response, with timings, to a gzipped JSON lines cassette.
+# Authorization headers are never written, nor are bodies of /access requests, and sensitive property values are
+# redacted. Bodies of streamed and XML responses are left unread, so a template download still streams to disk
+# while recording; only their size is written, if the server sent it.
+##
+class RecordingSession:
+
+    def __init__(self, session, filename, redact_names=()):
+        """
+        :param session: the requests session doing the real work
+        :param filename: cassette file to write
+        :param redact_names: property names whose values must not be written, e.g. every key in sensitive.cfg
+        """
+        self.session = session
+        self.filename = filename
+        self.redact_names = set(redact_names)
+        self.started = time.time()
+        self.count = 0
+        self.lock = threading.Lock()
+        self.file = gzip.open(filename, "wt")
+        self._write({"version": CASSETTE_VERSION, "started": self.started})
+
+    def request(self, method, url, **kwargs):
+        started = time.time()
+        response = self.session.request(method, url, **kwargs)
+        elapsed = time.time() - started
+        path = _path(url)
+        secret = any(p in path for p in SECRET_PATHS)
+        entry = {"m": method, "p": path, "s": response.status_code, "t": round(elapsed, 6),
+                 "at": round(started - self.started, 6)}
+        content_type = response.headers.get("Content-Type")
+        if content_type is not None:
+            entry["h"] = {"Content-Type": content_type}
+        if "Retry-After" in response.headers:
+            entry.setdefault("h", {})["Retry-After"] = response.headers["Retry-After"]
+        if secret:
+            entry["b"] = REDACTED
+        elif kwargs.get("stream") or "xml" in (content_type or ""):
+            entry["b"] = STREAMED
+            if "Content-Length" in response.headers:
+                entry["n"] = int(response.headers["Content-Length"])
+        else:
+            entry["b"] = self._redact_text(response.text)
+            if kwargs.get("json") is not None:
+                entry["q"] = redact(kwargs["json"], self.redact_names)
+        self._write(entry)
+        return response
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    def close(self):
+        with self.lock:
+            self.file.close()
+
+    def _redact_text(self, text):
+        try:
+            return json.dumps(redact(json.loads(text), self.redact_names))
+        except ValueError:
+            return text
+
+    def _write(self, entry):
+        with self.lock:
+            self.file.write(json.dumps(entry, separators=(",", ":")))
+            self.file.write("\n")
+            if "m" in entry:
+                self.count += 1
+
+
+##
+# Response object served by ReplaySession. Implements the parts of requests.Response this library uses.
+##
+class ReplayResponse:
+
+    def __init__(self, status_code, text, headers=None):
+        self.status_code = status_code
+        self.text = text
+        self.headers = CaseInsensitiveDict(headers or {})
+
+    @property
+    def content(self):
+        return self.text.encode("utf-8")
+
+    def iter_content(self, chunk_size=1):
+        content = self.content
+        for start in range(0, len(content), chunk_size):
+            yield content[start:start + chunk_size]
+
+    def json(self):
+        return json.loads(self.text)
+
+
+##
+# Stands in for a requests session and serves responses from a cassette. Responses for the same method and path are
+# served in recorded order; once they run out the last one is repeated. Each response is delayed by its recorded
+# latency times `speed` (0 serves immediately).
+##
+class ReplaySession:
+
+    def __init__(self, filename, speed=1.0):
+        self.speed = speed
+        self.responses = defaultdict(deque)
+        self.last = {}
+        self.count = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self.logger = logging.getLogger(__name__)
+        for entry in read_cassette(filename):
+            self.responses[(entry["m"], entry["p"])].append(entry)
+
+    def request(self, method, url, **kwargs):
+        key = (method, _path(url))
+        with self.lock:
+            self.count += 1
+            queue = self.responses.get(key)
+            if queue:
+                entry = queue.popleft()
+                self.last[key] = entry
+            else:
+                entry = self.last.get(key)
+                if entry is None:
+                    self.misses += 1
+        if entry is None:
+            self.logger.warning("No recorded response for {} {}".format(method, key[1]))
+            return ReplayResponse(404, "No recorded response")
+        if self.speed > 0:
+            time.sleep(entry["t"] * self.speed)
+        return ReplayResponse(entry["s"], entry["b"], entry.get("h"))
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    def close(self):
+        pass
+
+
+def read_cassette(filename):
+    """
+    Read the request entries of a cassette.
+    :param filename: cassette file
+    :return: generator of entry dicts
+    """
+    with gzip.open(filename, "rt") as f:
+        for line in f:
+            entry = json.loads(line)
+            if "m" in entry:
+                yield entry
+
+
+def summarize(filename):
+    """
+    Request counts and timings of a cassette, per endpoint class.
+    :param filename: cassette file
+    :return: dict with requests, wall_time, request_time and a per class breakdown
+    """
+    summary = {"requests": 0, "wall_time": 0.0, "request_time": 0.0, "classes": {}}
+    for entry in read_cassette(filename):
+        endpoint_class = governor.classify(entry["m"], entry["p"])
+        stats = summary["classes"].setdefault(endpoint_class, {"requests": 0, "request_time": 0.0})
+        stats["requests"] += 1
+        stats["request_time"] += entry["t"]
+        summary["requests"] += 1
+        summary["request_time"] += entry["t"]
+        summary["wall_time"] = max(summary["wall_time"], entry["at"] + entry["t"])
+    return summary
@@ -0,0 +1,138 @@
+import logging
+import random
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+
+
+##
+# One NiFi node the client can talk to, with its health and smoothed request latency.
+##
+class Node:
+
+    def __init__(self, url):
+        self.url = url
+        self.healthy = True
+        self.latency = None
+        self.down_since = None
+
+    def observe(self, latency, alpha=0.3):
+        if self.latency is None:
+            self.latency = latency
+        else:
+            self.latency = alpha * latency + (1 - alpha) * self.latency
+
+    def __repr__(self):
+        return "Node({}, healthy={}, latency={})".format(self.url, self.healthy, self.latency)
+
+
+##
+# Routes requests across the nodes of a NiFi cluster. Mutations always go to one coordinator node so they are
+# replicated from a single place. Idempotent reads are spread across the healthy nodes, preferring the ones with the
+# lowest measured latency, and fail over when a node drops out. Nodes marked down are probed again after
+# recheck_interval seconds.
+##
+class NodeRouter:
+
+    # Latencies below this are treated as equal so a handful of very fast responses can't starve the other nodes.
+    min_latency = 0.005
+
+    def __init__(self, urls, probe=None, recheck_interval=30.0):
+        """
+        :param urls: list of node API urls. The first one is the preferred coordinator.
+        :param probe: (optional) callable taking a node url and returning True if the node responds.
+        :param recheck_interval: seconds before a node marked down is probed again
+        """
+        if not urls:
+            raise ValueError("At least one node url is required")
+        self.nodes = [Node(url.rstrip('/')) for url in urls]
+        self.probe = probe
+        self.recheck_interval = recheck_interval
+        self.checked = len(self.nodes) == 1 or probe is None
+        self.lock = threading.Lock()
+        self.check_lock = threading.Lock()
+        self.logger = logging.getLogger(__name__)
+
+    def coordinator(self):
+        """
+        Node that receives all mutations: the first healthy node in configured order.
+        :return: Node
+        """
+        self._ensure_checked()
+        with self.lock:
+            for node in self.nodes:
+                if node.healthy:
+                    return node
+            return self.nodes[0]
+
+    def read_nodes(self):
+        """
+        Healthy nodes in the order a read should try them. The first entry is picked at random, weighted by the
+        inverse of the measured latency, so load is spread across the cluster while slow nodes get less of it. The
+        rest, fastest first, are failover candidates.
+        :return: list of Node
+        """
+        self._ensure_checked()
+        self._recheck_down_nodes()
+        with self.lock:
+            healthy = [node for node in self.nodes if node.healthy]
+            if not healthy:
+                return list(self.nodes)
+            weights = [1.0 / max(node.latency or self.min_latency, self.min_latency) for node in healthy]
+            first = random.choices(healthy, weights=weights)[0]
+            rest = sorted((node for node in healthy if node is not first), key=lambda n: n.latency or 0.0)
+            return [first] + rest
+
+    def record(self, node, latency):
+        with self.lock:
+            node.observe(latency)
+            if not node.healthy:
+                self.logger.info("Node {} is back".format(node.url))
+            node.healthy = True
+            node.down_since = None
+
+    def mark_down(self, node):
+        with self.lock:
+            if node.healthy:
+                self.logger.warning("Node {} is not responding. Failing over.".format(node.url))
+            node.healthy = False
+            node.down_since = time.monotonic()
+
+    def health_check(self):
+        """
+        Probe every node in parallel and record whether it responded and how long it took.
+        """
+        if self.probe is None:
+            return
+        with ThreadPoolExecutor(max_workers=len(self.nodes)) as pool:
+            list(pool.map(self._check, self.nodes))
+        self.checked = True
+
+    def _check(self, node):
+        started = time.monotonic()
+        try:
+            ok = self.probe(node.url)
+        except Exception as e:
+            self.logger.debug("Health check of {} failed: {}".format(node.url, e))
+            ok = False
+        if ok:
+            self.record(node, time.monotonic() - started)
+        else:
+            self.mark_down(node)
+
+    def _ensure_checked(self):
+        if not self.checked:
+            with self.check_lock:
+                if not self.checked:
+                    self.health_check()
+
+    def _recheck_down_nodes(self):
+        if self.probe is None:
+            return
+        now = time.monotonic()
+        for node in self.nodes:
+            if not node.healthy and now - node.down_since >= self.recheck_interval:
+                # Push the next recheck out first so concurrent readers don't all probe the same node.
+                node.down_since = now
+                self._check(node)
@@ -0,0 +1,146 @@
+import logging
+import threading
+
+from collections import defaultdict
+
+from nifiapi.model import ControllerService
+from nifiapi.tree import status_snapshots
+
+
+class ServiceListError(Exception):
+    """
+    Raised by a lookup when the controller services of a scope can't be listed, so it can't tell whether a service
+    exists.
+    """
+    pass
+
+
+##
+# Cache of the controller services visible from each scope: the global (controller level) scope, and per process group
+# the services of the group and all the groups it is nested in. Every scope is listed once, on first use, and then
+# answered locally. A service created through the index is added to the scope it was created in; scopes of other
+# groups are listed again, since they may see it too.
+#
+# Lookups and creation are serialized per scope and name, so concurrent get_or_create calls for the same service
+# create it only once. The locks only cover the threads of this process: another deploy running against the same
+# server at the same time can still create a second service with the name.
+##
+class ControllerServiceIndex:
+
+    # Scope of the global controller services.
+    GLOBAL = None
+
+    def __init__(self, api):
+        """
+        :param api: NifiApi instance
+        """
+        self.api = api
+        self.scopes = {}
+        self.depths = None
+        self.lock = threading.Lock()
+        self.locks = defaultdict(threading.Lock)
+        self.logger = logging.getLogger(__name__)
+
+    def services(self, group_id=GLOBAL):
+        """
+        All controller services visible from a scope.
+        :param group_id: process group id, or GLOBAL
+        :return: list of ControllerService, None if they could not be listed
+        """
+        with self._lock(("scope", group_id)):
+            if group_id not in self.scopes:
+                services = self.api.get_controller_service_models(group_id, include_ancestors=group_id is not None)
+                if services is None:
+                    return None
+                with self.lock:
+                    self.scopes[group_id] = services
+            with self.lock:
+                return list(self.scopes[group_id])
+
+    def find(self, name, group_id=GLOBAL):
+        """
+        The service with a name that components of a process group would use: the one in the group itself, or else in
+        the closest group it is nested in.
+        :param name: controller service name
+        :param group_id: process group id, or GLOBAL
+        :return: ControllerService or None if there is no service with the name
+        :raises ServiceListError: if the services of the scope could not be listed
+        """
+        services = self.services(group_id)
+        if services is None:
+            raise ServiceListError("Could not list the controller services of {}".format(
+                "the controller" if group_id is self.GLOBAL else "process group " + group_id))
+        candidates = [service for service in services if service.name == name]
+        if len(candidates) <= 1 or group_id is self.GLOBAL:
+            return candidates[0] if candidates else None
+        for service in candidates:
+            if service.parent_group_id == group_id:
+                return service
+        # Only needed when several ancestors have a service with the name, which is rare.
+        depths = self._depths()
+        return max(candidates, key=lambda service: depths.get(service.parent_group_id, -1))
+
+    def get_or_create(self, name, properties, group_id=GLOBAL):
+        """
+        Find a service visible from a scope, creating it in that scope if there is none.
+        :param name: controller service name
+        :param properties: (name, value) pairs to create it with. A "type" pair sets the service type.
+        :param group_id: process group id, or GLOBAL
+        :return: tuple of (ControllerService, True if it was created), or (None, False) if the scope could not be
+        listed or creating the service failed
+        """
+        with self._lock(("service", group_id, name)):
+            try:
+                service = self.find(name, group_id)
+            except ServiceListError as e:
+                # Without the listing a missing service can't be told apart from an existing one. Don't create it.
+                self.logger.error(str(e))
+                return None, False
+            if service is not None:
+                return service, False
+            if group_id is self.GLOBAL:
+                entity = self.api.create_controller_service(name, properties)
+            else:
+                entity = self.api.create_controller_for_process_group(name, properties, group_id)
+            if entity is None:
+                self.logger.error("Creating controller service {} failed".format(name))
+                return None, False
+            service = ControllerService.of(entity)
+            self.add(service)
+            return service, True
+
+    def add(self, service):
+        """
+        Record a new service in the cached scopes.
+        :param service: ControllerService
+        """
+        owner = service.parent_group_id
+        with self.lock:
+            if owner in self.scopes:
+                self.scopes[owner].append(service)
+            if owner is not self.GLOBAL:
+                # Groups nested in the owner see the service as well. Which ones those are isn't known without the
+                # group tree, so every other group scope is listed again on next use. Creating services is rare.
+                for group_id in list(self.scopes):
+                    if group_id is not self.GLOBAL and group_id != owner:
+                        del self.scopes[group_id]
+
+    def invalidate(self, group_id=GLOBAL):
+        """
+        Forget a scope, e.g. after services were removed. It is listed again on next use.
+        :param group_id: process group id, or GLOBAL
+        """
+        with self.lock:
+            self.scopes.pop(group_id, None)
+
+    def _depths(self):
+        with self._lock(("depths",)):
+            if self.depths is None:
+                status = self.api.get_process_group_status("root", recursive=True)
+                self.depths = dict((snapshot["id"], depth) for snapshot, parent, path, depth
+                                   in (status_snapshots(status) if status is not None else []))
+            return self.depths
+
+    def _lock(self, key):
+        with self.lock:
+            return self.locks[key]
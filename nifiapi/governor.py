@@ -0,0 +1,199 @@
+import logging
+import threading
+import time
+
+READ = "read"
+MUTATION = "mutation"
+DROP = "drop"
+
+# Status codes NiFi returns when the web tier or cluster coordinator is overloaded. 409 is also returned for
+# revision conflicts, so it is treated as a congestion signal but never retried.
+OVERLOAD_STATUS_CODES = (409, 429, 503)
+RETRY_STATUS_CODES = (429, 503)
+# A proxy can answer 503 after the cluster already accepted a request. Repeating a POST would then create the
+# component twice, so only these methods are retried.
+RETRY_METHODS = ("GET", "HEAD", "PUT", "DELETE")
+
+DEFAULT_LIMITS = {
+    READ: {"rate": 50.0, "burst": 20, "initial": 4, "minimum": 1, "maximum": 32, "latency_target": 1.0},
+    MUTATION: {"rate": 10.0, "burst": 5, "initial": 2, "minimum": 1, "maximum": 8, "latency_target": 2.0},
+    DROP: {"rate": 2.0, "burst": 2, "initial": 1, "minimum": 1, "maximum": 4, "latency_target": 2.0},
+}
+
+
+def classify(method, path):
+    """
+    Work out which endpoint class a request belongs to.
+    :param method: HTTP method
+    :param path: URL path of the request
+    :return: READ, MUTATION or DROP
+    """
+    if "/drop-requests" in path:
+        return DROP
+    if method.upper() in ("GET", "HEAD"):
+        return READ
+    return MUTATION
+
+
+##
+# Classic token bucket. acquire() blocks until a token is available. A caller that has to wait reserves the next
+# token and sleeps outside the lock, so waiters don't queue up behind each other's sleep.
+##
+class TokenBucket:
+
+    def __init__(self, rate, burst):
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            # Going below zero reserves a token that is only refilled later, the caller waits until then.
+            self.tokens -= 1.0
+            wait = -self.tokens / self.rate
+        if wait > 0:
+            time.sleep(wait)
+
+
+##
+# Concurrency limit with additive increase / multiplicative decrease. The limit grows by roughly one per window of
+# successful requests and is halved (at most once per cooldown) when a request is slow or the server pushes back.
+##
+class AimdLimiter:
+
+    def __init__(self, initial, minimum, maximum, latency_target, backoff=0.5, cooldown=1.0):
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.latency_target = latency_target
+        self.backoff = backoff
+        self.cooldown = cooldown
+        self.in_flight = 0
+        self.last_decrease = 0.0
+        self.cond = threading.Condition()
+
+    def acquire(self):
+        with self.cond:
+            while self.in_flight >= int(self.limit):
+                self.cond.wait()
+            self.in_flight += 1
+
+    def release(self, latency, overloaded):
+        """
+        Release a slot and feed the outcome of the request back into the limit.
+        :param latency: seconds the request took
+        :param overloaded: True if the server signalled overload
+        """
+        with self.cond:
+            self.in_flight -= 1
+            if overloaded or latency > self.latency_target:
+                now = time.monotonic()
+                if now - self.last_decrease >= self.cooldown:
+                    self.limit = max(float(self.minimum), self.limit * self.backoff)
+                    self.last_decrease = now
+            else:
+                self.limit = min(float(self.maximum), self.limit + 1.0 / self.limit)
+            self.cond.notify_all()
+
+
+##
+# Client side governor for every request NifiApi makes. Each endpoint class (reads, mutations, drop requests) gets
+# its own token bucket and AIMD concurrency limit, and 429/503 responses are retried with backoff, except for POSTs.
+##
+class Governor:
+
+    def __init__(self, limits=None, max_retries=5, retry_backoff=0.5):
+        """
+        :param limits: (optional) dict of endpoint class to settings, overriding DEFAULT_LIMITS
+        :param max_retries: how many times to retry a request the server rejected with 429/503. POSTs are never
+        retried.
+        :param retry_backoff: initial backoff in seconds, doubled for every retry
+        """
+        self.logger = logging.getLogger(__name__)
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.buckets = {}
+        self.limiters = {}
+        self.stats = {}
+        self.lock = threading.Lock()
+        for endpoint_class, defaults in DEFAULT_LIMITS.items():
+            settings = dict(defaults)
+            if limits is not None and endpoint_class in limits:
+                settings.update(limits[endpoint_class])
+            self.buckets[endpoint_class] = TokenBucket(settings["rate"], settings["burst"])
+            self.limiters[endpoint_class] = AimdLimiter(settings["initial"], settings["minimum"],
+                                                        settings["maximum"], settings["latency_target"])
+            self.stats[endpoint_class] = {"requests": 0, "retries": 0, "overloaded": 0, "seconds": 0.0}
+
+    def call(self, method, path, send):
+        """
+        Run a request under the governor.
+        :param method: HTTP method
+        :param path: URL path, used to classify the request
+        :param send: callable taking no arguments that performs the request and returns the response
+        :return: the response returned by send
+        """
+        endpoint_class = classify(method, path)
+        bucket = self.buckets[endpoint_class]
+        limiter = self.limiters[endpoint_class]
+        backoff = self.retry_backoff
+        attempt = 0
+        while True:
+            bucket.acquire()
+            limiter.acquire()
+            started = time.monotonic()
+            response = None
+            try:
+                response = send()
+            finally:
+                latency = time.monotonic() - started
+                overloaded = response is not None and response.status_code in OVERLOAD_STATUS_CODES
+                limiter.release(latency, overloaded)
+                self._record(endpoint_class, latency, overloaded, attempt > 0)
+
+            if response.status_code not in RETRY_STATUS_CODES or method.upper() not in RETRY_METHODS or \
+                    attempt >= self.max_retries:
+                return response
+            attempt += 1
+            delay = self._retry_after(response, backoff)
+            self.logger.debug("{} {} returned {}. Retry {} in {:.2f}s".format(method, path, response.status_code,
+                                                                             attempt, delay))
+            time.sleep(delay)
+            backoff *= 2
+
+    def describe(self):
+        """
+        One line summary of the requests made and the current concurrency limits.
+        :return: string
+        """
+        parts = []
+        with self.lock:
+            for endpoint_class, stats in self.stats.items():
+                parts.append("{}: {} requests, {} retries, {} overloaded, {:.2f}s, limit {:.1f}".format(
+                    endpoint_class, stats["requests"], stats["retries"], stats["overloaded"], stats["seconds"],
+                    self.limiters[endpoint_class].limit))
+        return "; ".join(parts)
+
+    def _record(self, endpoint_class, latency, overloaded, retry):
+        with self.lock:
+            stats = self.stats[endpoint_class]
+            stats["requests"] += 1
+            stats["seconds"] += latency
+            if overloaded:
+                stats["overloaded"] += 1
+            if retry:
+                stats["retries"] += 1
+
+    def _retry_after(self, response, backoff):
+        retry_after = response.headers.get("Retry-After")
+        if retry_after is not None:
+            try:
+                return float(retry_after)
+            except ValueError:
+                pass
+        return backoff
@@ -0,0 +1,170 @@
+import logging
+import time
+
+from nifiapi.tree import status_snapshots
+
+# NiFi's status counters cover a rolling five minute window.
+STATS_WINDOW = 300.0
+
+ERROR = "ERROR"
+
+THROUGHPUT = "throughput"
+QUEUED = "queued"
+ERRORS = "errors"
+
+
+##
+# How far a newly deployed flow may fall behind the flow it replaced before it is rolled back.
+##
+class Thresholds:
+
+    def __init__(self, min_throughput=0.8, max_queued=2.0, queued_slack=1000, max_errors=0):
+        """
+        :param min_throughput: lowest acceptable ratio of flowfiles out per second, new flow over old flow
+        :param max_queued: highest acceptable ratio of the backlog the new flow builds up to the old flow's backlog
+        :param queued_slack: flowfiles the backlog may exceed that by, so a flow whose queues were empty may still
+        buffer a little
+        :param max_errors: error bulletins the new flow may raise in the window on top of the old flow's error rate
+        """
+        self.min_throughput = min_throughput
+        self.max_queued = max_queued
+        self.queued_slack = queued_slack
+        self.max_errors = max_errors
+
+
+def bulletin_cursor(api):
+    """
+    :param api: NifiApi instance
+    :return: id of the latest bulletin on the board, None if the board is empty or could not be read
+    """
+    # Which end of the board a limit keeps isn't specified, so read all of it and take the highest id.
+    bulletins = api.get_bulletins()
+    return max(bulletin["id"] for bulletin in bulletins) if bulletins else None
+
+
+def sample(api, pg_id, after=None, elapsed=STATS_WINDOW):
+    """
+    Throughput, backlog and errors of a process group and all nested process groups, from one status request and
+    one bulletin board request. Throughput is the flowfiles and bytes the processors in the groups transferred.
+    :param api: NifiApi instance
+    :param pg_id: process group id
+    :param after: (optional) only count bulletins with a greater id. Without it every error on the board counts.
+    :param elapsed: seconds the counters cover. NiFi keeps them for five minutes, so for a group that was started
+    more recently this is the time since it started.
+    :return: dict with flowfiles_out, bytes_out, queued, errors, elapsed and cursor (latest bulletin id seen), or
+    None if the status could not be read
+    """
+    status = api.get_process_group_status(pg_id, recursive=True)
+    if status is None:
+        return None
+    aggregate = status["processGroupStatus"]["aggregateSnapshot"]
+    group_ids = set()
+    flowfiles_out = 0
+    bytes_out = 0
+    for snapshot, parent, path, depth in status_snapshots(status):
+        group_ids.add(snapshot["id"])
+        # The group's own flowFilesOut only counts what leaves through its output ports, which is nothing for a
+        # top level flow. What its processors transfer is the work it does.
+        for processor in snapshot.get("processorStatusSnapshots") or []:
+            processor = processor["processorStatusSnapshot"]
+            flowfiles_out += processor.get("flowFilesOut", 0)
+            bytes_out += processor.get("bytesOut", 0)
+    bulletins = api.get_bulletins(after) or []
+    errors = [bulletin for bulletin in bulletins
+              if bulletin.get("groupId") in group_ids and (bulletin.get("bulletin") or {}).get("level") == ERROR]
+    return {"flowfiles_out": flowfiles_out, "bytes_out": bytes_out,
+            "queued": aggregate.get("flowFilesQueued", 0), "errors": len(errors),
+            "elapsed": min(elapsed, STATS_WINDOW), "cursor": bulletins[-1]["id"] if bulletins else after}
+
+
+def baseline(api, pg_id):
+    """
+    Sample the flow that is about to be replaced. Call this while it is still running.
+    :param api: NifiApi instance
+    :param pg_id: id of the existing process group, None if there is none. The new flow is then only held to the
+    queued slack and max errors.
+    :return: sample dict, see sample. None if the status could not be read.
+    """
+    if pg_id is None:
+        return {"flowfiles_out": 0, "bytes_out": 0, "queued": 0, "errors": 0, "elapsed": STATS_WINDOW,
+                "cursor": bulletin_cursor(api)}
+    return sample(api, pg_id)
+
+
+def compare(before, after, thresholds, window):
+    """
+    Compare a sample of the new flow against the baseline.
+    :param before: baseline sample
+    :param after: sample of the new flow
+    :param thresholds: Thresholds
+    :param window: seconds the new flow was watched for
+    :return: list of dicts with metric, before, after, limit and ok
+    """
+    deltas = []
+    rate_before = before["flowfiles_out"] / before["elapsed"]
+    rate_after = after["flowfiles_out"] / after["elapsed"] if after["elapsed"] > 0 else 0.0
+    limit = rate_before * thresholds.min_throughput
+    # An idle flow can't regress.
+    deltas.append({"metric": THROUGHPUT, "before": rate_before, "after": rate_after, "limit": limit,
+                   "ok": rate_before == 0 or rate_after >= limit})
+    limit = before["queued"] * thresholds.max_queued + thresholds.queued_slack
+    deltas.append({"metric": QUEUED, "before": before["queued"], "after": after["queued"], "limit": limit,
+                   "ok": after["queued"] <= limit})
+    # The baseline errors cover the whole stats window, scale them to the time the new flow was watched.
+    errors_before = before["errors"] * min(window, STATS_WINDOW) / STATS_WINDOW
+    limit = errors_before + thresholds.max_errors
+    deltas.append({"metric": ERRORS, "before": errors_before, "after": after["errors"], "limit": limit,
+                   "ok": after["errors"] <= limit})
+    return deltas
+
+
+def watch(api, pg_id, before, thresholds, window, interval=30.0, started=None):
+    """
+    Sample a newly started flow until the window is over. Errors only ever add up, so the watch ends early once
+    there are more than the thresholds allow.
+    :param api: NifiApi instance
+    :param pg_id: id of the new process group
+    :param before: baseline sample
+    :param thresholds: Thresholds
+    :param window: seconds to watch the new flow for
+    :param interval: seconds between samples
+    :param started: (optional) time the new flow was started, defaults to now
+    :return: tuple of (last sample, list of deltas, see compare). Both are None if the flow could not be sampled.
+    """
+    logger = logging.getLogger(__name__)
+    started = time.time() if started is None else started
+    deadline = started + window
+    current = None
+    deltas = None
+    while True:
+        now = time.time()
+        sampled = sample(api, pg_id, before["cursor"], now - started)
+        if sampled is not None:
+            current = sampled
+            deltas = compare(before, current, thresholds, now - started)
+            logger.debug("Guard sample after {:.0f}s:\n{}".format(now - started, format_deltas(deltas)))
+            if not all(delta["ok"] for delta in deltas if delta["metric"] == ERRORS):
+                return current, deltas
+        if now >= deadline:
+            return current, deltas
+        time.sleep(min(interval, deadline - now))
+
+
+def regressed(deltas):
+    """
+    :param deltas: result of compare, or None if the new flow could not be sampled
+    :return: True if any threshold was exceeded
+    """
+    return deltas is None or not all(delta["ok"] for delta in deltas)
+
+
+def format_deltas(deltas):
+    """
+    :param deltas: result of compare
+    :return: a header line and one line per metric
+    """
+    lines = ["{:<12}{:>12}{:>12}".format("metric", "before", "after")]
+    for delta in deltas:
+        lines.append("{:<12}{:>12.2f}{:>12.2f}  limit {:.2f}{}".format(
+            delta["metric"], delta["before"], delta["after"], delta["limit"], "" if delta["ok"] else "  REGRESSED"))
+    return "\n".join(lines)
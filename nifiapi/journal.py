@@ -0,0 +1,115 @@
+import json
+import logging
+import os
+import threading
+import time
+
+from nifiapi.model import Model
+
+JOURNAL_VERSION = 1
+
+
+def _encode(obj):
+    # Models are journaled by id; the operations that consume them accept an id as well.
+    if isinstance(obj, Model):
+        return obj.id
+    raise TypeError("{} can not be journaled".format(type(obj).__name__))
+
+
+##
+# Append only record of the operations of a deploy that finished, with the results they produced (template id, new
+# process group id, ...). Every entry is flushed and synced before the next operation can depend on it, so after a
+# crash the journal holds exactly the operations that completed.
+#
+# The first line identifies the deploy (template, url, ...). A journal written for a different deploy is never
+# resumed from.
+##
+class DeployJournal:
+
+    def __init__(self, filename, key, resume=False):
+        """
+        :param filename: journal file
+        :param key: JSON serializable dict identifying the deploy
+        :param resume: True to load the entries of an existing journal, False to start a new one
+        """
+        self.filename = filename
+        self.key = key
+        self.entries = {}
+        self.lock = threading.Lock()
+        self.logger = logging.getLogger(__name__)
+        if resume:
+            self._load()
+        # Rewrite the journal with the entries that were loaded, dropping a line the last deploy may have left
+        # half written. The old journal is only replaced once the new one is complete.
+        self.file = open(filename + ".tmp", "w")
+        self._write({"version": JOURNAL_VERSION, "key": key, "started": time.time()})
+        for name, result in self.entries.items():
+            self._write({"op": name, "result": result})
+        self.file.close()
+        os.replace(filename + ".tmp", filename)
+        self.file = open(filename, "a")
+
+    def __contains__(self, name):
+        return name in self.entries
+
+    def __len__(self):
+        return len(self.entries)
+
+    def result(self, name):
+        """
+        Result journaled for an operation.
+        :param name: name of the operation
+        :return: its result, as JSON
+        """
+        return self.entries[name]
+
+    def record(self, name, result):
+        """
+        Journal a finished operation.
+        :param name: name of the operation
+        :param result: its result. Must be JSON serializable or a model.
+        """
+        with self.lock:
+            self._write({"op": name, "result": result, "at": time.time()})
+            self.entries[name] = json.loads(json.dumps(result, default=_encode))
+
+    def close(self):
+        with self.lock:
+            self.file.close()
+
+    def remove(self):
+        """
+        Close and delete the journal, once the deploy has finished and there is nothing left to resume.
+        """
+        self.close()
+        if os.path.exists(self.filename):
+            os.remove(self.filename)
+
+    def _load(self):
+        if not os.path.exists(self.filename):
+            self.logger.warning("No journal {} to resume from. Starting from the top.".format(self.filename))
+            return
+        entries = {}
+        with open(self.filename) as f:
+            for number, line in enumerate(f):
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # The last line may be cut short if the deploy died while writing it.
+                    self.logger.warning("Ignoring truncated journal line {}".format(number + 1))
+                    break
+                if number == 0:
+                    if entry.get("version") != JOURNAL_VERSION or entry.get("key") != self.key:
+                        self.logger.warning("Journal {} was written for a different deploy. Starting from the "
+                                            "top.".format(self.filename))
+                        return
+                    continue
+                entries[entry["op"]] = entry["result"]
+        self.entries = entries
+        self.logger.info("Loaded {} completed operations from journal {}".format(len(entries), self.filename))
+
+    def _write(self, entry):
+        self.file.write(json.dumps(entry, default=_encode, separators=(",", ":")))
+        self.file.write("\n")
+        self.file.flush()
+        os.fsync(self.file.fileno())
@@ -0,0 +1,241 @@
+import sys
+
+
+##
+# Compact, typed views of the entities returned by the Nifi Api. Each class keeps only the fields this library uses,
+# in __slots__, with ids, states and types interned so the many repeated strings (parent group ids, connection
+# endpoints, property names) are shared. The full JSON payload is never kept; raw() fetches it again on demand.
+#
+# Every NifiApi method that takes an entity accepts either the raw JSON dict or one of these models.
+##
+
+
+def _intern(value):
+    if value is None:
+        return None
+    return sys.intern(value)
+
+
+def entity_id(obj):
+    """
+    Id of an entity given as a model or raw JSON.
+    :param obj: model or JSON entity
+    :return: id string
+    """
+    if isinstance(obj, Model):
+        return obj.id
+    if "id" in obj:
+        return obj["id"]
+    return obj["component"]["id"]
+
+
+def revision_version(obj):
+    """
+    Revision version of an entity given as a model or raw JSON.
+    :param obj: model or JSON entity
+    :return: revision version
+    """
+    if isinstance(obj, Model):
+        return obj.revision.version
+    return obj["revision"]["version"]
+
+
+class Revision:
+    __slots__ = ("version", "client_id")
+
+    def __init__(self, version, client_id=None):
+        self.version = version
+        self.client_id = client_id
+
+    @classmethod
+    def from_entity(cls, entity):
+        revision = entity.get("revision") or {}
+        return cls(revision.get("version"), revision.get("clientId"))
+
+    def __repr__(self):
+        return "Revision({})".format(self.version)
+
+
+class Model:
+    __slots__ = ("id", "name", "parent_group_id", "revision")
+
+    # Api path the raw entity is fetched from, the id is appended.
+    endpoint = None
+
+    def __init__(self, id, name=None, parent_group_id=None, revision=None):
+        self.id = _intern(id)
+        self.name = name
+        self.parent_group_id = _intern(parent_group_id)
+        self.revision = revision if revision is not None else Revision(None)
+
+    @classmethod
+    def of(cls, obj):
+        """
+        Return obj as a model, converting raw JSON if necessary.
+        :param obj: model, JSON entity or None
+        :return: model or None
+        """
+        if obj is None or isinstance(obj, cls):
+            return obj
+        return cls.from_entity(obj)
+
+    @classmethod
+    def from_entity(cls, entity):
+        component = entity.get("component") or {}
+        return cls(entity.get("id", component.get("id")), component.get("name"), component.get("parentGroupId"),
+                   Revision.from_entity(entity))
+
+    def raw(self, api):
+        """
+        Fetch the full JSON entity from the server.
+        :param api: NifiApi instance
+        :return: JSON entity or None
+        """
+        return api.remote_get(self.endpoint, self.id)
+
+    def __repr__(self):
+        return "{}({}, {})".format(type(self).__name__, self.id, self.name)
+
+
+class Processor(Model):
+    __slots__ = ("type", "state", "properties")
+
+    endpoint = "/processors/"
+
+    def __init__(self, id, name=None, parent_group_id=None, revision=None, type=None, state=None, properties=None):
+        Model.__init__(self, id, name, parent_group_id, revision)
+        self.type = _intern(type)
+        self.state = _intern(state)
+        self.properties = properties if properties is not None else {}
+
+    @classmethod
+    def from_entity(cls, entity):
+        component = entity["component"]
+        properties = {}
+        for key, value in ((component.get("config") or {}).get("properties") or {}).items():
+            properties[sys.intern(key)] = value
+        return cls(entity.get("id", component.get("id")), component.get("name"), component.get("parentGroupId"),
+                   Revision.from_entity(entity), component.get("type"), component.get("state"), properties)
+
+
+class Port(Model):
+    __slots__ = ("port_type", "state")
+
+    INPUT = "INPUT_PORT"
+    OUTPUT = "OUTPUT_PORT"
+
+    def __init__(self, id, name=None, parent_group_id=None, revision=None, port_type=None, state=None):
+        Model.__init__(self, id, name, parent_group_id, revision)
+        self.port_type = _intern(port_type)
+        self.state = _intern(state)
+
+    @property
+    def endpoint(self):
+        return "/input-ports/" if self.port_type == self.INPUT else "/output-ports/"
+
+    @classmethod
+    def from_entity(cls, entity):
+        component = entity["component"]
+        return cls(entity.get("id", component.get("id")), component.get("name"), component.get("parentGroupId"),
+                   Revision.from_entity(entity), component.get("type", entity.get("portType")),
+                   component.get("state"))
+
+
+class Connection(Model):
+    __slots__ = ("source_id", "source_type", "source_group_id", "destination_id", "destination_type",
+                 "destination_group_id", "queued")
+
+    endpoint = "/connections/"
+
+    def __init__(self, id, name=None, parent_group_id=None, revision=None, source=None, destination=None,
+                 queued=0):
+        Model.__init__(self, id, name, parent_group_id, revision)
+        source = source or {}
+        destination = destination or {}
+        self.source_id = _intern(source.get("id"))
+        self.source_type = _intern(source.get("type"))
+        self.source_group_id = _intern(source.get("groupId"))
+        self.destination_id = _intern(destination.get("id"))
+        self.destination_type = _intern(destination.get("type"))
+        self.destination_group_id = _intern(destination.get("groupId"))
+        self.queued = queued
+
+    @classmethod
+    def from_entity(cls, entity):
+        component = entity["component"]
+        queued = 0
+        status = entity.get("status")
+        if status is not None and "aggregateSnapshot" in status:
+            queued = status["aggregateSnapshot"].get("flowFilesQueued", 0)
+        return cls(entity.get("id", component.get("id")), component.get("name"), component.get("parentGroupId"),
+                   Revision.from_entity(entity), component.get("source"), component.get("destination"), queued)
+
+
+class ControllerService(Model):
+    __slots__ = ("type", "state", "properties")
+
+    endpoint = "/controller-services/"
+
+    def __init__(self, id, name=None, parent_group_id=None, revision=None, type=None, state=None, properties=None):
+        Model.__init__(self, id, name, parent_group_id, revision)
+        self.type = _intern(type)
+        self.state = _intern(state)
+        self.properties = properties if properties is not None else {}
+
+    @classmethod
+    def from_entity(cls, entity):
+        component = entity["component"]
+        properties = {}
+        for key, value in (component.get("properties") or {}).items():
+            properties[sys.intern(key)] = value
+        return cls(entity.get("id", component.get("id")), component.get("name"), component.get("parentGroupId"),
+                   Revision.from_entity(entity), component.get("type"), component.get("state"), properties)
+
+
+class ProcessGroup(Model):
+    __slots__ = ("processors", "connections", "input_ports", "output_ports", "process_groups")
+
+    endpoint = "/process-groups/"
+
+    def __init__(self, id, name=None, parent_group_id=None, revision=None):
+        Model.__init__(self, id, name, parent_group_id, revision)
+        self.processors = []
+        self.connections = []
+        self.input_ports = []
+        self.output_ports = []
+        # Child groups, without their contents.
+        self.process_groups = []
+
+    @classmethod
+    def of(cls, obj):
+        """
+        Return obj as a model. Accepts a process group entity or a processGroupFlow object.
+        :param obj: model, JSON or None
+        :return: ProcessGroup or None
+        """
+        if obj is None or isinstance(obj, cls):
+            return obj
+        if "processGroupFlow" in obj:
+            return cls.from_flow(obj)
+        return cls.from_entity(obj)
+
+    @classmethod
+    def from_flow(cls, pgf):
+        """
+        Build a process group with its contents from a /flow/process-groups/{id} response.
+        :param pgf: JSON object containing the processGroupFlow object
+        :return: ProcessGroup
+        """
+        group_flow = pgf["processGroupFlow"]
+        name = None
+        breadcrumb = group_flow.get("breadcrumb")
+        if breadcrumb is not None and "breadcrumb" in breadcrumb:
+            name = breadcrumb["breadcrumb"].get("name")
+        pg = cls(group_flow["id"], name, group_flow.get("parentGroupId"))
+        flow = group_flow["flow"]
+        pg.processors = [Processor.from_entity(p) for p in flow.get("processors", [])]
+        pg.connections = [Connection.from_entity(c) for c in flow.get("connections", [])]
+        pg.input_ports = [Port.from_entity(p) for p in flow.get("inputPorts", [])]
+        pg.output_ports = [Port.from_entity(p) for p in flow.get("outputPorts", [])]
+        pg.process_groups = [ProcessGroup.from_entity(g) for g in flow.get("processGroups", [])]
+        return pg
@@ -5,9 +5,24 @@ import uuid
 import json
 import re
 import configparser
+import threading
+import time
 
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from time import sleep
 
+from nifiapi.cluster import NodeRouter
+from nifiapi.governor import Governor
+from nifiapi.model import ProcessGroup, Processor, Port, ControllerService, entity_id, revision_version
+from nifiapi import cassette
+from nifiapi import controllers
+from nifiapi import overlay
+from nifiapi import topology
+from nifiapi import trace
+from nifiapi import tree
+from nifiapi import walker
+
 logging.config.fileConfig("config/logging.conf")
 
 
@@ -21,75 +36,157 @@ class NifiApi:
     CONTROLLER_ENABLED = "ENABLED"
     CONTROLLER_DISABLED = "DISABLED"
 
-    def __init__(self, base_url):
-        self.url = base_url
+    def __init__(self, base_url, governor=None, auth=None, tracer=None):
+        """
+        :param base_url: Nifi API url, e.g. http://localhost:8080/nifi-api. For a cluster this can be a list (or a
+        comma separated string) of node urls. Reads are spread across the healthy nodes, mutations all go to the
+        first healthy node in the list.
+        :param governor: (optional) Governor that rate limits and bounds concurrency of every request. A default
+        Governor is created if none is given.
+        :param auth: (optional) TokenAuth for secured clusters. Every request then carries a bearer token.
+        :param tracer: (optional) trace.Tracer that times the phases of the helpers below, per process group.
+        """
+        urls = base_url.split(',') if isinstance(base_url, str) else list(base_url)
+        self.url = urls[0]
         self.logger = logging.getLogger(__name__)
-
-    def write_sensitive_properties(self, pg_id, sensitive_file):
+        self.governor = governor if governor is not None else Governor()
+        self.tracer = tracer if tracer is not None else trace.NullTracer()
+        self.session = requests.Session()
+        self.router = NodeRouter(urls, probe=self.probe_node)
+        self.auth = auth
+        self.terminate_supported = True
+        self.service_lock = threading.Lock()
+        self.service_locks = defaultdict(threading.Lock)
+        self.controller_services = controllers.ControllerServiceIndex(self)
+
+    def write_sensitive_properties(self, pg_id, sensitive_file, applied=None, configured=None):
+        """
+        Set the properties from the sensitive config on the processors of a process group, and update the controller
+        services they reference.
+        :param pg_id: process group id
+        :param sensitive_file: config file with a section per processor/controller service name
+        :param applied: (optional) result of overlay.overlay_template. Properties already written into the template
+        are skipped.
+        :param configured: (optional) set of the controller service ids already updated, shared by the calls for the
+        groups of one deploy. Services referenced from several groups are then only updated once.
+        :return: True if successful, False otherwise
+        """
         config = configparser.RawConfigParser()
         config.optionxform = str  # Preserve case
         config.read(sensitive_file)  # This file shouldn't be checked in
         processors = self.get_processors_by_pg(pg_id)
+        if processors is None:
+            self.logger.error("Could not get the processors of process group {}".format(pg_id))
+            return False
+        ok = True
         for processor in processors["processors"]:
-            self.logger.debug("Processor: {}".format(processor["component"]["name"]))
-            if config.has_section(processor["component"]["name"]):
+            processor = Processor.of(processor)
+            self.logger.debug("Processor: {}".format(processor.name))
+            if config.has_section(processor.name):
                 self.logger.debug("Found. Setting properties")
                 properties = {}
-                for name, value in config.items(processor["component"]["name"]):
+                for name, value in config.items(processor.name):
+                    if overlay.is_applied(applied, overlay.PROCESSORS, processor.name, name):
+                        continue
                     properties[name] = value
                     self.logger.debug("{} = {}".format(name, value))
-                rtn = self.set_processor_properties(processor, properties)
-                self.logger.debug("set_processor_properties returned {}".format(json.dumps(rtn)))
-            for key, value in processor['component']['config']['properties'].items():
+                if properties:
+                    rtn = self.set_processor_properties(processor, properties)
+                    self.logger.debug("set_processor_properties returned {}".format(json.dumps(rtn)))
+            for key, value in processor.properties.items():
                 if value is None:
                     continue
                 self.logger.debug("Checking properties. {}/{}".format(key, value))
                 # If our value is a uuid then it's likely a controller service. Update those properties.
                 if re.search('[a-f0-9]{8}-[a-f0-9]{4}-[a-f0-9]{4}-[a-f0-9]{4}-[a-f0-9]{12}', value):
-                    self.recurse_update_controller(value, config)
+                    with self.tracer.span("controller_update", id=value):
+                        ok = self.recurse_update_controller(value, config, applied, configured) and ok
+        return ok
+
+    def recurse_update_controller(self, controller_id, config, applied=None, configured=None):
+        """
+        Update a controller service from the sensitive config: disable it, set the properties and enable it again.
+        Updates of the same service are serialized, since processors in several groups may reference it and each
+        step needs the current revision.
+        :param controller_id: controller service id
+        :param config: RawConfigParser with the sensitive config
+        :param applied: (optional) result of overlay.overlay_template
+        :param configured: (optional) set of the controller service ids already updated, see write_sensitive_properties
+        :return: True if successful (or there is no such service), False otherwise
+        """
+        with self._service_lock(controller_id):
+            if configured is not None and controller_id in configured:
+                return True
+            ok = self._update_controller(controller_id, config, applied)
+            if ok and configured is not None:
+                configured.add(controller_id)
+            return ok
 
-    def recurse_update_controller(self, controller_id, config):
+    def _update_controller(self, controller_id, config, applied):
         self.logger.debug("Updating controller id {}".format(controller_id))
-        controller_service = self.get_controller_service(controller_id)
+        controller_service = ControllerService.of(self.get_controller_service(controller_id))
         if controller_service is None:
             self.logger.warning("Could not find controller service with id: {}".format(controller_id))
-            return
-
-        self.logger.debug("Updating {}".format(json.dumps(controller_service['component']['name'])))
-        state = controller_service['component']['state']
-        if state == 'ENABLED':
-            self.logger.debug("Disabling controller")
-            controller_service = self.update_controller_status(controller_service, self.CONTROLLER_DISABLED)
-            self.logger.debug("{}".format(json.dumps(controller_service)))
+            return True
 
-        controller_name = controller_service['component']['name']
-        config_section = controller_name
-        if 'config_section' in controller_service['component']['properties']:
-            config_section = controller_service['component']['properties']['config_section']
+        config_section = controller_service.name
+        if 'config_section' in controller_service.properties:
+            config_section = controller_service.properties['config_section']
         self.logger.info("using section: {}".format(config_section))
+        # Services like the DistributedMapCacheClientService require a global service to be running. It is named
+        # by the _requires_service option and created from its own section if there is none yet.
+        if config.has_option(config_section, "_requires_service") and \
+                not self.require_service(config.get(config_section, "_requires_service"), config):
+            return False
+        properties = {}
         if config.has_section(config_section):
-            controller_obj = {
-                "component": {
-                    "id": controller_service["component"]["id"],
-                    "properties": {
-
-                    }
-                },
-                "revision": {
-                    "version": controller_service["revision"]["version"]
-                }
-            }
             for name, value in config.items(config_section):
-                if not name.startswith("_"):
+                if not name.startswith("_") and \
+                        not overlay.is_applied(applied, overlay.CONTROLLER_SERVICES, config_section, name):
                     self.logger.debug("Controller Setting {}={}".format(name, value))
-                    controller_obj["component"]["properties"][name] = value
-            self.logger.debug("controller properties {}".format(json.dumps(controller_obj)))
-            controller_service = self.update_controller_service(controller_obj)
-            if controller_service is not None:
-                self.logger.debug("update controller returned: {}".format(json.dumps(controller_service)))
-            else:
-                self.logger.warning("update controller returned None. Did it fail?")
-        rtn = self.update_controller_status(controller_service, self.CONTROLLER_ENABLED)
+                    properties[name] = value
+
+        # Nothing left to set (or everything came with the template), so skip the disable/update cycle.
+        if not properties:
+            if controller_service.state != self.CONTROLLER_ENABLED and \
+                    self.update_controller_status(controller_service, self.CONTROLLER_ENABLED) is None:
+                self.logger.error("Enabling controller {} failed".format(controller_service.name))
+                return False
+            return True
+
+        self.logger.debug("Updating {}".format(controller_service.name))
+        if controller_service.state == 'ENABLED':
+            self.logger.debug("Disabling controller")
+            controller_service = ControllerService.of(
+                self.update_controller_status(controller_service, self.CONTROLLER_DISABLED))
+            if controller_service is None:
+                self.logger.error("Disabling controller {} failed".format(controller_id))
+                return False
+            self.logger.debug("{}".format(controller_service))
+
+        controller_obj = {
+            "component": {
+                "id": controller_service.id,
+                "properties": properties
+            },
+            "revision": {
+                "version": controller_service.revision.version
+            }
+        }
+        self.logger.debug("controller properties {}".format(json.dumps(controller_obj)))
+        controller_service = self.update_controller_service(controller_obj)
+        if controller_service is None:
+            self.logger.error("Updating controller {} failed".format(controller_id))
+            return False
+        self.logger.debug("update controller returned: {}".format(json.dumps(controller_service)))
+        if self.update_controller_status(controller_service, self.CONTROLLER_ENABLED) is None:
+            self.logger.error("Enabling controller {} failed".format(controller_id))
+            return False
+        return True
+
+    def _service_lock(self, controller_id):
+        with self.service_lock:
+            return self.service_locks[controller_id]
 
     def get_root_process_group(self):
         """
@@ -101,48 +198,44 @@ class NifiApi:
     def empty_all_queues(self, pgf):
         """
         This function will empty all queues in the specified process group AND all nested process groups.
-        :param pgf: JSON object containing the processGroupFlow object
+        :param pgf: JSON object containing the processGroupFlow object, or a ProcessGroup
         :return: This method doesn't return anything
-        """
-        for connection in pgf["processGroupFlow"]["flow"]["connections"]:
-            if connection["status"]["aggregateSnapshot"]["flowFilesQueued"] > 0:
-                self.logger.debug("Sending drop request for connection id: {}".format(connection["component"]["id"]))
-                drop_request = self.empty_flowfile_queue(connection["component"]["id"])
-                if drop_request is None:
-                    self.logger.error(
-                        "Drop request for connection {} returned None!".format(connection["component"]["id"]))
-                    continue
-                self.logger.debug("drop request {}".format(json.dumps(drop_request)))
-                while not drop_request["dropRequest"]["finished"]:
-                    self.logger.debug("Drop request not finished. Waiting 5 sec and will try again.")
-                    sleep(5)
-                    drop_request = self.get_flowfile_queue_drop_status(connection["component"]["id"],
-                                                                       drop_request["dropRequest"]["id"])
-                self.logger.debug("Drop request finished.")
-
-        # Empty all queues for nested process groups
-        for pg in pgf["processGroupFlow"]["flow"]["processGroups"]:
-            flow_pg = self.get_process_group_by_id(pg['id'])
-            self.empty_all_queues(flow_pg)
+        :raises walker.WalkError: if a nested process group could not be fetched
+        """
+        for pg in self.walk_process_groups(pgf, strict=True):
+            with self.tracer.span("drain", group=pg.name, id=pg.id):
+                for connection in pg.connections:
+                    if connection.queued > 0:
+                        self.logger.debug("Sending drop request for connection id: {}".format(connection.id))
+                        drop_request = self.empty_flowfile_queue(connection.id)
+                        if drop_request is None:
+                            self.logger.error("Drop request for connection {} returned None!".format(connection.id))
+                            continue
+                        self.logger.debug("drop request {}".format(json.dumps(drop_request)))
+                        while not drop_request["dropRequest"]["finished"]:
+                            self.logger.debug("Drop request not finished. Waiting 5 sec and will try again.")
+                            sleep(5)
+                            drop_request = self.get_flowfile_queue_drop_status(connection.id,
+                                                                               drop_request["dropRequest"]["id"])
+                        self.logger.debug("Drop request finished.")
 
     def status_change_all_ports(self, pgf, status):
         """
         This function changes the status of all input and output ports contained in the specified process group to the
         specified value.
-        :param pgf:  JSON object containing the processGroupFlow object
+        :param pgf:  JSON object containing the processGroupFlow object, or a ProcessGroup
         :param status: Processor status values of RUNNING or STOPPED (see constants)
         :return: True if successful, False otherwise.
         """
-        if pgf["processGroupFlow"]["flow"]["inputPorts"]:
-            for port in pgf["processGroupFlow"]["flow"]["inputPorts"]:
-                port = self.remote_get("/input-ports/", port["component"]["id"])
-                self.logger.debug("port: {}".format(json.dumps(port)))
-                if not self.update_port(port, "input", status):
-                    return False
-        if pgf["processGroupFlow"]["flow"]["outputPorts"]:
-            for port in pgf["processGroupFlow"]["flow"]["outputPorts"]:
-                if not self.update_port(port, "output", status):
-                    return False
+        pg = ProcessGroup.of(pgf)
+        for port in pg.input_ports:
+            port = self.remote_get("/input-ports/", port.id)
+            self.logger.debug("port: {}".format(json.dumps(port)))
+            if not self.update_port(port, "input", status):
+                return False
+        for port in pg.output_ports:
+            if not self.update_port(port, "output", status):
+                return False
 
         return True
 
@@ -168,11 +261,11 @@ class NifiApi:
         """
         Iterate over all the configuration properties of a processor. If the value looks like
         a UUID, then check if it's a controller that needs to be updated.
-        :param processor:
+        :param processor: JSON processor object or Processor
         :param cstate:
         :return:
         """
-        for key, value in processor['component']['config']['properties'].items():
+        for key, value in Processor.of(processor).properties.items():
             if value is not None:
                 if re.search('[a-f0-9]{8}-[a-f0-9]{4}-[a-f0-9]{4}-[a-f0-9]{4}-[a-f0-9]{12}', value):
                     self.logger.debug("Found {} that needs to be updated".format(key))
@@ -184,40 +277,163 @@ class NifiApi:
                         self.logger.warning("Probably not a controller uuid: {}".format(value))
         return True
 
-    def status_change_all_processors(self, pgf, status, cstate):
+    def status_change_all_processors(self, pgf, status, cstate, workers=4, deadline=None, forced=None):
         """
-        This function changes the state of all processor that are contained in the given process group.
-        :param pgf: JSON object containing the processGroupFlow object
+        This function changes the state of all processors and ports that are contained in the given process group and
+        its nested process groups. They are changed in the order of the connections between them, so no processor
+        starts before the processors it feeds: starting goes from the sinks back to the sources, stopping from the
+        sources to the sinks. Components on the same level of the flow are changed in parallel.
+        :param pgf: JSON object containing the processGroupFlow object, or a ProcessGroup
         :param state: Processor state: RUNNING, STOPPED (see constants)
         :param cstate Controller state. ENABLED, DISABLED (see constants)
+        :param workers: (optional) number of components changed at the same time
+        :param deadline: (optional) when stopping, seconds to wait for the processors to finish their active threads
+        before they are terminated, see wait_for_threads. Controllers are only disabled after that.
+        :param forced: (optional) list the (id, name) of the processors whose threads were terminated are added to
         :return: True if successful, False otherwise
         """
+        graph = topology.FlowGraph()
+        root_id = None
+        root_name = None
+        try:
+            for pg in self.walk_process_groups(pgf, strict=True):
+                if root_id is None:
+                    root_id, root_name = pg.id, pg.name
+                graph.add_group(pg)
+        except walker.WalkError as e:
+            self.logger.error("{}. Not changing the status of a partial tree.".format(e))
+            return False
 
-        for processor in pgf["processGroupFlow"]["flow"]["processors"]:
-            # If we are enabling, that needs to be done BEFORE starting the processors.
-            if cstate is not None and cstate == self.CONTROLLER_ENABLED:
-                self.iterate_and_change_controllers(processor, cstate)
-            # Now change the processor status if it's different
-            if processor['component']['state'] != status:
-                if not self.change_processor_status(processor, status):
-                    self.logger.error("Failed to change status {}/{}".format(processor["component"]["name"],
-                                                                             json.dumps(processor)))
+        # If we are enabling, that needs to be done BEFORE starting the processors.
+        if cstate is not None and cstate == self.CONTROLLER_ENABLED:
+            with self.tracer.span("controller_enable", group=root_name, id=root_id):
+                for processor in graph.processors():
+                    self.iterate_and_change_controllers(processor, cstate)
+
+        phase = "start" if status == self.PROCESSOR_RUNNING else "stop"
+        levels = graph.levels(downstream_first=status == self.PROCESSOR_RUNNING)
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for number, level in enumerate(levels):
+                with self.tracer.span(phase, group=root_name, id=root_id, level=number, components=len(level)):
+                    changed = list(pool.map(lambda component: self.change_component_status(component, status), level))
+                if not all(changed):
+                    self.logger.error("Status changing level {} of {} failed.".format(number + 1, len(levels)))
                     return False
-            # If we are disabling, that needs to be done AFTER stopping the processors.
-            if cstate is not None and cstate == self.CONTROLLER_DISABLED:
-                self.iterate_and_change_controllers(processor, cstate)
 
-        # If there are any input/output ports, make sure to change them.
-        if not self.status_change_all_ports(pgf, status):
-            self.logger.error("Status changing ports failed.")
+        if deadline is not None and status == self.PROCESSOR_STOPPED and root_id is not None:
+            with self.tracer.span("threads", group=root_name, id=root_id):
+                terminated = self.wait_for_threads(root_id, deadline)
+            if terminated is None:
+                return False
+            if forced is not None:
+                forced.extend(terminated)
+
+        # If we are disabling, that needs to be done AFTER stopping the processors.
+        if cstate is not None and cstate == self.CONTROLLER_DISABLED:
+            with self.tracer.span("controller_disable", group=root_name, id=root_id):
+                for processor in graph.processors():
+                    self.iterate_and_change_controllers(processor, cstate)
+
+        return True
+
+    def wait_for_threads(self, pg_id, deadline, interval=1.0):
+        """
+        Wait for the stopped processors of a process group and all nested process groups to finish their active
+        threads. A stopped processor keeps running its current task, which can hang e.g. on I/O, and the group can't
+        be removed until it returns. Every poll is a single status request for the whole tree. Processors still
+        busy after the deadline have their threads terminated, if the server supports that.
+        :param pg_id: process group id
+        :param deadline: seconds to wait before terminating threads
+        :param interval: (optional) seconds between polls
+        :return: list of (id, name) of the processors whose threads were terminated, or None if threads are still
+        active or the status could not be read until the deadline
+        """
+        started = time.time()
+        while True:
+            busy = self.active_processors(pg_id)
+            if busy is not None and not busy:
+                return []
+            if time.time() - started >= deadline:
+                break
+            if busy is None:
+                # A single failed poll, e.g. a node busy stopping the processors, says nothing about the threads.
+                self.logger.warning("Reading the status of process group {} failed. Retrying.".format(pg_id))
+            else:
+                self.logger.debug("Waiting for {} processors to finish their threads".format(len(busy)))
+            sleep(min(interval, max(0.0, deadline - (time.time() - started))))
+
+        if busy is None:
+            self.logger.error("Could not read the status of process group {} within {:g}s".format(pg_id, deadline))
+            return None
+
+        forced = []
+        for processor_id, name, threads in busy:
+            self.logger.warning("Terminating {} threads of {} ({}) after {:g}s".format(
+                threads, name, processor_id, deadline))
+            if not self.terminate_processor_threads(processor_id):
+                self.logger.error("{} ({}) still has {} active threads{}".format(
+                    name, processor_id, threads,
+                    "" if self.terminate_supported else ", the server can't terminate them"))
+                return None
+            forced.append((processor_id, name))
+        self.logger.warning("Forced {} processors to stop: {}".format(
+            len(forced), ", ".join(name for processor_id, name in forced)))
+        return forced
+
+    def active_processors(self, pg_id):
+        """
+        Processors in a process group and all nested process groups that have active threads.
+        :param pg_id: process group id
+        :return: list of (id, name, active thread count), None if the status could not be read
+        """
+        status = self.get_process_group_status(pg_id, recursive=True)
+        if status is None:
+            return None
+        busy = []
+        for snapshot, parent, path, depth in tree.status_snapshots(status):
+            for processor in snapshot.get('processorStatusSnapshots') or []:
+                processor = processor['processorStatusSnapshot']
+                if processor.get('activeThreadCount', 0) > 0:
+                    busy.append((processor['id'], processor['name'], processor['activeThreadCount']))
+        return busy
+
+    def terminate_processor_threads(self, processor_id):
+        """
+        Terminate the active threads of a stopped processor. Only servers from NiFi 1.9 on support this.
+        :param processor_id: processor id
+        :return: True if the threads were terminated, False otherwise
+        """
+        if not self.terminate_supported:
+            return False
+        response = self.send('DELETE', '/processors/{}/threads'.format(processor_id),
+                             headers={'Accept': 'application/json'})
+        if response.status_code in (404, 405):
+            self.logger.warning("The server doesn't support terminating processor threads.")
+            self.terminate_supported = False
             return False
+        if response.status_code != 200:
+            self.logger.error('DELETE Error. Status code {} returned. {}'.format(response.status_code, response.text))
+            return False
+        return True
 
-        # Now recursively status change any nested process groups.
-        for pg in pgf["processGroupFlow"]["flow"]["processGroups"]:
-            flow_pg = self.get_process_group_by_id(pg['id'])
-            if not self.status_change_all_processors(flow_pg, status, cstate):
+    def change_component_status(self, component, status):
+        """
+        Change the status of a processor or port, if it isn't in that state already.
+        :param component: Processor or Port
+        :param status: RUNNING, STOPPED (see constants)
+        :return: True if successful, False otherwise
+        """
+        if component.state == status:
+            return True
+        if isinstance(component, Port):
+            if self.update_port(component, "input" if component.port_type == Port.INPUT else "output",
+                                status) is None:
+                self.logger.error("Failed to change status {}/{}".format(component.name, component.id))
                 return False
-
+            return True
+        if not self.change_processor_status(component, status):
+            self.logger.error("Failed to change status {}/{}".format(component.name, component.id))
+            return False
         return True
 
     def empty_flowfile_queue(self, id):
@@ -248,36 +464,36 @@ class NifiApi:
     def update_port(self, port, input_or_output, state):
         """
         Update the state of a single input or output port
-        :param port: the JSON port object
+        :param port: the JSON port object or Port
         :param input_or_output: literally, the string "input" or "output"
         :param state: Processor state RUNNING, STOPPED (see constants)
         :return:
         """
         new_port = {
             "component": {
-                "id": port["component"]["id"],
+                "id": entity_id(port),
                 "state": state
             },
             "revision": {
-                "version": port["revision"]["version"]
+                "version": revision_version(port)
             }
         }
-        return self.remote_put_data('/{}-ports/{}'.format(input_or_output, port["component"]["id"]), new_port)
+        return self.remote_put_data('/{}-ports/{}'.format(input_or_output, entity_id(port)), new_port)
 
     def update_controller_status(self, controller, state):
         """
         Update the state of a single controller service
-        :param controller: JSON object of the controller
+        :param controller: JSON object of the controller or ControllerService
         :param state: ENABLED,DISABLED (see constants)
         :return: JSON output from the api call
         """
         controller_status = {
             "component": {
-                "id": controller["component"]["id"],
+                "id": entity_id(controller),
                 "state": state
             },
             "revision": {
-                "version": controller["revision"]["version"]
+                "version": revision_version(controller)
             }
         }
         return self.update_controller_service(controller_status)
@@ -315,6 +531,27 @@ class NifiApi:
         logging.debug("{}".format(json.dumps(controller)))
         return controller
 
+    def require_service(self, name, config):
+        """
+        Make sure a global controller service exists, creating and enabling it if it doesn't. Looked up in the
+        controller service index, so the global services are listed once per deploy.
+        :param name: controller service name
+        :param config: RawConfigParser. The section named after the service holds the properties to create it with.
+        :return: True if the service exists or was created, False otherwise
+        """
+        properties = [(key, value) for key, value in (config.items(name) if config.has_section(name) else [])
+                      if not key.startswith("_")]
+        service, created = self.controller_services.get_or_create(name, properties)
+        if service is None:
+            self.logger.error("Creating required controller service {} failed".format(name))
+            return False
+        if created:
+            self.logger.info("Required service created {}/{}".format(name, service.id))
+            if self.update_controller_status(service, self.CONTROLLER_ENABLED) is None:
+                self.logger.error("Enabling required controller service {} failed".format(name))
+                return False
+        return True
+
     def create_controller_for_process_group(self, name, properties, process_group_id):
         """
         Create a controller service for a specific process group.
@@ -346,18 +583,17 @@ class NifiApi:
 
     def controller_exists(self, process_group_id, controller_name):
         """
-        Check if a controller with given controller_name exists in the specified process group
-        :param process_group_id: id of the process group
+        Check if a controller with given controller_name exists in the specified process group, or a group it is
+        nested in. Answered from the controller service index, so each group is only listed once.
+        :param process_group_id: id of the process group, None for the global controller services
         :param controller_name: name of the controller to look for
         :return: true if exists, false otherwise
+        :raises controllers.ServiceListError: if the controller services could not be listed
         """
         self.logger.debug("Checking if controller exists: {}/{}".format(process_group_id, controller_name))
-        controller_services = self.get_controller_services(process_group_id)
-        for controller in controller_services:
-            self.logger.debug("controller name {}".format(controller["component"]["name"]))
-            if controller["component"]["name"] == controller_name:
-                self.logger.debug("Controller found!")
-                return True
+        if self.controller_services.find(controller_name, process_group_id) is not None:
+            self.logger.debug("Controller found!")
+            return True
         self.logger.debug("Could not find controller")
         return False
 
@@ -367,10 +603,13 @@ class NifiApi:
             json = self.remote_get('/controller-services/', controller_service_id)
         return json
 
-    def get_controller_services(self, process_group_id):
+    def get_controller_services(self, process_group_id, include_descendants=False, include_ancestors=False):
         """
         Get all controller services associated with the given process group.
         :param process_group_id: id of the proces group. If None, retrieve global controller services.
+        :param include_descendants: (optional) also return the services of all nested process groups
+        :param include_ancestors: (optional) also return the services of the groups the process group is nested in,
+        i.e. every service its components can reference
         :return: JSON return from the api call.
         """
         json = None
@@ -378,31 +617,52 @@ class NifiApi:
         if process_group_id is None:
             json = self.remote_get('/flow/controller/controller-services', None)
         else:
-            json = self.remote_get('/flow/process-groups/{}/controller-services'.format(process_group_id), None)
+            path = '/flow/process-groups/{}/controller-services'.format(process_group_id)
+            query = []
+            if include_descendants:
+                query.append('includeDescendantGroups=true')
+            if include_ancestors:
+                query.append('includeAncestorGroups=true')
+            if query:
+                path += '?' + '&'.join(query)
+            json = self.remote_get(path, None)
         if json is not None:
             return json["controllerServices"]
         else:
             return None
 
+    def get_controller_service_models(self, process_group_id, include_descendants=False, include_ancestors=False):
+        """
+        Same as get_controller_services, returning ControllerService models.
+        :param process_group_id: id of the proces group. If None, retrieve global controller services.
+        :param include_descendants: (optional) also return the services of all nested process groups
+        :param include_ancestors: (optional) also return the services of the groups the process group is nested in
+        :return: list of ControllerService or None
+        """
+        services = self.get_controller_services(process_group_id, include_descendants, include_ancestors)
+        if services is None:
+            return None
+        return [ControllerService.of(service) for service in services]
+
     def set_processor_properties(self, processor, properties):
         """
         Set properties on a specific processor
-        :param processor: JSON processor object
+        :param processor: JSON processor object or Processor
         :param properties: dict of properties to set
         :return: JSON return from api call
         """
         update_json = {
-            "id": processor["id"],
+            "id": entity_id(processor),
             "component": {
                 "config": {
                     "properties": {
 
                     }
                 },
-                "id": processor["component"]["id"]
+                "id": entity_id(processor)
             },
             "revision": {
-                "version": processor["revision"]["version"]
+                "version": revision_version(processor)
             }
         }
         update_json["component"]["config"]["properties"] = properties
@@ -421,11 +681,11 @@ class NifiApi:
     def remove_process_group(self, process_group):
         """
         Remove the given process group
-        :param process_group: JSON process group object. (Not process group flow...)
+        :param process_group: JSON process group object or ProcessGroup. (Not process group flow...)
         :return:
         """
-        return self.remote_delete('/process-groups/{}/?version={}'.format(process_group['id'],
-                                                                          process_group['revision']['version']),
+        return self.remote_delete('/process-groups/{}/?version={}'.format(entity_id(process_group),
+                                                                          revision_version(process_group)),
                                   None)
 
     def upload_template(self, process_group_id, filename):
@@ -439,6 +699,63 @@ class NifiApi:
                                 filename,
                                 'application/xml')
 
+    def create_snippet(self, process_group):
+        """
+        Create a snippet containing a single process group.
+        :param process_group: JSON process group object or ProcessGroup (Not process group flow...)
+        :return: id of the snippet or None if it failed.
+        """
+        pg = ProcessGroup.of(process_group)
+        snippet = {
+            "snippet": {
+                "parentGroupId": pg.parent_group_id,
+                "processGroups": {
+                    pg.id: {
+                        "clientId": str(uuid.uuid4()),
+                        "version": pg.revision.version
+                    }
+                }
+            }
+        }
+        response = self.remote_post_data('/snippets', snippet)
+        if response is None:
+            return None
+        return response.json()["snippet"]["id"]
+
+    def create_template(self, process_group_id, snippet_id, name, description=""):
+        """
+        Create a template from a snippet.
+        :param process_group_id: id of the process group the snippet's components are in
+        :param snippet_id: id of the snippet, see create_snippet
+        :param name: name of the new template. Must be unique.
+        :param description: (optional) template description
+        :return: id of the template or None if it failed.
+        """
+        response = self.remote_post_data('/process-groups/{}/templates'.format(process_group_id),
+                                         {"name": name, "description": description, "snippetId": snippet_id})
+        if response is None:
+            return None
+        return response.json()["template"]["id"]
+
+    def download_template(self, id, out, chunk_size=65536):
+        """
+        Stream a template to a file object, without holding the whole template in memory.
+        :param id: id of the template
+        :param out: binary file object to write to
+        :param chunk_size: (optional) bytes read at a time
+        :return: number of bytes written or None if the download failed.
+        """
+        response = self.send('GET', '/templates/{}/download'.format(id), stream=True,
+                             headers={'Accept': 'application/xml'})
+        if response.status_code != 200:
+            self.logger.error('GET Error. Status code {} returned. {}'.format(response.status_code, response.text))
+            return None
+        written = 0
+        for chunk in response.iter_content(chunk_size):
+            out.write(chunk)
+            written += len(chunk)
+        return written
+
     def delete_template(self, id):
         """
         Delete a template
@@ -478,6 +795,70 @@ class NifiApi:
         """
         return self.remote_get('/flow/process-groups/', id)
 
+    def get_process_group_status(self, id, recursive=False):
+        """
+        Returns the status of a process group.
+        :param id: process group id
+        :param recursive: (optional) True to include the status of every nested process group. One request returns
+        the names and ids of the whole tree, which is much cheaper than walking it.
+        :return: JSON object returned from the api
+        """
+        return self.remote_get('/flow/process-groups/{}/status{}'.format(id, '?recursive=true' if recursive else ''),
+                               None)
+
+    def get_bulletins(self, after=None, limit=None):
+        """
+        Returns bulletins from the bulletin board, oldest first.
+        :param after: (optional) only return bulletins with an id greater than this one
+        :param limit: (optional) maximum number of bulletins to return
+        :return: list of bulletin entities or None if the request failed
+        """
+        query = []
+        if after is not None:
+            query.append('after={}'.format(after))
+        if limit is not None:
+            query.append('limit={}'.format(limit))
+        board = self.remote_get('/flow/bulletin-board' + ('?' + '&'.join(query) if query else ''), None)
+        if board is None:
+            return None
+        return sorted(board['bulletinBoard']['bulletins'] or [], key=lambda bulletin: bulletin['id'])
+
+    def get_process_group_model(self, id):
+        """
+        Returns the process group with its contents as a ProcessGroup model. The JSON payload is dropped as soon as
+        the model is built.
+        :param id: process group id
+        :return: ProcessGroup or None
+        """
+        return ProcessGroup.of(self.get_process_group_by_id(id))
+
+    def process_group_exists(self, id):
+        """
+        Check whether a process group exists, without logging an error if it doesn't.
+        :param id: process group id
+        :return: True if it exists, False if the api returned 404, None if that couldn't be determined
+        """
+        response = self.send('GET', '/process-groups/' + id, headers={'Accept': 'application/json'})
+        if response.status_code == 200:
+            return True
+        if response.status_code == 404:
+            return False
+        self.logger.error('GET Error. Status code {} returned. {}'.format(response.status_code, response.text))
+        return None
+
+    def walk_process_groups(self, root, order=walker.BFS, prefetch=4, prune=None, strict=False):
+        """
+        Lazily walk a process group and all nested process groups, prefetching the next groups in the background.
+        See walker.walk_process_groups.
+        :param root: process group id, or an already fetched processGroupFlow/ProcessGroup
+        :param order: walker.BFS or walker.DFS
+        :param prefetch: number of groups to fetch ahead of the caller
+        :param prune: (optional) callable taking a ProcessGroup, return True to skip its children
+        :param strict: raise walker.WalkError if a group can't be fetched, instead of skipping it and its children
+        :return: generator of ProcessGroup
+        """
+        return walker.walk_process_groups(self.get_process_group_model, root, order, prefetch, prune, strict)
+
     def remote_put_data(self, path, data):
         """
         Convenience function to do an HTTP PUT
@@ -485,8 +866,8 @@ class NifiApi:
         :param data: JSON object
         :return: JSON return from the api call or None if it failed.
         """
-        response = requests.put(self.url + path, json=data, headers={'Accept': 'application/json',
-                                                                     'Content-Type': 'application/json'})
+        response = self.send('PUT', path, json=data, headers={'Accept': 'application/json',
+                                                              'Content-Type': 'application/json'})
         # Sometimes it returns 201 (created) or 200
         if response.status_code > 299:
             self.logger.error('POST Error. Status code {} returned. Message {}'.format(response.status_code,
@@ -503,9 +884,9 @@ class NifiApi:
         :return: JSON object from api call or None.
         """
         if data is None:
-            response = requests.post(self.url + path)
+            response = self.send('POST', path)
         else:
-            response = requests.post(self.url + path, json=data)
+            response = self.send('POST', path, json=data)
 
         # Sometimes it returns 201 (created) or 200
         if response.status_code > 299:
@@ -614,23 +995,23 @@ class NifiApi:
     def change_processor_status(self, processor, status):
         """
         Change the status of a specific processor.
-        :param processor: JSON object containing the processor
+        :param processor: JSON object containing the processor or Processor
         :param status: RUNNING, STOPPED (see constants)
         :return: JSON output from the api call
         """
         modified_processor = {
             'revision': {
-                'version': processor["revision"]["version"],
+                'version': revision_version(processor),
                 'clientId': str(uuid.uuid4())
             },
             'status': {
                 'runStatus': status
             },
             'component': {
-                'id': processor['id'],
+                'id': entity_id(processor),
                 'state': status
             },
-            'id': processor['id']
+            'id': entity_id(processor)
         }
         logging.debug("Update processor payload: {}".format(json.dumps(modified_processor)))
         return self.update_processor(modified_processor)
@@ -643,15 +1024,33 @@ class NifiApi:
         :param templ_name: Name of the template
         :return: XML output from the API. I think this is the only API call that returns XML
         """
+        self.remove_template_by_name(templ_name)
+        return self.upload_template_entity(pg_id, template)
+
+    def remove_template_by_name(self, templ_name):
+        """
+        Remove the existing template with the specified name, if there is one.
+        :param templ_name: Name of the template
+        :return: True if a template was deleted, False otherwise.
+        """
         remote_template = self.get_remote_template(templ_name)
         if remote_template is not None:
             self.logger.debug('Remote Template Found. id: {}'.format(remote_template["id"]))
             response = self.delete_template(remote_template["id"])
             if response is not None:
                 self.logger.debug('Template deleted.')
+                return True
         else:
             self.logger.debug('Remote template not found.')
+        return False
 
+    def upload_template_entity(self, pg_id, template):
+        """
+        Upload a template and parse the XML template entity the API returns.
+        :param pg_id: Process group id
+        :param template: filename of the XML template to upload
+        :return: Root of the returned XML template entity or None if the upload failed.
+        """
         self.logger.debug('Attempting to upload template')
         response = self.upload_template(pg_id, template)
         if response is None:
@@ -698,8 +1097,10 @@ class NifiApi:
         """
         if accept_mime_type is None:
             accept_mime_type = 'application/json'
-        response = requests.post(url,
-                                 files={'template': open(filename, 'rb')},
+        path = url[len(self.url):] if url.startswith(self.url) else url
+        with open(filename, 'rb') as template_file:
+            response = self.send('POST', path,
+                                 files={'template': template_file},
                                  headers={'Accept': accept_mime_type})
 
         # Sometimes it returns 201 (created) or 200
@@ -717,9 +1118,9 @@ class NifiApi:
         :return: JSON response of the api call.
         """
         if id is None:
-            response = requests.delete(self.url + path)
+            response = self.send('DELETE', path)
         else:
-            response = requests.delete(self.url + path + id)
+            response = self.send('DELETE', path + id)
         if response.status_code != 200:
             self.logger.error('DELETE Error. Status code {} returned. {}'.format(response.status_code, response.text))
             return None
@@ -734,11 +1135,94 @@ class NifiApi:
         :return: JSON response of the api call.
         """
         if id is None:
-            response = requests.get(self.url + path, headers={'Accept': 'application/json'})
+            response = self.send('GET', path, headers={'Accept': 'application/json'})
         else:
-            response = requests.get(self.url + path + id, headers={'Accept': 'application/json'})
+            response = self.send('GET', path + id, headers={'Accept': 'application/json'})
         if response.status_code != 200:
             self.logger.error('GET Error. Status code {} returned. {}'.format(response.status_code, response.text))
             return None
         else:
             return response.json()
+
+    def send(self, method, path, **kwargs):
+        """
+        Lowest level function. Every HTTP call to the API goes through here and is run under the governor.
+        GETs are routed to the fastest healthy node and fail over to the next one if a node doesn't respond.
+        Everything else goes to the coordinator node.
+        :param method: HTTP method
+        :param path: URL path relative to the base url, or an absolute url
+        :param kwargs: passed on to requests
+        :return: the requests response
+        """
+        if path.startswith('http'):
+            return self.governor.call(method, path, lambda: self._request(method, path, kwargs))
+
+        if method in ('GET', 'HEAD'):
+            nodes = self.router.read_nodes()
+        else:
+            nodes = [self.router.coordinator()]
+        for i, node in enumerate(nodes):
+            try:
+                return self.governor.call(method, path, lambda: self._request_node(node, method, path, kwargs))
+            except (requests.ConnectionError, requests.Timeout):
+                self.router.mark_down(node)
+                if i == len(nodes) - 1:
+                    raise
+
+    def record(self, filename, redact_names=()):
+        """
+        Record every request and response, with timings, to a cassette file for offline replay.
+        :param filename: cassette file to write
+        :param redact_names: property names whose values must not be recorded
+        :return: the RecordingSession. Close it when done.
+        """
+        self.session = cassette.RecordingSession(self.session, filename, redact_names)
+        return self.session
+
+    def replay(self, filename, speed=1.0):
+        """
+        Serve every request from a recorded cassette instead of the server.
+        :param filename: cassette file to read
+        :param speed: factor applied to the recorded latencies. 0 replays without delays.
+        :return: the ReplaySession
+        """
+        self.session = cassette.ReplaySession(filename, speed)
+        return self.session
+
+    def probe_node(self, url):
+        """
+        Health check a single node. Any HTTP response, even an authentication error, means the node is up.
+        :param url: API url of the node
+        :return: True if the node is up
+        """
+        return self.session.get(url + '/flow/about', timeout=5).status_code < 500
+
+    def _request_node(self, node, method, path, kwargs):
+        started = time.monotonic()
+        response = self._request(method, node.url + path, kwargs)
+        self.router.record(node, time.monotonic() - started)
+        return response
+
+    def _request(self, method, url, kwargs):
+        if self.auth is None:
+            return self._session_request(method, url, kwargs)
+        login_url = self.router.coordinator().url
+        token = self.auth.get_token(self.session, login_url)
+        response = self._session_request(method, url, kwargs, token)
+        if response.status_code == 401:
+            # The token was revoked or expired early. Log in again, once, and retry.
+            self.logger.debug("401 returned, refreshing access token")
+            self.auth.invalidate(token, login_url)
+            token = self.auth.get_token(self.session, login_url)
+            response = self._session_request(method, url, kwargs, token)
+        return response
+
+    def _session_request(self, method, url, kwargs, token=None):
+        # Uploads may be retried, so rewind any file being sent.
+        for f in (kwargs.get('files') or {}).values():
+            f.seek(0)
+        if token is not None:
+            headers = dict(kwargs.get('headers') or {})
+            headers['Authorization'] = 'Bearer ' + token
+            kwargs = dict(kwargs, headers=headers)
+        return self.session.request(method, url, **kwargs)
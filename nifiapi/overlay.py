@@ -0,0 +1,140 @@
+import logging
+import xml.etree.ElementTree as ET
+import xml.sax
+
+from xml.sax.handler import ContentHandler
+from xml.sax.saxutils import XMLGenerator
+
+PROCESSORS = "processors"
+CONTROLLER_SERVICES = "controllerServices"
+
+# Elements that directly contain processors and controller services in a template.
+_CONTAINERS = ("contents", "snippet")
+
+
+def overlay_template(src, dst, config):
+    """
+    Stream a template from src to dst, writing the non-sensitive properties from config straight into its processors
+    and controller services. Sections are matched the same way write_sensitive_properties and
+    recurse_update_controller match them: processors by name, controller services by their config_section property
+    or their name. Properties the template marks as sensitive are left alone, they still have to be set through the
+    api once the template is instantiated.
+
+    Only one processor or controller service is held in memory at a time.
+    :param src: template XML file
+    :param dst: file to write the overlaid template to
+    :param config: ConfigParser with the environment properties (usually sensitive.cfg)
+    :return: dict of PROCESSORS/CONTROLLER_SERVICES to {section: set of property names written into the template}
+    """
+    with open(dst, "w", encoding="utf-8") as out:
+        handler = _OverlayHandler(out, config)
+        xml.sax.parse(src, handler)
+    return handler.applied
+
+
+def is_applied(applied, kind, section, name):
+    """
+    True if the overlay already wrote the given property into the template.
+    :param applied: result of overlay_template, or None
+    :param kind: PROCESSORS or CONTROLLER_SERVICES
+    :param section: config section
+    :param name: property name
+    """
+    return applied is not None and name in applied[kind].get(section, ())
+
+
+##
+# SAX handler that copies the document through an XMLGenerator, except for processors and controller services, which
+# are collected into small ElementTrees, overlaid and then written out.
+##
+class _OverlayHandler(ContentHandler):
+
+    def __init__(self, out, config):
+        ContentHandler.__init__(self)
+        self.out = out
+        self.config = config
+        self.generator = XMLGenerator(out, encoding="utf-8", short_empty_elements=False)
+        self.stack = []
+        self.builder = None
+        self.depth = 0
+        self.applied = {PROCESSORS: {}, CONTROLLER_SERVICES: {}}
+        self.logger = logging.getLogger(__name__)
+
+    def startDocument(self):
+        self.generator.startDocument()
+
+    def endDocument(self):
+        self.generator.endDocument()
+
+    def startElement(self, name, attrs):
+        if self.builder is not None:
+            self.builder.start(name, dict(attrs))
+            self.depth += 1
+        elif name in (PROCESSORS, CONTROLLER_SERVICES) and self.stack and self.stack[-1] in _CONTAINERS:
+            self.builder = ET.TreeBuilder()
+            self.builder.start(name, dict(attrs))
+            self.depth = 1
+        else:
+            self.stack.append(name)
+            self.generator.startElement(name, attrs)
+
+    def endElement(self, name):
+        if self.builder is None:
+            self.stack.pop()
+            self.generator.endElement(name)
+            return
+        self.builder.end(name)
+        self.depth -= 1
+        if self.depth == 0:
+            element = self.builder.close()
+            self.builder = None
+            self._overlay(element)
+            self.out.write(ET.tostring(element, encoding="unicode"))
+
+    def characters(self, content):
+        if self.builder is not None:
+            self.builder.data(content)
+        else:
+            self.generator.characters(content)
+
+    def ignorableWhitespace(self, content):
+        self.characters(content)
+
+    def _overlay(self, element):
+        name = element.findtext("name")
+        if element.tag == PROCESSORS:
+            container = element.find("config")
+            if container is None:
+                return
+            section = name
+        else:
+            container = element
+            section = name
+            for entry in container.findall("properties/entry"):
+                if entry.findtext("key") == "config_section" and entry.findtext("value"):
+                    section = entry.findtext("value")
+        if section is None or not self.config.has_section(section):
+            return
+
+        sensitive = set(entry.findtext("key") for entry in container.findall("descriptors/entry")
+                        if entry.findtext("value/sensitive") == "true")
+        properties = container.find("properties")
+        if properties is None:
+            properties = ET.SubElement(container, "properties")
+        entries = dict((entry.findtext("key"), entry) for entry in properties.findall("entry"))
+        applied = set()
+        for key, value in self.config.items(section):
+            if key in sensitive or (element.tag == CONTROLLER_SERVICES and key.startswith("_")):
+                continue
+            entry = entries.get(key)
+            if entry is None:
+                entry = ET.SubElement(properties, "entry")
+                ET.SubElement(entry, "key").text = key
+            value_element = entry.find("value")
+            if value_element is None:
+                value_element = ET.SubElement(entry, "value")
+            value_element.text = value
+            applied.add(key)
+        if applied:
+            self.logger.debug("Overlaid {} properties on {} {}".format(len(applied), element.tag, name))
+            self.applied[element.tag].setdefault(section, set()).update(applied)
@@ -0,0 +1,286 @@
+import logging
+import threading
+import time
+
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from nifiapi import trace
+
+
+class PlanError(Exception):
+    """
+    Raised by an operation to signal that it failed. The executor stops scheduling new operations once one fails.
+    """
+    pass
+
+
+##
+# A single node in a deploy plan: a named API operation and the operations it depends on.
+##
+class Operation:
+
+    PENDING = "PENDING"
+    RUNNING = "RUNNING"
+    DONE = "DONE"
+    FAILED = "FAILED"
+    SKIPPED = "SKIPPED"
+
+    def __init__(self, name, func, depends_on=None, cost=1.0, description=None, checkpoint=True, verify=None):
+        self.name = name
+        self.func = func
+        self.depends_on = list(depends_on or [])
+        self.cost = cost
+        self.description = description
+        self.checkpoint = checkpoint
+        self.verify = verify
+        self.resumed = False
+        self.state = self.PENDING
+        self.result = None
+        self.error = None
+        self.started = None
+        self.finished = None
+
+    def duration(self):
+        """
+        Wall time the operation took, or None if it has not finished.
+        """
+        if self.started is None or self.finished is None:
+            return None
+        return self.finished - self.started
+
+
+##
+# A DAG of operations. Dependencies must be added before their dependents, so the graph can never contain a cycle.
+# Operations may add further operations while the plan is executing (e.g. one per nested process group) and hook
+# them in front of operations that have not started yet via required_by.
+##
+class DeployPlan:
+
+    def __init__(self):
+        self.operations = OrderedDict()
+        self.lock = threading.RLock()
+        self.logger = logging.getLogger(__name__)
+
+    def add(self, name, func, depends_on=None, cost=1.0, description=None, required_by=None, checkpoint=True,
+            verify=None):
+        """
+        Add an operation to the plan.
+        :param name: unique name of the operation
+        :param func: callable taking no arguments. Its return value is stored as the operation result.
+        :param depends_on: (optional) names of operations that must finish before this one starts
+        :param cost: (optional) estimated cost, used for the critical path until real timings are known
+        :param description: (optional) human readable description used by describe()
+        :param required_by: (optional) names of pending operations that must wait for this one
+        :param checkpoint: (optional) False if the operation must run again when a deploy is resumed from a journal,
+            e.g. because its result only lives in memory or on local disk
+        :param verify: (optional) callable taking the journaled result, returning True if it still holds on the
+            server. Without it a journaled result is trusted as long as the operations it depends on were resumed.
+        :return: the new Operation
+        """
+        with self.lock:
+            if name in self.operations:
+                raise ValueError("Duplicate operation {}".format(name))
+            for dep in depends_on or []:
+                if dep not in self.operations:
+                    raise ValueError("Operation {} depends on unknown operation {}".format(name, dep))
+            for dependent in required_by or []:
+                if dependent not in self.operations:
+                    raise ValueError("Operation {} is required by unknown operation {}".format(name, dependent))
+                if self.operations[dependent].state != Operation.PENDING:
+                    raise ValueError("Operation {} has already started".format(dependent))
+            op = Operation(name, func, depends_on, cost, description, checkpoint, verify)
+            self.operations[name] = op
+            for dependent in required_by or []:
+                self.operations[dependent].depends_on.append(name)
+            return op
+
+    def result(self, name):
+        """
+        Result returned by a finished operation.
+        :param name: name of the operation
+        :return: the value its function returned
+        """
+        return self.operations[name].result
+
+    def ready(self):
+        """
+        Operations that are pending and whose dependencies have all finished successfully.
+        :return: list of Operation
+        """
+        with self.lock:
+            return [op for op in self.operations.values()
+                    if op.state == Operation.PENDING and
+                    all(self.operations[dep].state == Operation.DONE for dep in op.depends_on)]
+
+    def topological_order(self):
+        """
+        Operations ordered so every operation comes after its dependencies.
+        :return: list of Operation
+        """
+        with self.lock:
+            ordered = []
+            seen = set()
+
+            def visit(op):
+                if op.name in seen:
+                    return
+                seen.add(op.name)
+                for dep in op.depends_on:
+                    visit(self.operations[dep])
+                ordered.append(op)
+
+            for op in list(self.operations.values()):
+                visit(op)
+            return ordered
+
+    def critical_path(self):
+        """
+        Longest chain of dependent operations. Measured durations are used for operations that have finished,
+        estimated costs otherwise.
+        :return: tuple of (list of Operation, total cost)
+        """
+        best = {}
+        for op in self.topological_order():
+            weight = op.duration()
+            if weight is None:
+                weight = op.cost
+            prev = None
+            prev_cost = 0.0
+            for dep in op.depends_on:
+                if best[dep][1] > prev_cost or prev is None:
+                    prev = dep
+                    prev_cost = best[dep][1]
+            best[op.name] = (prev, prev_cost + weight)
+        if not best:
+            return [], 0.0
+        name = max(best, key=lambda n: best[n][1])
+        total = best[name][1]
+        path = []
+        while name is not None:
+            path.append(self.operations[name])
+            name = best[name][0]
+        path.reverse()
+        return path, total
+
+    def describe(self):
+        """
+        Text rendering of the DAG and its critical path.
+        :return: string
+        """
+        lines = []
+        for op in self.topological_order():
+            line = "{} [{}]".format(op.name, "RESUMED" if op.resumed else op.state)
+            if op.depends_on:
+                line += " <- {}".format(", ".join(op.depends_on))
+            if op.description:
+                line += "  # {}".format(op.description)
+            lines.append(line)
+        path, total = self.critical_path()
+        lines.append("Critical path ({:.1f}): {}".format(total, " -> ".join(op.name for op in path)))
+        return "\n".join(lines)
+
+
+##
+# Runs a DeployPlan, executing every ready operation in parallel up to max_workers at a time.
+#
+# With a journal every operation that finishes is recorded, and operations already in the journal are resumed instead
+# of run: their journaled result is verified and reused. An operation is only resumed if all the checkpointed
+# operations it depends on were resumed too, so once one has to run again everything after it runs again as well.
+#
+# With a tracer every operation is recorded as a span, with the spans of the NifiApi helpers it calls nested in it.
+#
+# abort stops a running plan from another thread as if an operation had failed.
+##
+class PlanExecutor:
+
+    def __init__(self, plan, max_workers=4, journal=None, tracer=None):
+        self.plan = plan
+        self.max_workers = max_workers
+        self.journal = journal
+        self.tracer = tracer if tracer is not None else trace.NullTracer()
+        self.failed = False
+        self.aborted = None
+        self.logger = logging.getLogger(__name__)
+
+    def abort(self, reason):
+        """
+        Stop the plan from another thread, e.g. a watcher that noticed the deploy is going wrong. No new operations
+        are started; the ones already running are allowed to finish and run returns False.
+        :param reason: logged and kept in aborted
+        """
+        with self.plan.lock:
+            if self.aborted is None:
+                self.logger.error("Aborting the plan: {}".format(reason))
+                self.aborted = reason
+            self.failed = True
+
+    def run(self):
+        """
+        Execute the plan. Once an operation fails no new operations are started; the ones already running are
+        allowed to finish and everything left over is marked SKIPPED.
+        :return: True if every operation succeeded, False otherwise.
+        """
+        running = {}
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            while True:
+                with self.plan.lock:
+                    if not self.failed:
+                        for op in self.plan.ready():
+                            if len(running) >= self.max_workers:
+                                break
+                            op.state = Operation.RUNNING
+                            running[pool.submit(self._run_operation, op)] = op
+                    if not running:
+                        break
+                done, _ = wait(list(running), return_when=FIRST_COMPLETED)
+                for future in done:
+                    op = running.pop(future)
+                    if op.state == Operation.FAILED:
+                        self.failed = True
+
+        with self.plan.lock:
+            for op in self.plan.operations.values():
+                if op.state == Operation.PENDING:
+                    op.state = Operation.SKIPPED
+        return not self.failed
+
+    def _run_operation(self, op):
+        self.logger.debug("Starting operation {}".format(op.name))
+        op.started = time.time()
+        try:
+            with self.tracer.span(op.name, category="operation"):
+                if not self._resume(op):
+                    op.result = op.func()
+                    if self.journal is not None and op.checkpoint:
+                        self.journal.record(op.name, op.result)
+            op.state = Operation.DONE
+        except Exception as e:
+            op.error = e
+            op.state = Operation.FAILED
+            if isinstance(e, PlanError):
+                self.logger.error("Operation {} failed: {}".format(op.name, e))
+            else:
+                self.logger.exception("Operation {} raised an exception".format(op.name))
+        op.finished = time.time()
+        self.logger.debug("Finished operation {} in {:.2f}s".format(op.name, op.duration()))
+
+    def _resume(self, op):
+        """
+        Restore an operation from the journal.
+        :return: True if the journaled result was verified and restored, False if the operation has to run.
+        """
+        if self.journal is None or not op.checkpoint or op.name not in self.journal:
+            return False
+        with self.plan.lock:
+            dependencies = [self.plan.operations[dep] for dep in op.depends_on]
+        if not all(dep.resumed for dep in dependencies if dep.checkpoint):
+            return False
+        result = self.journal.result(op.name)
+        if op.verify is not None and not op.verify(result):
+            self.logger.info("Journaled result of {} no longer holds. Running it again.".format(op.name))
+            return False
+        op.result = result
+        op.resumed = True
+        self.logger.info("Resumed operation {} from the journal".format(op.name))
+        return True
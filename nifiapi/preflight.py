@@ -0,0 +1,236 @@
+import xml.parsers.expat
+
+from collections import defaultdict
+
+ERROR = "ERROR"
+WARNING = "WARNING"
+
+PROCESSORS = "processors"
+CONTROLLER_SERVICES = "controllerServices"
+CONNECTIONS = "connections"
+
+# Elements that directly contain the components of a template or of a (remote) process group in it.
+_CONTAINERS = ("contents", "snippet")
+
+# Leaf elements whose text is collected.
+_TEXT = frozenset(("id", "name", "key", "value", "identifiesControllerService", "sensitive", "required"))
+
+_CHUNK_SIZE = 1 << 20
+
+
+##
+# Something wrong with a template, found before it is deployed.
+##
+class Problem:
+
+    def __init__(self, level, message):
+        self.level = level
+        self.message = message
+
+    def __str__(self):
+        return "{}: {}".format(self.level, self.message)
+
+
+##
+# What the validator learned about a template besides its problems.
+##
+class TemplateInfo:
+
+    def __init__(self):
+        self.name = None
+        self.process_group_name = None
+        self.problems = []
+
+    @property
+    def errors(self):
+        return [problem for problem in self.problems if problem.level == ERROR]
+
+
+def validate_template(filename, config=None):
+    """
+    Check a template before anything on the server is touched. The file is parsed once, as a stream, indexing the
+    ids of every component. It is an error if
+    * the template has no name or process group name
+    * a component id is used twice
+    * a connection starts or ends at a component that isn't in the template
+    * a property references a controller service that isn't in the template
+    * with config: a required sensitive property has no value in the template and none in config either
+    With config it is a warning if a section matches no processor or controller service, or sets a property the
+    component doesn't have, which usually means a typo.
+    :param filename: template XML file
+    :param config: (optional) ConfigParser with the sensitive config. Sections are matched the same way
+    write_sensitive_properties and recurse_update_controller match them.
+    :return: TemplateInfo
+    """
+    parser = xml.parsers.expat.ParserCreate()
+    parser.buffer_text = True
+    handler = _IndexHandler(parser)
+    info = handler.info
+    try:
+        with open(filename, "rb") as f:
+            for chunk in iter(lambda: f.read(_CHUNK_SIZE), b""):
+                parser.Parse(chunk, False)
+            parser.Parse(b"", True)
+    except xml.parsers.expat.ExpatError as e:
+        info.problems.append(Problem(ERROR, "Not well formed XML: {}".format(e)))
+        return info
+
+    if not info.name:
+        info.problems.append(Problem(ERROR, "The template has no name"))
+    if not info.process_group_name:
+        info.problems.append(Problem(ERROR, "The template has no process group"))
+    for component_id, count in handler.id_counts.items():
+        if count > 1:
+            info.problems.append(Problem(ERROR, "Id {} is used by {} components".format(component_id, count)))
+    for connection in handler.connections:
+        for end in ("source", "destination"):
+            if connection[end] not in handler.id_counts:
+                info.problems.append(Problem(ERROR, "Connection {} has {} {} which isn't in the template".format(
+                    connection["name"] or connection["id"], end, connection[end])))
+    services = set(component["id"] for component in handler.components if component["tag"] == CONTROLLER_SERVICES)
+    for component in handler.components:
+        for key, value in component["references"]:
+            if value not in services:
+                info.problems.append(Problem(ERROR, "{} of {} references controller service {}, which isn't in the "
+                                                    "template".format(key, component["name"], value)))
+    if config is not None:
+        _check_config(handler.components, config, info)
+    return info
+
+
+def _check_config(components, config, info):
+    by_section = defaultdict(list)
+    for component in components:
+        section = component["name"]
+        if component["tag"] == CONTROLLER_SERVICES:
+            section = component["properties"].get("config_section") or section
+        by_section[section].append(component)
+
+    for section in config.sections():
+        if section not in by_section:
+            info.problems.append(Problem(WARNING, "Section [{}] matches no processor or controller service in the "
+                                                  "template".format(section)))
+            continue
+        known = set()
+        for component in by_section[section]:
+            known.update(component["properties"])
+            known.update(component["descriptors"])
+        for key in config.options(section):
+            if not key.startswith("_") and key not in known:
+                info.problems.append(Problem(WARNING, "[{}] sets {}, which {} doesn't have".format(
+                    section, key, section)))
+
+    for section, matching in by_section.items():
+        for component in matching:
+            for key, (sensitive, required) in component["descriptors"].items():
+                if sensitive and required and not component["properties"].get(key) and \
+                        not (config.has_section(section) and config.has_option(section, key)):
+                    info.problems.append(Problem(ERROR, "Sensitive property {} of {} isn't set in the template or "
+                                                        "[{}] of the sensitive config".format(key, component["name"],
+                                                                                              section)))
+
+
+##
+# Expat callbacks that index a template. Only processors, controller services and connections are collected in any
+# detail; everything else only contributes its id. Components nest (process groups contain components), so the ones
+# being parsed are kept on a stack together with their depth in the document.
+#
+# Most of the time goes into the callbacks, so character data is only reported inside the leaves that are collected,
+# straight into a list.
+##
+class _IndexHandler:
+
+    def __init__(self, parser):
+        self.parser = parser
+        parser.StartElementHandler = self.start
+        parser.EndElementHandler = self.end
+        self.info = TemplateInfo()
+        self.stack = []
+        self.text = None
+        self.id_counts = defaultdict(int)
+        self.components = []
+        self.connections = []
+        self.open = []
+        self.entry = None
+
+    def start(self, name, attrs):
+        stack = self.stack
+        if name in _TEXT:
+            # Leaves are never components or entries, so nothing else to check.
+            stack.append(name)
+            self.text = []
+            self.parser.CharacterDataHandler = self.text.append
+            return
+        if stack and stack[-1] in _CONTAINERS:
+            if name in (PROCESSORS, CONTROLLER_SERVICES):
+                component = {"tag": name, "id": None, "name": None, "properties": {}, "descriptors": {},
+                             "services": set()}
+            elif name == CONNECTIONS:
+                component = {"tag": name, "id": None, "name": None, "source": None, "destination": None}
+            else:
+                component = {"tag": name, "id": None, "name": None}
+            self.open.append((component, len(stack)))
+        elif name == "entry" and self.open and self.open[-1][0]["tag"] in (PROCESSORS, CONTROLLER_SERVICES):
+            self.entry = {"key": None, "value": None, "identifiesControllerService": None, "sensitive": None,
+                          "required": None, "in": stack[-1]}
+        stack.append(name)
+
+    def end(self, name):
+        stack = self.stack
+        stack.pop()
+        if self.text is not None:
+            text = "".join(self.text)
+            self.text = None
+            self.parser.CharacterDataHandler = None
+            self._leaf(name, text, len(stack))
+            return
+        if self.open and len(stack) == self.open[-1][1]:
+            self._component_end(self.open.pop()[0])
+        elif name == "entry" and self.entry is not None and stack[-1] == self.entry["in"]:
+            self._entry_end()
+
+    def _leaf(self, name, text, depth):
+        if not self.open:
+            if depth == 1 and name == "name" and self.stack[0] == "template":
+                self.info.name = text
+            return
+        component, component_depth = self.open[-1]
+        relative = depth - component_depth
+        if relative == 1:
+            if name == "id":
+                component["id"] = text
+            elif name == "name":
+                component["name"] = text
+                if component["tag"] == "processGroups" and component_depth == 2 and \
+                        self.info.process_group_name is None:
+                    self.info.process_group_name = text
+        elif component["tag"] == CONNECTIONS:
+            if relative == 2 and name == "id" and self.stack[-1] in ("source", "destination"):
+                component[self.stack[-1]] = text
+        elif self.entry is not None:
+            if self.stack[-1] == "entry" or (self.stack[-1] == "value" and self.stack[-2] == "entry"):
+                self.entry[name] = text
+
+    def _entry_end(self):
+        entry = self.entry
+        self.entry = None
+        component = self.open[-1][0]
+        key = entry["key"]
+        if key is None:
+            return
+        if entry["in"] == "properties":
+            component["properties"][key] = entry["value"]
+        elif entry["in"] == "descriptors":
+            component["descriptors"][key] = (entry["sensitive"] == "true", entry["required"] == "true")
+            if entry["identifiesControllerService"]:
+                component["services"].add(key)
+
+    def _component_end(self, component):
+        if component["id"] is not None:
+            self.id_counts[component["id"]] += 1
+        if component["tag"] == CONNECTIONS:
+            self.connections.append(component)
+        elif component["tag"] in (PROCESSORS, CONTROLLER_SERVICES):
+            component["references"] = [(key, component["properties"][key]) for key in component.pop("services")
+                                       if component["properties"].get(key)]
+            self.components.append(component)
@@ -0,0 +1,270 @@
+import configparser
+import logging
+
+from concurrent.futures import ThreadPoolExecutor
+from fnmatch import fnmatchcase
+
+from nifiapi.model import Connection, Port, ProcessGroup, Processor
+from nifiapi.nifiapi import NifiApi
+from nifiapi.topology import FlowGraph
+from nifiapi.tree import status_snapshots
+
+COMPONENT_STATES = (NifiApi.PROCESSOR_RUNNING, NifiApi.PROCESSOR_STOPPED)
+SERVICE_STATES = (NifiApi.CONTROLLER_ENABLED, NifiApi.CONTROLLER_DISABLED)
+
+# NiFi reports disabled processors as their own run status. They are left alone.
+DISABLED_PROCESSOR = "DISABLED"
+
+# Keys of a section in the desired state file.
+STATE = "state"
+CONTROLLERS = "controllers"
+
+
+##
+# The desired run state of the canvas, read from a config file:
+#
+#   [/Ingest]
+#   state = RUNNING
+#   controllers = ENABLED
+#
+#   [/Ingest/Staging-*]
+#   state = STOPPED
+#
+#   [PutSlack]
+#   state = STOPPED
+#
+# A section starting with / is a glob over process group paths (the root group is /). Its state applies to the
+# processors and ports in the matching groups and all groups nested in them, and controllers to their controller
+# services. The section of the closest group wins. Any other section is a glob over component names and takes
+# precedence over the groups: RUNNING or STOPPED for processors and ports, ENABLED or DISABLED for controller services.
+# Components no section covers are left as they are.
+##
+class DesiredState:
+
+    def __init__(self):
+        # Lists of (pattern, state, controller state), in file order.
+        self.groups = []
+        self.names = []
+
+    @classmethod
+    def read(cls, filename):
+        """
+        :param filename: desired state file
+        :return: DesiredState
+        """
+        config = configparser.RawConfigParser()
+        config.optionxform = str  # Preserve case
+        if not config.read(filename):
+            raise ValueError("Could not read desired state file {}".format(filename))
+        return cls.parse(config)
+
+    @classmethod
+    def parse(cls, config):
+        """
+        :param config: RawConfigParser with the desired state
+        :return: DesiredState
+        """
+        desired = cls()
+        for section in config.sections():
+            state = config.get(section, STATE, fallback=None)
+            state = state.upper() if state is not None else None
+            controllers = config.get(section, CONTROLLERS, fallback=None)
+            controllers = controllers.upper() if controllers is not None else None
+            if section.startswith("/"):
+                if state not in (None,) + COMPONENT_STATES or controllers not in (None,) + SERVICE_STATES:
+                    raise ValueError("Invalid state in section [{}]".format(section))
+                desired.groups.append((section, state, controllers))
+            else:
+                if state not in COMPONENT_STATES + SERVICE_STATES:
+                    raise ValueError("Invalid state in section [{}]".format(section))
+                desired.names.append((section, state, None))
+        return desired
+
+    def wants_controllers(self):
+        """
+        :return: True if any controller service state is set
+        """
+        return any(controllers is not None for pattern, state, controllers in self.groups) or \
+            any(state in SERVICE_STATES for pattern, state, controllers in self.names)
+
+    def component_state(self, name, paths):
+        """
+        :param name: processor or port name
+        :param paths: paths of the group the component is in and all its ancestors, closest first
+        :return: RUNNING, STOPPED or None if the component isn't covered
+        """
+        return self._state(name, paths, COMPONENT_STATES, 1)
+
+    def controller_state(self, name, paths):
+        """
+        :param name: controller service name
+        :param paths: paths of the group the service belongs to and all its ancestors, closest first
+        :return: ENABLED, DISABLED or None if the service isn't covered
+        """
+        return self._state(name, paths, SERVICE_STATES, 2)
+
+    def _state(self, name, paths, states, index):
+        for section in reversed(self.names):
+            if section[1] in states and fnmatchcase(name, section[0]):
+                return section[1]
+        for path in paths:
+            for section in reversed(self.groups):
+                if section[index] is not None and fnmatchcase(path, section[0]):
+                    return section[index]
+        return None
+
+
+##
+# The actual run state of every processor and port and the connections between them, from one recursive status
+# request.
+##
+class FlowState:
+
+    def __init__(self):
+        self.paths = {}
+        self.parents = {}
+        self.components = []
+        self.graph = FlowGraph()
+
+    def ancestor_paths(self, group_id):
+        """
+        :param group_id: process group id
+        :return: paths of the group and all its ancestors, closest first
+        """
+        paths = []
+        while group_id in self.paths:
+            paths.append(self.paths[group_id])
+            group_id = self.parents[group_id]
+        return paths
+
+
+##
+# A change of state the reconciler makes to a component.
+##
+class Transition:
+
+    def __init__(self, component, path, desired):
+        """
+        :param component: Processor, Port or ControllerService
+        :param path: path of the component's process group
+        :param desired: state to change it to
+        """
+        self.component = component
+        self.path = path
+        self.desired = desired
+        self.ok = None
+        self.error = None
+
+
+def read_flow_state(api, root_id="root"):
+    """
+    :param api: NifiApi instance
+    :param root_id: id of the group to start from
+    :return: FlowState or None if the status could not be read
+    """
+    status = api.get_process_group_status(root_id, recursive=True)
+    if status is None:
+        return None
+    flow = FlowState()
+    for snapshot, parent, path, depth in status_snapshots(status):
+        group_id = snapshot["id"]
+        parent_id = parent["id"] if parent is not None else None
+        flow.paths[group_id] = path
+        flow.parents[group_id] = parent_id
+        pg = ProcessGroup(group_id, snapshot["name"], parent_id)
+        for processor in snapshot.get("processorStatusSnapshots") or []:
+            processor = processor["processorStatusSnapshot"]
+            pg.processors.append(Processor(processor["id"], processor["name"], group_id, type=processor.get("type"),
+                                           state=processor["runStatus"].upper()))
+        for key, port_type in (("inputPortStatusSnapshots", Port.INPUT), ("outputPortStatusSnapshots", Port.OUTPUT)):
+            for port in snapshot.get(key) or []:
+                port = port["portStatusSnapshot"]
+                ports = pg.input_ports if port_type == Port.INPUT else pg.output_ports
+                ports.append(Port(port["id"], port["name"], group_id, port_type=port_type,
+                                  state=port["runStatus"].upper()))
+        for connection in snapshot.get("connectionStatusSnapshots") or []:
+            connection = connection["connectionStatusSnapshot"]
+            pg.connections.append(Connection(connection["id"], connection.get("name"), group_id,
+                                             source={"id": connection.get("sourceId")},
+                                             destination={"id": connection.get("destinationId")}))
+        flow.graph.add_group(pg)
+        flow.components.extend(pg.processors + pg.input_ports + pg.output_ports)
+    return flow
+
+
+def diff(desired, flow, services=()):
+    """
+    The transitions that bring the flow to the desired state.
+    :param desired: DesiredState
+    :param flow: FlowState
+    :param services: (optional) ControllerServices of the flow, only needed if desired sets controller states
+    :return: list of Transition, empty if nothing drifted
+    """
+    transitions = []
+    for component in flow.components:
+        if component.state == DISABLED_PROCESSOR:
+            continue
+        state = desired.component_state(component.name, flow.ancestor_paths(component.parent_group_id))
+        if state is not None and (component.state == NifiApi.PROCESSOR_RUNNING) != (state == NifiApi.PROCESSOR_RUNNING):
+            transitions.append(Transition(component, flow.paths[component.parent_group_id], state))
+    for service in services:
+        state = desired.controller_state(service.name, flow.ancestor_paths(service.parent_group_id))
+        if state is not None and service.state != state and \
+                not (state == NifiApi.CONTROLLER_DISABLED and service.state == "DISABLING") and \
+                not (state == NifiApi.CONTROLLER_ENABLED and service.state == "ENABLING"):
+            transitions.append(Transition(service, flow.paths.get(service.parent_group_id), state))
+    return transitions
+
+
+def apply(api, transitions, flow, workers=4):
+    """
+    Make the transitions: controller services are enabled first, then processors and ports are stopped from the
+    sources to the sinks and started from the sinks back to the sources, and controller services are disabled last.
+    Transitions that don't depend on each other are made in parallel.
+    :param api: NifiApi instance
+    :param transitions: result of diff
+    :param flow: FlowState the transitions were computed from
+    :param workers: number of components changed at the same time
+    :return: the transitions, with ok and error set
+    """
+    by_id = dict((transition.component.id, transition) for transition in transitions)
+    components = [transition for transition in transitions if not _is_service(transition)]
+    services = [transition for transition in transitions if _is_service(transition)]
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(lambda transition: _change_service(api, transition),
+                      [transition for transition in services if transition.desired == NifiApi.CONTROLLER_ENABLED]))
+        for state, downstream_first in ((NifiApi.PROCESSOR_STOPPED, False), (NifiApi.PROCESSOR_RUNNING, True)):
+            changing = set(transition.component.id for transition in components if transition.desired == state)
+            if not changing:
+                continue
+            for level in flow.graph.levels(downstream_first=downstream_first):
+                level = [by_id[component.id] for component in level if component.id in changing]
+                list(pool.map(lambda transition: _change_component(api, transition), level))
+        list(pool.map(lambda transition: _change_service(api, transition),
+                      [transition for transition in services if transition.desired == NifiApi.CONTROLLER_DISABLED]))
+    return transitions
+
+
+def _is_service(transition):
+    return not isinstance(transition.component, (Processor, Port))
+
+
+def _change_component(api, transition):
+    component = transition.component
+    # The status carries no revision, so fetch the component before changing it.
+    current = type(component).of(api.remote_get(component.endpoint, component.id))
+    if current is None:
+        transition.ok = False
+        transition.error = "could not be fetched"
+        return
+    transition.ok = api.change_component_status(current, transition.desired)
+    if not transition.ok:
+        transition.error = "changing the state failed"
+
+
+def _change_service(api, transition):
+    transition.ok = api.update_controller_status(transition.component, transition.desired) is not None
+    if not transition.ok:
+        transition.error = "changing the state failed"
+        logging.getLogger(__name__).error("Could not change {} ({}) to {}".format(
+            transition.component.name, transition.component.id, transition.desired))
@@ -0,0 +1,164 @@
+import logging
+import os
+import sqlite3
+import time
+
+from nifiapi.tree import group_path
+from nifiapi.walker import WalkError
+
+SCHEMA = """
+CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE process_groups (id TEXT PRIMARY KEY, name TEXT, parent_id TEXT, path TEXT);
+CREATE TABLE components (id TEXT PRIMARY KEY, kind TEXT, name TEXT, type TEXT, state TEXT, group_id TEXT);
+CREATE TABLE properties (component_id TEXT, name TEXT, value TEXT);
+CREATE INDEX components_name ON components (kind, name);
+CREATE INDEX components_type ON components (kind, type);
+CREATE INDEX components_group ON components (group_id);
+CREATE INDEX properties_name ON properties (name, value);
+CREATE INDEX properties_component ON properties (component_id);
+"""
+
+PROCESSOR = "processor"
+CONTROLLER_SERVICE = "controller-service"
+INPUT_PORT = "input-port"
+OUTPUT_PORT = "output-port"
+
+
+def export_snapshot(api, filename, root_id="root"):
+    """
+    Walk the whole flow once and write it to an indexed sqlite snapshot. The snapshot is written to a temporary file
+    and moved into place, so readers never see a half written snapshot. If any process group or the controller
+    services can't be read, no snapshot is written and the previous one stays in place.
+    :param api: NifiApi instance
+    :param filename: snapshot file
+    :param root_id: id of the group to start from
+    :return: number of components written, None if the flow could not be read completely
+    """
+    logger = logging.getLogger(__name__)
+    tmp_file = filename + ".tmp"
+    if os.path.exists(tmp_file):
+        os.remove(tmp_file)
+    db = sqlite3.connect(tmp_file)
+    db.executescript(SCHEMA)
+    paths = {}
+    count = 0
+    try:
+        for pg in api.walk_process_groups(root_id, strict=True):
+            name = pg.name or pg.id
+            path = group_path(paths.get(pg.parent_group_id), name)
+            paths[pg.id] = path
+            db.execute("INSERT INTO process_groups VALUES (?, ?, ?, ?)", (pg.id, name, pg.parent_group_id, path))
+            for processor in pg.processors:
+                _insert_component(db, PROCESSOR, processor, processor.type, processor.state, processor.properties)
+            for port in pg.input_ports:
+                _insert_component(db, INPUT_PORT, port, port.port_type, port.state, {})
+            for port in pg.output_ports:
+                _insert_component(db, OUTPUT_PORT, port, port.port_type, port.state, {})
+            count += len(pg.processors) + len(pg.input_ports) + len(pg.output_ports)
+    except WalkError as e:
+        logger.error("{}. Not writing a partial snapshot.".format(e))
+        _discard(db, tmp_file)
+        return None
+
+    services = api.get_controller_service_models(root_id, include_descendants=True)
+    if services is None:
+        logger.error("Could not list the controller services. Not writing a partial snapshot.")
+        _discard(db, tmp_file)
+        return None
+    for service in services:
+        _insert_component(db, CONTROLLER_SERVICE, service, service.type, service.state, service.properties)
+        count += 1
+
+    db.execute("INSERT INTO meta VALUES ('url', ?)", (api.url,))
+    db.execute("INSERT INTO meta VALUES ('created', ?)", (str(time.time()),))
+    db.commit()
+    db.close()
+    os.replace(tmp_file, filename)
+    logger.info("Wrote {} components in {} process groups to {}".format(count, len(paths), filename))
+    return count
+
+
+def _discard(db, tmp_file):
+    db.close()
+    os.remove(tmp_file)
+
+
+def _insert_component(db, kind, component, type, state, properties):
+    db.execute("INSERT OR REPLACE INTO components VALUES (?, ?, ?, ?, ?, ?)",
+               (component.id, kind, component.name, type, state, component.parent_group_id))
+    db.executemany("INSERT INTO properties VALUES (?, ?, ?)",
+                   [(component.id, name, value) for name, value in properties.items() if value is not None])
+
+
+##
+# Read only queries over a snapshot written by export_snapshot.
+##
+class SnapshotStore:
+
+    def __init__(self, filename):
+        if not os.path.exists(filename):
+            raise IOError("Snapshot {} does not exist. Refresh it first.".format(filename))
+        self.db = sqlite3.connect(filename)
+        self.db.row_factory = sqlite3.Row
+
+    def created(self):
+        """
+        :return: epoch seconds the snapshot was taken
+        """
+        row = self.db.execute("SELECT value FROM meta WHERE key = 'created'").fetchone()
+        return float(row["value"]) if row is not None else None
+
+    def find(self, kind=PROCESSOR, name=None, type=None, properties=None, group=None, group_name=None):
+        """
+        Find components. All filters are globs (*, ?, [...]) and are combined with AND.
+        :param kind: PROCESSOR, CONTROLLER_SERVICE, INPUT_PORT, OUTPUT_PORT or None for any
+        :param name: component name glob
+        :param type: type glob. Matches either the fully qualified type or the simple class name.
+        :param properties: list of (property name glob, value glob or None). None only requires the property be set.
+        :param group: glob over the process group path, e.g. /Ingest/*
+        :param group_name: glob over the process group name
+        :return: list of dicts with id, kind, name, type, state, group_id, path and properties
+        """
+        sql = ["SELECT c.*, g.path FROM components c LEFT JOIN process_groups g ON g.id = c.group_id WHERE 1 = 1"]
+        args = []
+        if kind is not None:
+            sql.append("AND c.kind = ?")
+            args.append(kind)
+        if name is not None:
+            sql.append("AND c.name GLOB ?")
+            args.append(name)
+        if type is not None:
+            sql.append("AND (c.type GLOB ? OR c.type GLOB ?)")
+            args.extend([type, "*." + type])
+        if group is not None:
+            sql.append("AND g.path GLOB ?")
+            args.append(group)
+        if group_name is not None:
+            sql.append("AND g.name GLOB ?")
+            args.append(group_name)
+        for prop_name, prop_value in properties or []:
+            if prop_value is None:
+                sql.append("AND EXISTS (SELECT 1 FROM properties p WHERE p.component_id = c.id AND p.name GLOB ?)")
+                args.append(prop_name)
+            else:
+                sql.append("AND EXISTS (SELECT 1 FROM properties p WHERE p.component_id = c.id AND p.name GLOB ? "
+                           "AND p.value GLOB ?)")
+                args.extend([prop_name, prop_value])
+        sql.append("ORDER BY g.path, c.name")
+        results = []
+        for row in self.db.execute(" ".join(sql), args):
+            result = dict(row)
+            result["properties"] = self.properties(row["id"])
+            results.append(result)
+        return results
+
+    def properties(self, component_id):
+        """
+        :param component_id: id of a processor or controller service
+        :return: dict of its properties
+        """
+        return dict((row["name"], row["value"]) for row in
+                    self.db.execute("SELECT name, value FROM properties WHERE component_id = ?", (component_id,)))
+
+    def close(self):
+        self.db.close()
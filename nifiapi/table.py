@@ -0,0 +1,11 @@
+def format_table(rows):
+    """
+    Lay out rows of a label and a value per column, with the labels left aligned and the values right aligned, as the
+    summary scripts compare several runs side by side.
+    :param rows: list of (label, list of value strings), every list as long as the first
+    :return: one line per row
+    """
+    width = max(len(label) for label, values in rows)
+    columns = [max(len(values[i]) for label, values in rows) for i in range(len(rows[0][1]))]
+    return "\n".join("  ".join([label.ljust(width)] + [value.rjust(columns[i]) for i, value in enumerate(values)])
+                     for label, values in rows)
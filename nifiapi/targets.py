@@ -0,0 +1,53 @@
+import re
+
+from fnmatch import fnmatchcase
+
+GLOB_CHARACTERS = "*?["
+REGEX_PREFIX = "re:"
+
+
+##
+# A process group pattern as given on the command line:
+#   Name          exact name
+#   Ingest*       glob over the name
+#   re:^Ingest-\d+$
+#                 regular expression searched in the name
+#   /Ingest/*     glob over the path of the group, starting with / for the root group
+##
+class GroupPattern:
+
+    def __init__(self, pattern):
+        self.pattern = pattern
+        self.regex = None
+        if pattern.startswith(REGEX_PREFIX):
+            self.regex = re.compile(pattern[len(REGEX_PREFIX):])
+
+    def matches(self, name, path):
+        """
+        :param name: process group name
+        :param path: process group path
+        :return: True if the group matches
+        """
+        if self.regex is not None:
+            return self.regex.search(name) is not None
+        if self.pattern.startswith("/"):
+            return fnmatchcase(path, self.pattern)
+        if any(c in self.pattern for c in GLOB_CHARACTERS):
+            return fnmatchcase(name, self.pattern)
+        return name == self.pattern
+
+
+def resolve_targets(groups, patterns):
+    """
+    The groups matching any of the patterns. A group nested in another matching group is dropped, since changing
+    the outer group already changes it.
+    :param groups: result of tree.list_process_groups
+    :param patterns: list of GroupPattern
+    :return: tuple of (list of (id, name, path) targets in tree order, list of patterns that matched nothing)
+    """
+    unmatched = [pattern for pattern in patterns if not any(pattern.matches(group[1], group[2]) for group in groups)]
+    matched = [group for group in groups if any(pattern.matches(group[1], group[2]) for pattern in patterns)]
+    prefixes = [group[2].rstrip("/") + "/" for group in matched]
+    targets = [group for group in matched
+               if not any(group[2] != prefix and group[2].startswith(prefix) for prefix in prefixes)]
+    return targets, unmatched
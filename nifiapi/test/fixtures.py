@@ -0,0 +1,45 @@
+"""
+Status snapshots, bulletins and a fake NifiApi shared by the tests of the modules that read the flow status and the
+bulletin board.
+"""
+
+
+def snapshot(id, name, *children, out=0, queued=0):
+    """
+    Aggregate status snapshot of a process group without output ports: the group's own flowFilesOut stays 0, whatever
+    its processor transfers.
+    :param out: flowfiles the group's one processor transferred
+    :param queued: flowfiles queued in the group
+    """
+    return {"id": id, "name": name, "flowFilesOut": 0, "bytesOut": 0, "flowFilesQueued": queued,
+            "processorStatusSnapshots": [{"processorStatusSnapshot": {"id": id + "-p", "name": name + "-p",
+                                                                      "flowFilesOut": out, "bytesOut": out * 10}}],
+            "processGroupStatusSnapshots": [{"processGroupStatusSnapshot": child} for child in children]}
+
+
+def bulletin(id, group_id, level="ERROR"):
+    return {"id": id, "groupId": group_id, "sourceId": "proc-{}".format(id),
+            "bulletin": {"level": level, "message": "failed", "sourceName": "Proc{}".format(id)}}
+
+
+class FakeApi:
+
+    def __init__(self, status, bulletins=None):
+        """
+        :param status: dict of process group id -> aggregate snapshot
+        :param bulletins: (optional) list of bulletin entities on the board, oldest first
+        """
+        self.status = status
+        self.bulletins = bulletins if bulletins is not None else []
+        self.requests = []
+
+    def get_process_group_status(self, id, recursive=False):
+        self.requests.append(("status", id, recursive))
+        if id not in self.status:
+            return None
+        return {"processGroupStatus": {"aggregateSnapshot": self.status[id]}}
+
+    def get_bulletins(self, after=None, limit=None):
+        self.requests.append(("bulletins", after))
+        bulletins = [b for b in self.bulletins if after is None or b["id"] > after]
+        return bulletins[:limit] if limit else bulletins
@@ -0,0 +1,79 @@
+import unittest
+import base64
+import json
+import os
+import stat
+import tempfile
+import time
+from nifiapi.auth import TokenAuth, token_expiry
+
+
+def make_token(exp):
+    payload = base64.urlsafe_b64encode(json.dumps({"exp": exp}).encode()).decode().rstrip("=")
+    return "header.{}.signature".format(payload)
+
+
+class FakeResponse:
+
+    def __init__(self, text):
+        self.status_code = 201
+        self.text = text
+
+
+class FakeSession:
+
+    def __init__(self, exp):
+        self.exp = exp
+        self.logins = 0
+
+    def post(self, url, **kwargs):
+        self.logins += 1
+        return FakeResponse(make_token(self.exp + self.logins))
+
+
+class Test(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.cache_file = os.path.join(self.dir, "cache", "tokens.json")
+
+    def test_token_expiry(self):
+        self.assertEqual(1234.0, token_expiry(make_token(1234)))
+
+    def test_cached_across_instances(self):
+        session = FakeSession(time.time() + 3600)
+        first = TokenAuth("user", "secret", cache_file=self.cache_file).get_token(session, "http://nifi")
+        second = TokenAuth("user", "secret", cache_file=self.cache_file).get_token(session, "http://nifi")
+        self.assertEqual(first, second)
+        self.assertEqual(1, session.logins)
+        self.assertEqual(0o600, stat.S_IMODE(os.stat(self.cache_file).st_mode))
+
+    def test_cached_per_user(self):
+        session = FakeSession(time.time() + 3600)
+        alice = TokenAuth("alice", "secret", cache_file=self.cache_file).get_token(session, "http://nifi")
+        bob = TokenAuth("bob", "secret", cache_file=self.cache_file).get_token(session, "http://nifi")
+        self.assertNotEqual(alice, bob)
+        self.assertEqual(2, session.logins)
+        self.assertEqual(bob, TokenAuth("bob", "secret", cache_file=self.cache_file).get_token(session, "http://nifi"))
+
+    def test_refresh_before_expiry(self):
+        session = FakeSession(time.time() + 60)
+        auth = TokenAuth("user", "secret", cache_file=self.cache_file, refresh_margin=300)
+        auth.get_token(session, "http://nifi")
+        auth.get_token(session, "http://nifi")
+        self.assertEqual(2, session.logins)
+
+    def test_invalidate_once(self):
+        session = FakeSession(time.time() + 3600)
+        auth = TokenAuth("user", "secret", cache_file=self.cache_file)
+        rejected = auth.get_token(session, "http://nifi")
+        auth.invalidate(rejected, "http://nifi")
+        fresh = auth.get_token(session, "http://nifi")
+        # A second thread reporting the same rejected token must not throw the new one away.
+        auth.invalidate(rejected, "http://nifi")
+        self.assertEqual(fresh, auth.get_token(session, "http://nifi"))
+        self.assertEqual(2, session.logins)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,148 @@
+import unittest
+import gzip
+import os
+import tempfile
+import xml.etree.ElementTree as ET
+from nifiapi import backup
+from nifiapi.model import ProcessGroup
+
+TEMPLATE = b"<template><name>PG backup</name>" + b"<x/>" * 10000 + b"</template>"
+
+
+class FakeApi:
+    PROCESSOR_RUNNING = "RUNNING"
+    PROCESSOR_STOPPED = "STOPPED"
+    CONTROLLER_ENABLED = "ENABLED"
+    CONTROLLER_DISABLED = "DISABLED"
+
+    def __init__(self):
+        self.templates = {}
+        self.calls = []
+        self.configurable = True
+
+    def create_snippet(self, pg):
+        self.calls.append("snippet")
+        return "snippet-1"
+
+    def create_template(self, parent_id, snippet_id, name, description):
+        self.templates["template-1"] = TEMPLATE
+        return "template-1"
+
+    def download_template(self, id, out, chunk_size=4096):
+        data = self.templates[id]
+        for start in range(0, len(data), chunk_size):
+            out.write(data[start:start + chunk_size])
+        return len(data)
+
+    def delete_template(self, id):
+        self.calls.append("delete " + id)
+        return self.templates.pop(id, None)
+
+    def remove_template_by_name(self, name):
+        return False
+
+    def upload_template_entity(self, pg_id, filename):
+        with open(filename, "rb") as f:
+            self.templates["template-2"] = f.read()
+        return ET.fromstring("<templateEntity><template><id>template-2</id></template></templateEntity>")
+
+    def do_instantiate_template(self, pg_id, template_id, x, y):
+        self.calls.append("instantiate {} in {}".format(template_id, pg_id))
+        return {"flow": {"processGroups": [{"component": {"id": "restored"}}]}}
+
+    def walk_process_groups(self, root, strict=False):
+        return iter([ProcessGroup(root), ProcessGroup("nested", parent_group_id=root)])
+
+    def write_sensitive_properties(self, pg_id, sensitive_file, applied=None, configured=None):
+        self.calls.append("configure {} from {}".format(pg_id, sensitive_file))
+        return self.configurable
+
+    def status_change_all_processors(self, pg_id, state, controller_state):
+        self.calls.append("{} {}".format(state.lower(), pg_id))
+        return True
+
+    def empty_all_queues(self, pg_id):
+        self.calls.append("empty " + pg_id)
+        return True
+
+    def remote_get(self, path, id):
+        return {"id": id, "revision": {"version": 4}}
+
+    def remove_process_group(self, pg):
+        self.calls.append("remove " + pg["id"])
+        return pg
+
+
+class Test(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.api = FakeApi()
+        self.pg = {"id": "pg-1", "revision": {"version": 3}, "component": {"id": "pg-1", "name": "PG",
+                                                                          "parentGroupId": "root"}}
+
+    def test_backup_and_restore(self):
+        entry = backup.backup_process_group(self.api, self.pg, self.directory)
+        self.assertEqual(len(TEMPLATE), entry["bytes"])
+        self.assertEqual("root", entry["parent_group_id"])
+        with gzip.open(os.path.join(self.directory, entry["file"])) as f:
+            self.assertEqual(TEMPLATE, f.read())
+        self.assertNotIn("template-1", self.api.templates)
+        self.assertEqual(entry, backup.find_backup(self.directory, name="PG"))
+        self.assertTrue(backup.verify_backup(self.directory, entry))
+
+        self.assertEqual("restored", backup.restore_backup(self.api, self.directory, entry))
+        self.assertIn("instantiate template-2 in root", self.api.calls)
+        self.assertEqual({}, self.api.templates)
+
+    def test_restore_applies_sensitive_config(self):
+        entry = backup.backup_process_group(self.api, self.pg, self.directory)
+        self.assertEqual("restored", backup.restore_backup(self.api, self.directory, entry,
+                                                           sensitive_file="sensitive.cfg"))
+        self.assertEqual(["configure restored from sensitive.cfg", "configure nested from sensitive.cfg"],
+                         [call for call in self.api.calls if call.startswith("configure")])
+        self.api.configurable = False
+        self.assertIsNone(backup.restore_backup(self.api, self.directory, entry, sensitive_file="sensitive.cfg"))
+
+    def test_replace_with_backup(self):
+        entry = backup.backup_process_group(self.api, self.pg, self.directory)
+        self.api.calls = []
+        self.assertEqual("restored", backup.replace_with_backup(self.api, self.directory, entry, "pg-2", start=True,
+                                                                sensitive_file="sensitive.cfg"))
+        self.assertEqual(["instantiate template-2 in root", "delete template-2",
+                          "configure restored from sensitive.cfg", "configure nested from sensitive.cfg",
+                          "stopped pg-2", "empty pg-2", "remove pg-2", "running restored"], self.api.calls)
+
+    def test_failed_restore_keeps_current_group(self):
+        entry = backup.backup_process_group(self.api, self.pg, self.directory)
+        self.api.calls = []
+        self.api.configurable = False
+        self.assertIsNone(backup.replace_with_backup(self.api, self.directory, entry, "pg-2", start=True,
+                                                     sensitive_file="sensitive.cfg"))
+        self.assertFalse([call for call in self.api.calls if call.endswith("pg-2")])
+
+    def test_unconfigured_restore_is_removed(self):
+        entry = backup.backup_process_group(self.api, self.pg, self.directory)
+        self.api.calls = []
+        self.api.configurable = False
+        self.assertIsNone(backup.restore_backup(self.api, self.directory, entry, sensitive_file="sensitive.cfg"))
+        self.assertEqual(["configure restored from sensitive.cfg", "stopped restored", "remove restored"],
+                         self.api.calls[-3:])
+
+    def test_corrupt_backup_is_not_restored(self):
+        entry = backup.backup_process_group(self.api, self.pg, self.directory)
+        with open(os.path.join(self.directory, entry["file"]), "ab") as f:
+            f.write(b"junk")
+        self.assertFalse(backup.verify_backup(self.directory, entry))
+        self.assertIsNone(backup.restore_backup(self.api, self.directory, entry))
+
+    def test_latest_backup_wins(self):
+        first = backup.backup_process_group(self.api, self.pg, self.directory)
+        second = backup.backup_process_group(self.api, self.pg, self.directory)
+        self.assertEqual(second["id"], backup.find_backup(self.directory, name="PG")["id"])
+        self.assertEqual(first, backup.find_backup(self.directory, backup_id=first["id"]))
+        self.assertEqual(2, len(backup.read_index(self.directory)))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,99 @@
+import unittest
+import json
+from nifiapi import bulk
+from nifiapi.model import Processor, ProcessGroup
+from nifiapi.nifiapi import NifiApi
+from nifiapi.cassette import ReplayResponse
+from nifiapi.walker import WalkError
+
+
+class FakeApi:
+    """
+    Processors held in memory, with NiFi's revision checks and its refusal to configure running processors.
+    """
+
+    def __init__(self, groups, processors):
+        self.groups = groups
+        self.processors = processors
+        self.puts = []
+        self.missing = set()
+
+    def entity(self, processor_id):
+        p = self.processors[processor_id]
+        return {"id": processor_id, "revision": {"version": p["version"]},
+                "component": {"id": processor_id, "name": p["name"], "parentGroupId": p["group"], "type": p["type"],
+                              "state": p["state"], "config": {"properties": dict(p["properties"])}}}
+
+    def walk_process_groups(self, root, strict=False):
+        for group_id, (name, parent) in self.groups.items():
+            if group_id in self.missing:
+                if strict:
+                    raise WalkError("Could not fetch process group {}".format(group_id))
+                continue
+            pg = ProcessGroup(group_id, name, parent)
+            pg.processors = [Processor.of(self.entity(p)) for p in self.processors
+                             if self.processors[p]["group"] == group_id]
+            yield pg
+
+    def remote_get(self, path, id):
+        return self.entity(id)
+
+    def send(self, method, path, **kwargs):
+        processor_id = path.rsplit("/", 1)[1]
+        p = self.processors[processor_id]
+        component = kwargs["json"]["component"]
+        self.puts.append((processor_id, sorted(component)))
+        if kwargs["json"]["revision"]["version"] != p["version"]:
+            return ReplayResponse(409, "revision")
+        if "config" in component and p["state"] == NifiApi.PROCESSOR_RUNNING:
+            return ReplayResponse(409, "running")
+        p["state"] = component.get("state", p["state"])
+        p["properties"].update(component.get("config", {}).get("properties", {}))
+        p["version"] += 1
+        return ReplayResponse(200, json.dumps(self.entity(processor_id)))
+
+
+def processor(name, group, state, properties, type="org.apache.nifi.processors.slack.PutSlack"):
+    return {"name": name, "group": group, "state": state, "properties": properties, "type": type, "version": 0}
+
+
+class Test(unittest.TestCase):
+
+    def setUp(self):
+        self.api = FakeApi({"root": ("NiFi Flow", None), "a": ("Ingest", "root"), "b": ("Out", "root")}, {
+            "p1": processor("Slack", "a", NifiApi.PROCESSOR_RUNNING, {"webhook-url": "http://old/1", "channel": "x"}),
+            "p2": processor("Slack", "a", NifiApi.PROCESSOR_STOPPED, {"webhook-url": "http://old/2"}),
+            "p3": processor("Slack", "b", NifiApi.PROCESSOR_RUNNING, {"webhook-url": "http://old/3"}),
+            "p4": processor("Http", "a", NifiApi.PROCESSOR_RUNNING, {"webhook-url": "http://old/4"}, type="InvokeHTTP"),
+            "p5": processor("Slack", "a", NifiApi.PROCESSOR_STOPPED, {"webhook-url": "https://new"}),
+        })
+
+    def test_selector(self):
+        updates = bulk.resolve(self.api, bulk.Selector("webhook-*", type="PutSlack", value="http://*",
+                                                       group="/Ingest"))
+        self.assertEqual(["p1", "p2"], sorted(update.processor.id for update in updates))
+        self.assertEqual(["webhook-url"], updates[0].names)
+
+    def test_missing_group_aborts(self):
+        self.api.missing.add("b")
+        with self.assertRaises(WalkError):
+            bulk.resolve(self.api, bulk.Selector("webhook-url"))
+
+    def test_apply_and_verify(self):
+        updates = bulk.resolve(self.api, bulk.Selector("webhook-url", type="PutSlack", group="/Ingest"))
+        # Someone else changes p1 after the walk.
+        self.api.processors["p1"]["version"] += 1
+        bulk.apply_updates(self.api, updates, "https://new", workers=2, backoff=0)
+        statuses = dict((update.processor.id, (update.status, update.restarted)) for update in updates)
+        self.assertEqual({"p1": (bulk.UPDATED, True), "p2": (bulk.UPDATED, False), "p5": (bulk.UNCHANGED, False)},
+                         statuses)
+        self.assertTrue(bulk.verify_updates(self.api, updates, "https://new"))
+        self.assertEqual(NifiApi.PROCESSOR_RUNNING, self.api.processors["p1"]["state"])
+        self.assertEqual(NifiApi.PROCESSOR_STOPPED, self.api.processors["p2"]["state"])
+        self.assertEqual("http://old/3", self.api.processors["p3"]["properties"]["webhook-url"])
+        # Stopped processors are updated with a single PUT.
+        self.assertEqual([("p2", ["config", "id"])], [put for put in self.api.puts if put[0] == "p2"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,44 @@
+import unittest
+from nifiapi.bulletins import BulletinWatcher
+from nifiapi.test.fixtures import FakeApi, bulletin, snapshot
+
+
+class Test(unittest.TestCase):
+
+    def setUp(self):
+        self.api = FakeApi({"new": snapshot("new", "PG1", snapshot("new-child", "Inner"))},
+                           [bulletin(1, "new"), bulletin(2, "elsewhere")])
+        self.group = None
+        self.aborted = []
+        self.watcher = BulletinWatcher(self.api, lambda: self.group, interval=60, on_error=self.aborted.append)
+
+    def tearDown(self):
+        self.watcher.stop()
+
+    def test_waits_for_the_group(self):
+        self.watcher.start()
+        self.assertEqual([], self.watcher.poll())
+        self.assertEqual([("bulletins", None)], self.api.requests)
+
+    def test_only_new_bulletins_of_the_group(self):
+        self.watcher.start()
+        self.api.bulletins += [bulletin(3, "new-child"), bulletin(4, "elsewhere"), bulletin(5, "new", "WARNING")]
+        self.group = "new"
+        self.assertEqual([3, 5], [entity["id"] for entity in self.watcher.poll()])
+        self.assertEqual([3], [entity["id"] for entity in self.aborted])
+        self.assertEqual(5, self.watcher.cursor)
+
+        self.api.bulletins.append(bulletin(6, "new"))
+        self.assertEqual([6], [entity["id"] for entity in self.watcher.poll()])
+        self.assertEqual([("bulletins", None), ("status", "new", True), ("bulletins", 2), ("bulletins", 5)],
+                         self.api.requests)
+
+    def test_stop_polls_once_more(self):
+        self.watcher.start()
+        self.group = "new"
+        self.api.bulletins.append(bulletin(3, "new-child"))
+        self.assertEqual([3], [entity["id"] for entity in self.watcher.stop()])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,75 @@
+import unittest
+import gzip
+import json
+import os
+import tempfile
+from nifiapi import cassette
+from nifiapi.cassette import RecordingSession, ReplaySession
+
+
+class FakeResponse:
+
+    def __init__(self, status_code, text, content_type='application/json'):
+        self.status_code = status_code
+        self._text = text
+        self.headers = {'Content-Type': content_type, 'Content-Length': str(len(text))}
+
+    @property
+    def text(self):
+        if self.headers['Content-Type'] != 'application/json':
+            raise AssertionError("The body of a streamed response was read")
+        return self._text
+
+
+class FakeSession:
+
+    def request(self, method, url, **kwargs):
+        if url.endswith('/download'):
+            return FakeResponse(200, '<template/>', 'application/xml')
+        body = {'component': {'config': {'properties': {'Password': 'hunter2', 'Bucket': 'b1'}}}}
+        return FakeResponse(200, json.dumps(body))
+
+
+class Test(unittest.TestCase):
+
+    def setUp(self):
+        self.filename = os.path.join(tempfile.mkdtemp(), 'run.cassette')
+
+    def test_redact(self):
+        redacted = cassette.redact({'properties': {'api-key': 's3cret', 'Bucket': 'b1', 'Empty Password': None}},
+                                   {'api-key'})
+        self.assertEqual({'api-key': cassette.REDACTED, 'Bucket': 'b1', 'Empty Password': None},
+                         redacted['properties'])
+
+    def test_record_and_replay(self):
+        recorder = RecordingSession(FakeSession(), self.filename, redact_names={'Bucket'})
+        recorder.request('PUT', 'http://node1:8080/nifi-api/processors/p1',
+                         json={'component': {'config': {'properties': {'Bucket': 'b2'}}}})
+        recorder.request('POST', 'http://node1:8080/nifi-api/access/token', data={'password': 'x'})
+        recorder.close()
+
+        with gzip.open(self.filename, 'rt') as f:
+            raw = f.read()
+        self.assertNotIn('hunter2', raw)
+        self.assertNotIn('b2', raw)
+
+        replay = ReplaySession(self.filename, speed=0)
+        response = replay.request('PUT', 'http://other:9090/nifi-api/processors/p1')
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(cassette.REDACTED, response.json()['component']['config']['properties']['Password'])
+        self.assertEqual(404, replay.request('GET', 'http://other:9090/nifi-api/unknown').status_code)
+
+        summary = cassette.summarize(self.filename)
+        self.assertEqual(2, summary['requests'])
+
+    def test_streamed_body_not_read(self):
+        recorder = RecordingSession(FakeSession(), self.filename)
+        response = recorder.request('GET', 'http://node1:8080/nifi-api/templates/t1/download', stream=True)
+        self.assertEqual('<template/>', response._text)
+        recorder.close()
+        entry = next(cassette.read_cassette(self.filename))
+        self.assertEqual((cassette.STREAMED, 11), (entry['b'], entry['n']))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,35 @@
+import unittest
+from nifiapi.cluster import NodeRouter
+
+
+class Test(unittest.TestCase):
+
+    def test_coordinator_is_first_healthy_node(self):
+        router = NodeRouter(['http://a/nifi-api', 'http://b/nifi-api'], probe=lambda url: url != 'http://a/nifi-api')
+        self.assertEqual('http://b/nifi-api', router.coordinator().url)
+
+    def test_reads_skip_down_nodes(self):
+        router = NodeRouter(['http://a', 'http://b', 'http://c'], probe=lambda url: url != 'http://b')
+        for i in range(20):
+            self.assertNotIn('http://b', [node.url for node in router.read_nodes()])
+
+    def test_reads_spread_across_nodes(self):
+        router = NodeRouter(['http://a', 'http://b'], probe=lambda url: True)
+        router.health_check()
+        for node in router.nodes:
+            node.latency = 0.01
+        first = set(router.read_nodes()[0].url for i in range(200))
+        self.assertEqual({'http://a', 'http://b'}, first)
+
+    def test_down_node_rechecked(self):
+        up = {'http://b': False}
+        router = NodeRouter(['http://a', 'http://b'], probe=lambda url: up.get(url, True), recheck_interval=0.0)
+        router.health_check()
+        self.assertFalse(router.nodes[1].healthy)
+        up['http://b'] = True
+        router.read_nodes()
+        self.assertTrue(router.nodes[1].healthy)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,111 @@
+import unittest
+import threading
+import time
+from nifiapi.controllers import ControllerServiceIndex, ServiceListError
+from nifiapi.model import ControllerService
+
+
+def entity(id, name, group_id):
+    return {"id": id, "revision": {"version": 0},
+            "component": {"id": id, "name": name, "parentGroupId": group_id, "state": "DISABLED"}}
+
+
+class FakeApi:
+    """
+    root > a > b, with services listed the way NiFi lists them: a group's scope includes its ancestors.
+    """
+
+    def __init__(self):
+        self.parents = {"root": None, "a": "root", "b": "a"}
+        self.services = [entity("s1", "Cache", "root"), entity("s2", "DB", "a"), entity("s3", "Cache", "a"),
+                         entity("g1", "Server", None)]
+        self.listings = []
+        self.created = []
+        self.unlisted = set()
+
+    def get_controller_service_models(self, group_id, include_descendants=False, include_ancestors=False):
+        self.listings.append((group_id, include_ancestors))
+        if group_id in self.unlisted:
+            return None
+        groups = set()
+        while group_id is not None:
+            groups.add(group_id)
+            group_id = self.parents[group_id] if include_ancestors else None
+        return [ControllerService.of(service) for service in self.services
+                if service["component"]["parentGroupId"] in groups or
+                (not groups and service["component"]["parentGroupId"] is None)]
+
+    def get_process_group_status(self, id, recursive=False):
+        def snapshot(group_id):
+            return {"id": group_id, "name": group_id, "processGroupStatusSnapshots": [
+                {"processGroupStatusSnapshot": snapshot(child)} for child, parent in self.parents.items()
+                if parent == group_id]}
+        return {"processGroupStatus": {"aggregateSnapshot": snapshot("root")}}
+
+    def create(self, name, group_id):
+        time.sleep(0.01)
+        service = entity("new{}".format(len(self.created)), name, group_id)
+        self.created.append(service)
+        self.services.append(service)
+        return service
+
+    def create_controller_service(self, name, properties):
+        return self.create(name, None)
+
+    def create_controller_for_process_group(self, name, properties, process_group_id):
+        return self.create(name, process_group_id)
+
+
+class Test(unittest.TestCase):
+
+    def setUp(self):
+        self.api = FakeApi()
+        self.index = ControllerServiceIndex(self.api)
+
+    def test_one_listing_per_scope(self):
+        self.assertEqual("s2", self.index.find("DB", "b").id)
+        self.assertIsNone(self.index.find("Missing", "b"))
+        self.assertEqual("g1", self.index.find("Server").id)
+        self.assertIsNone(self.index.find("DB"))
+        self.assertEqual([("b", True), (None, False)], self.api.listings)
+
+    def test_closest_ancestor_wins(self):
+        self.assertEqual("s3", self.index.find("Cache", "b").id)
+        self.assertEqual("s3", self.index.find("Cache", "a").id)
+
+    def test_get_or_create_once(self):
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(self.index.get_or_create("Map", [], "b")))
+                   for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(1, len(self.api.created))
+        self.assertEqual(1, len([created for service, created in results if created]))
+        self.assertEqual(set(["new0"]), set(service.id for service, created in results))
+        self.assertEqual(1, len(self.api.listings))
+        service, created = self.index.get_or_create("DB", [], "b")
+        self.assertEqual(("s2", False), (service.id, created))
+
+    def test_created_service_visible_from_nested_groups(self):
+        self.index.find("DB", "b")
+        service, created = self.index.get_or_create("Map", [], "a")
+        self.assertTrue(created)
+        self.assertEqual(service.id, self.index.find("Map", "b").id)
+        service, created = self.index.get_or_create("Global", [])
+        self.assertIsNone(service.parent_group_id)
+        self.assertEqual(service.id, self.index.find("Global").id)
+
+    def test_failed_listing_is_not_a_missing_service(self):
+        self.api.unlisted.add("b")
+        with self.assertRaises(ServiceListError):
+            self.index.find("DB", "b")
+        self.assertEqual((None, False), self.index.get_or_create("Map", [], "b"))
+        self.assertEqual([], self.api.created)
+        self.api.unlisted.clear()
+        self.assertEqual("s2", self.index.find("DB", "b").id)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,75 @@
+import unittest
+import threading
+import time
+from nifiapi import governor
+from nifiapi.governor import Governor, AimdLimiter, TokenBucket
+
+
+class FakeResponse:
+
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+
+
+class Test(unittest.TestCase):
+
+    def test_classify(self):
+        self.assertEqual(governor.READ, governor.classify('GET', '/flow/process-groups/root'))
+        self.assertEqual(governor.MUTATION, governor.classify('PUT', '/processors/abc'))
+        self.assertEqual(governor.DROP, governor.classify('POST', '/flowfile-queues/abc/drop-requests'))
+        self.assertEqual(governor.DROP, governor.classify('GET', '/flowfile-queues/abc/drop-requests/def'))
+
+    def test_retries_service_unavailable(self):
+        responses = [FakeResponse(503, {'Retry-After': '0'}), FakeResponse(429, {'Retry-After': '0'}),
+                     FakeResponse(200)]
+        gov = Governor()
+        response = gov.call('GET', '/flow/about', lambda: responses.pop(0))
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(2, gov.stats[governor.READ]['retries'])
+
+    def test_conflict_not_retried(self):
+        calls = []
+        gov = Governor()
+        response = gov.call('PUT', '/processors/abc', lambda: calls.append(1) or FakeResponse(409))
+        self.assertEqual(409, response.status_code)
+        self.assertEqual(1, len(calls))
+        self.assertEqual(1, gov.stats[governor.MUTATION]['overloaded'])
+
+    def test_post_not_retried(self):
+        calls = []
+        gov = Governor()
+        response = gov.call('POST', '/process-groups/abc/template-instance',
+                            lambda: calls.append(1) or FakeResponse(503, {'Retry-After': '0'}))
+        self.assertEqual(503, response.status_code)
+        self.assertEqual(1, len(calls))
+
+    def test_bucket_sleeps_outside_the_lock(self):
+        bucket = TokenBucket(rate=5, burst=1)
+        bucket.acquire()
+        waiter = threading.Thread(target=bucket.acquire)
+        waiter.start()
+        time.sleep(0.05)
+        # The waiter is sleeping for its token, the lock is free for the next caller.
+        self.assertTrue(bucket.lock.acquire(blocking=False))
+        bucket.lock.release()
+        waiter.join()
+        self.assertLess(bucket.tokens, 0.5)
+
+    def test_aimd(self):
+        limiter = AimdLimiter(initial=4, minimum=1, maximum=8, latency_target=1.0, cooldown=0.0)
+        limiter.acquire()
+        limiter.release(0.1, False)
+        self.assertAlmostEqual(4.25, limiter.limit)
+        limiter.acquire()
+        limiter.release(0.1, True)
+        self.assertAlmostEqual(2.125, limiter.limit)
+        limiter.acquire()
+        limiter.release(5.0, False)
+        limiter.acquire()
+        limiter.release(5.0, False)
+        self.assertEqual(1.0, limiter.limit)
+
+
+if __name__ == "__main__":
+    unittest.main()
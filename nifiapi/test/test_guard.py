@@ -0,0 +1,62 @@
+import unittest
+from nifiapi import guard
+from nifiapi.test.fixtures import FakeApi, bulletin, snapshot
+
+
+class Test(unittest.TestCase):
+
+    def setUp(self):
+        self.api = FakeApi({"old": snapshot("old", "PG1", snapshot("old-child", "Inner", out=1000, queued=50),
+                                            out=2000, queued=100),
+                            "new": snapshot("new", "PG1", snapshot("new-child", "Inner"), out=600, queued=150)},
+                           [bulletin(1, "old-child"), bulletin(2, "elsewhere"), bulletin(3, "old", "WARNING")])
+
+    def test_sample(self):
+        before = guard.baseline(self.api, "old")
+        self.assertEqual({"flowfiles_out": 3000, "bytes_out": 30000, "queued": 100, "errors": 1,
+                          "elapsed": guard.STATS_WINDOW, "cursor": 3}, before)
+
+    def test_sample_without_output_ports(self):
+        # A top level group reports no flowFilesOut of its own, the throughput is what its processors transferred.
+        after = guard.sample(FakeApi({"top": snapshot("top", "PG1", out=500)}, []), "top", None, 60)
+        self.assertEqual((500, 5000), (after["flowfiles_out"], after["bytes_out"]))
+
+    def test_baseline_without_existing_group(self):
+        before = guard.baseline(self.api, None)
+        self.assertEqual(0, before["flowfiles_out"])
+        self.assertEqual(3, before["cursor"])
+
+    def test_compare(self):
+        before = guard.baseline(self.api, "old")
+        self.api.bulletins.append(bulletin(4, "new-child"))
+        after = guard.sample(self.api, "new", before["cursor"], 60)
+        deltas = dict((delta["metric"], delta) for delta in guard.compare(before, after, guard.Thresholds(), 60))
+        # 10 flowfiles/s before and after, the first within the 5 minute window, the second within one minute.
+        self.assertEqual((10.0, 10.0), (deltas[guard.THROUGHPUT]["before"], deltas[guard.THROUGHPUT]["after"]))
+        self.assertTrue(deltas[guard.THROUGHPUT]["ok"])
+        self.assertTrue(deltas[guard.QUEUED]["ok"])
+        # One error in five minutes allows 0.2 in one minute, the new flow raised one.
+        self.assertAlmostEqual(0.2, deltas[guard.ERRORS]["limit"])
+        self.assertFalse(deltas[guard.ERRORS]["ok"])
+        self.assertTrue(guard.regressed(list(deltas.values())))
+
+    def test_throughput_regression(self):
+        before = guard.baseline(self.api, "old")
+        after = guard.sample(self.api, "new", before["cursor"], 120)
+        deltas = guard.compare(before, after, guard.Thresholds(), 120)
+        self.assertEqual([False, True, True], [delta["ok"] for delta in deltas])
+        self.assertIn("REGRESSED", guard.format_deltas(deltas))
+        self.assertFalse(guard.regressed(guard.compare(before, after, guard.Thresholds(min_throughput=0.5), 120)))
+
+    def test_watch_ends_early_on_errors(self):
+        before = guard.baseline(self.api, "old")
+        self.api.bulletins.append(bulletin(4, "new"))
+        after, deltas = guard.watch(self.api, "new", before, guard.Thresholds(), 3600, interval=3600)
+        self.assertEqual(1, after["errors"])
+        self.assertTrue(guard.regressed(deltas))
+
+    def test_idle_flow_does_not_regress(self):
+        before = guard.baseline(self.api, None)
+        after, deltas = guard.watch(self.api, "new", before, guard.Thresholds(), 0)
+        self.assertFalse(guard.regressed(deltas))
+        self.assertIsNone(guard.watch(FakeApi({}, []), "missing", before, guard.Thresholds(), 0)[1])
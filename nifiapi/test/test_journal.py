@@ -0,0 +1,84 @@
+import unittest
+import os
+import tempfile
+from nifiapi.journal import DeployJournal
+from nifiapi.model import ProcessGroup
+from nifiapi.plan import DeployPlan, PlanExecutor, PlanError
+
+KEY = {"template": "t.xml", "sha1": "abc"}
+
+
+class Test(unittest.TestCase):
+
+    def setUp(self):
+        self.filename = os.path.join(tempfile.mkdtemp(), "deploy.journal")
+
+    def build_plan(self, calls, fail=None, verify=None):
+        plan = DeployPlan()
+
+        def op(name, result):
+            def run():
+                calls.append(name)
+                if name == fail:
+                    raise PlanError("boom")
+                return result
+            return run
+
+        plan.add('upload', op('upload', 'template-1'), verify=verify)
+        plan.add('local', op('local', None), checkpoint=False)
+        plan.add('instantiate', op('instantiate', ProcessGroup('pg-1')), depends_on=['upload', 'local'])
+        plan.add('start', op('start', None), depends_on=['instantiate'])
+        return plan
+
+    def test_resume_after_failure(self):
+        calls = []
+        journal = DeployJournal(self.filename, KEY)
+        self.assertFalse(PlanExecutor(self.build_plan(calls, fail='start'), 2, journal).run())
+        journal.close()
+
+        calls = []
+        journal = DeployJournal(self.filename, KEY, resume=True)
+        self.assertEqual(2, len(journal))
+        plan = self.build_plan(calls)
+        self.assertTrue(PlanExecutor(plan, 2, journal).run())
+        self.assertEqual(['local', 'start'], calls)
+        self.assertTrue(plan.operations['instantiate'].resumed)
+        # Models are journaled by id.
+        self.assertEqual('pg-1', plan.result('instantiate'))
+        journal.remove()
+        self.assertFalse(os.path.exists(self.filename))
+
+    def test_failed_verification_reruns_dependents(self):
+        journal = DeployJournal(self.filename, KEY)
+        PlanExecutor(self.build_plan([], fail='start'), 2, journal).run()
+        journal.close()
+
+        calls = []
+        journal = DeployJournal(self.filename, KEY, resume=True)
+        plan = self.build_plan(calls, verify=lambda template_id: False)
+        self.assertTrue(PlanExecutor(plan, 2, journal).run())
+        self.assertEqual(['instantiate', 'local', 'start', 'upload'], sorted(calls))
+        self.assertFalse(plan.operations['instantiate'].resumed)
+        journal.close()
+
+    def test_different_deploy_is_not_resumed(self):
+        journal = DeployJournal(self.filename, KEY)
+        journal.record('upload', 'template-1')
+        journal.close()
+        self.assertEqual(0, len(DeployJournal(self.filename, dict(KEY, sha1="def"), resume=True)))
+
+    def test_truncated_line(self):
+        journal = DeployJournal(self.filename, KEY)
+        journal.record('upload', 'template-1')
+        journal.close()
+        with open(self.filename, "a") as f:
+            f.write('{"op":"instan')
+        journal = DeployJournal(self.filename, KEY, resume=True)
+        self.assertEqual(['upload'], list(journal.entries))
+        journal.record('instantiate', 'pg-1')
+        journal.close()
+        self.assertEqual(2, len(DeployJournal(self.filename, KEY, resume=True)))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,61 @@
+import unittest
+from nifiapi.model import ProcessGroup, Processor, entity_id, revision_version
+
+
+PGF = {
+    "processGroupFlow": {
+        "id": "pg-1",
+        "parentGroupId": "root",
+        "breadcrumb": {"breadcrumb": {"id": "pg-1", "name": "Ingest"}},
+        "flow": {
+            "processors": [{
+                "id": "p-1",
+                "revision": {"version": 3},
+                "component": {"id": "p-1", "name": "Fetch", "parentGroupId": "pg-1", "state": "RUNNING",
+                              "type": "org.apache.nifi.processors.standard.GetFile",
+                              "config": {"properties": {"Input Directory": "/tmp", "Batch Size": None}}}
+            }],
+            "connections": [{
+                "id": "c-1",
+                "revision": {"version": 0},
+                "status": {"aggregateSnapshot": {"flowFilesQueued": 7}},
+                "component": {"id": "c-1", "parentGroupId": "pg-1",
+                              "source": {"id": "p-1", "type": "PROCESSOR", "groupId": "pg-1"},
+                              "destination": {"id": "in-1", "type": "INPUT_PORT", "groupId": "pg-2"}}
+            }],
+            "inputPorts": [],
+            "outputPorts": [],
+            "processGroups": [{"id": "pg-2", "revision": {"version": 1},
+                               "component": {"id": "pg-2", "name": "Child", "parentGroupId": "pg-1"}}]
+        }
+    }
+}
+
+
+class Test(unittest.TestCase):
+
+    def test_from_flow(self):
+        pg = ProcessGroup.of(PGF)
+        self.assertEqual("pg-1", pg.id)
+        self.assertEqual("Ingest", pg.name)
+        self.assertEqual("RUNNING", pg.processors[0].state)
+        self.assertEqual("/tmp", pg.processors[0].properties["Input Directory"])
+        self.assertEqual(7, pg.connections[0].queued)
+        self.assertEqual("in-1", pg.connections[0].destination_id)
+        self.assertEqual(["pg-2"], [child.id for child in pg.process_groups])
+        self.assertIs(pg, ProcessGroup.of(pg))
+
+    def test_slots(self):
+        processor = ProcessGroup.of(PGF).processors[0]
+        with self.assertRaises(AttributeError):
+            processor.extra = 1
+
+    def test_either_form(self):
+        raw = PGF["processGroupFlow"]["flow"]["processors"][0]
+        model = Processor.of(raw)
+        self.assertEqual(entity_id(raw), entity_id(model))
+        self.assertEqual(revision_version(raw), revision_version(model))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,7 +1,43 @@
 import unittest
 from nifiapi.nifiapi import NifiApi
+from nifiapi.model import Connection, ProcessGroup, Processor
+from nifiapi.walker import WalkError
 import logging
 import json
+import requests
+
+
+class FakeResponse:
+
+    def __init__(self, status_code, body=None):
+        self.status_code = status_code
+        self.headers = {}
+        self.body = body
+        self.text = json.dumps(body) if body is not None else ""
+
+    def json(self):
+        return self.body
+
+
+class FakeSession:
+    """
+    Answers every request with the next of the given status codes, 200 once they run out.
+    """
+
+    def __init__(self, statuses=(), fail_first=False):
+        self.statuses = list(statuses)
+        self.fail_first = fail_first
+        self.requests = []
+
+    def get(self, url, timeout=None):
+        # Health checks of the node router.
+        return FakeResponse(200)
+
+    def request(self, method, url, **kwargs):
+        self.requests.append((method, url, (kwargs.get('headers') or {}).get('Authorization')))
+        if self.fail_first and len(self.requests) == 1:
+            raise requests.ConnectionError("refused")
+        return FakeResponse(self.statuses.pop(0) if self.statuses else 200)
 
 
 class Test(unittest.TestCase):
@@ -45,5 +81,198 @@ class Test(unittest.TestCase):
         self.assertIsNotNone(new_processor['component']['config']['properties']['webhook-url'])
         self.assertEqual(channel, new_processor['component']['config']['properties']['channel'])
 
+
+class FakeAuth:
+    """
+    Hands out t1, t2, ... and moves on to the next token when the current one is invalidated.
+    """
+
+    def __init__(self):
+        self.count = 1
+        self.invalidated = []
+
+    def get_token(self, session, url):
+        return "t{}".format(self.count)
+
+    def invalidate(self, token, url):
+        self.invalidated.append((token, url))
+        if token == "t{}".format(self.count):
+            self.count += 1
+
+
+class SendTest(unittest.TestCase):
+
+    def setUp(self):
+        self.api = NifiApi('http://a/nifi-api,http://b/nifi-api')
+        self.api.session = FakeSession(fail_first=True)
+
+    def test_get_fails_over(self):
+        response = self.api.send('GET', '/flow/about')
+        self.assertEqual(200, response.status_code)
+        first, second = [url for method, url, token in self.api.session.requests]
+        self.assertNotEqual(first.split('/')[2], second.split('/')[2])
+        down = [node for node in self.api.router.nodes if not node.healthy]
+        self.assertEqual([first.split('/flow')[0]], [node.url for node in down])
+
+    def test_mutations_go_to_the_coordinator(self):
+        # b answers reads faster, but mutations still go to a, the first node.
+        self.api.router.health_check()
+        self.api.router.nodes[0].latency = 1.0
+        self.api.router.nodes[1].latency = 0.001
+        with self.assertRaises(requests.ConnectionError):
+            self.api.send('PUT', '/processors/p1', json={})
+        self.assertEqual([('PUT', 'http://a/nifi-api/processors/p1', None)], self.api.session.requests)
+        # a is down now, so the next mutation goes to b.
+        self.assertEqual(200, self.api.send('DELETE', '/processors/p1').status_code)
+        self.assertEqual('http://b/nifi-api/processors/p1', self.api.session.requests[-1][1])
+
+
+
+class AuthTest(unittest.TestCase):
+
+    def setUp(self):
+        self.auth = FakeAuth()
+        self.api = NifiApi('http://a/nifi-api', auth=self.auth)
+
+    def test_refresh_on_401(self):
+        self.api.session = FakeSession([401, 200])
+        self.assertEqual(200, self.api.send('GET', '/flow/about').status_code)
+        self.assertEqual(['Bearer t1', 'Bearer t2'], [token for method, url, token in self.api.session.requests])
+        self.assertEqual([('t1', 'http://a/nifi-api')], self.auth.invalidated)
+
+    def test_refresh_only_once(self):
+        self.api.session = FakeSession([401, 401, 200])
+        self.assertEqual(401, self.api.send('GET', '/flow/about').status_code)
+        self.assertEqual(2, len(self.api.session.requests))
+        self.assertEqual(1, len(self.auth.invalidated))
+
+
+
+def connect(group, source, destination):
+    return Connection("{}-{}".format(source, destination), parent_group_id=group,
+                      source={"id": source, "groupId": group}, destination={"id": destination, "groupId": group})
+
+
+class StatusChangeTest(unittest.TestCase):
+
+    def setUp(self):
+        # source -> mid -> sink, each on its own level
+        self.pg = ProcessGroup("pg", "PG")
+        self.pg.processors = [Processor(name, name, "pg") for name in ("source", "mid", "sink")]
+        self.pg.connections = [connect("pg", "source", "mid"), connect("pg", "mid", "sink")]
+        self.api = NifiApi('http://a/nifi-api')
+        self.api.walk_process_groups = lambda root, strict=False: iter([self.pg])
+        self.api.change_component_status = self.change
+        self.api.iterate_and_change_controllers = lambda processor, cstate: self.calls.append(cstate)
+        self.calls = []
+        self.failing = None
+
+    def change(self, component, status):
+        self.calls.append(component.id)
+        return component.id != self.failing
+
+    def test_stop_sources_first(self):
+        self.assertTrue(self.api.status_change_all_processors("pg", NifiApi.PROCESSOR_STOPPED,
+                                                              NifiApi.CONTROLLER_DISABLED))
+        self.assertEqual(["source", "mid", "sink"] + [NifiApi.CONTROLLER_DISABLED] * 3, self.calls)
+
+    def test_start_sinks_first(self):
+        self.assertTrue(self.api.status_change_all_processors("pg", NifiApi.PROCESSOR_RUNNING,
+                                                              NifiApi.CONTROLLER_ENABLED))
+        self.assertEqual([NifiApi.CONTROLLER_ENABLED] * 3 + ["sink", "mid", "source"], self.calls)
+
+    def test_failed_level_stops_later_levels(self):
+        self.failing = "mid"
+        self.assertFalse(self.api.status_change_all_processors("pg", NifiApi.PROCESSOR_STOPPED,
+                                                               NifiApi.CONTROLLER_DISABLED))
+        # Neither the sink nor the controllers are touched.
+        self.assertEqual(["source", "mid"], self.calls)
+
+    def test_partial_tree_not_changed(self):
+        def walk(root, strict=False):
+            raise WalkError("Could not fetch process group pg")
+        self.api.walk_process_groups = walk
+        self.assertFalse(self.api.status_change_all_processors("pg", NifiApi.PROCESSOR_STOPPED, None))
+        self.assertEqual([], self.calls)
+
+
+
+def thread_status(threads):
+    """
+    Status of pg, and the nested group inner holding p2, with the given active thread count per processor.
+    """
+    def processors(ids):
+        return [{"processorStatusSnapshot": {"id": id, "name": id.upper(), "activeThreadCount": threads.get(id, 0)}}
+                for id in ids]
+    inner = {"id": "inner", "name": "Inner", "processorStatusSnapshots": processors(["p2"])}
+    return {"processGroupStatus": {"aggregateSnapshot": {
+        "id": "pg", "name": "PG", "processorStatusSnapshots": processors(["p1"]),
+        "processGroupStatusSnapshots": [{"processGroupStatusSnapshot": inner}]}}}
+
+
+class ThreadsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.pg = ProcessGroup("pg", "PG")
+        self.pg.processors = [Processor("p1", "P1", "pg")]
+        self.api = NifiApi('http://a/nifi-api')
+        self.api.walk_process_groups = lambda root, strict=False: iter([self.pg])
+        self.api.change_component_status = lambda component, status: True
+        self.api.iterate_and_change_controllers = lambda processor, cstate: None
+        self.api.get_process_group_status = self.status
+        self.api.send = self.send
+        # Answers of the status polls in turn, the last one is repeated.
+        self.statuses = []
+        self.polls = 0
+        self.delete_status = 200
+        self.deletes = []
+
+    def status(self, id, recursive=False):
+        self.polls += 1
+        return self.statuses.pop(0) if len(self.statuses) > 1 else self.statuses[0]
+
+    def send(self, method, path, **kwargs):
+        self.deletes.append((method, path))
+        return FakeResponse(self.delete_status)
+
+    def stop(self, deadline):
+        forced = []
+        ok = self.api.status_change_all_processors("pg", NifiApi.PROCESSOR_STOPPED, NifiApi.CONTROLLER_DISABLED,
+                                                   deadline=deadline, forced=forced)
+        return ok, forced
+
+    def test_threads_terminated_after_deadline(self):
+        self.statuses = [thread_status({"p2": 2})]
+        self.assertEqual((True, [("p2", "P2")]), self.stop(0))
+        self.assertEqual([("DELETE", "/processors/p2/threads")], self.deletes)
+
+    def test_terminate_not_supported(self):
+        self.statuses = [thread_status({"p1": 1, "p2": 2})]
+        self.delete_status = 405
+        self.assertEqual((False, []), self.stop(0))
+        self.assertFalse(self.api.terminate_supported)
+        # No further DELETEs once the server said it can't.
+        self.assertIsNone(self.api.wait_for_threads("pg", 0))
+        self.assertEqual([("DELETE", "/processors/p1/threads")], self.deletes)
+
+    def test_failed_poll_retried(self):
+        self.statuses = [None, thread_status({"p1": 1}), thread_status({})]
+        self.assertEqual([], self.api.wait_for_threads("pg", 5, interval=0))
+        self.assertEqual(3, self.polls)
+        self.assertEqual([], self.deletes)
+
+    def test_status_never_read(self):
+        self.statuses = [None]
+        self.assertIsNone(self.api.wait_for_threads("pg", 0.05, interval=0.01))
+        self.assertGreater(self.polls, 1)
+        self.assertEqual([], self.deletes)
+
+    def test_clean_stop_forces_nothing(self):
+        self.statuses = [thread_status({})]
+        self.assertEqual((True, []), self.stop(60))
+        self.assertEqual(1, self.polls)
+        self.assertEqual([], self.deletes)
+
+
 if __name__ == "__main__":
     unittest.main()
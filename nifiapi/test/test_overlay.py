@@ -0,0 +1,92 @@
+import unittest
+import configparser
+import os
+import tempfile
+import xml.etree.ElementTree as ET
+from nifiapi import overlay
+
+TEMPLATE = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<template encoding-version="1.1">
+    <name>Test &amp; Template</name>
+    <snippet>
+        <processGroups>
+            <contents>
+                <controllerServices>
+                    <descriptors>
+                        <entry><key>password</key><value><sensitive>true</sensitive></value></entry>
+                    </descriptors>
+                    <name>Cache</name>
+                    <properties>
+                        <entry><key>config_section</key><value>CacheProd</value></entry>
+                        <entry><key>host</key><value>dev</value></entry>
+                        <entry><key>password</key></entry>
+                    </properties>
+                </controllerServices>
+                <processors>
+                    <config>
+                        <descriptors>
+                            <entry><key>webhook-url</key><value><sensitive>true</sensitive></value></entry>
+                        </descriptors>
+                        <properties>
+                            <entry><key>channel</key><value>dev</value></entry>
+                        </properties>
+                    </config>
+                    <name>PutSlack</name>
+                </processors>
+            </contents>
+            <name>Group</name>
+        </processGroups>
+    </snippet>
+</template>
+"""
+
+CONFIG = """
+[PutSlack]
+webhook-url = https://hooks/secret
+channel = prod
+icon = :robot:
+
+[CacheProd]
+host = cache.prod
+password = secret
+_requires_service = Server
+"""
+
+
+class Test(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.src = os.path.join(directory, 'template.xml')
+        self.dst = os.path.join(directory, 'overlaid.xml')
+        with open(self.src, 'w') as f:
+            f.write(TEMPLATE)
+        self.config = configparser.RawConfigParser()
+        self.config.optionxform = str
+        self.config.read_string(CONFIG)
+
+    def properties(self, root, path):
+        return dict((entry.findtext('key'), entry.findtext('value')) for entry in root.findall(path))
+
+    def test_overlay(self):
+        applied = overlay.overlay_template(self.src, self.dst, self.config)
+        self.assertEqual({'PutSlack': {'channel', 'icon'}}, applied[overlay.PROCESSORS])
+        self.assertEqual({'CacheProd': {'host'}}, applied[overlay.CONTROLLER_SERVICES])
+
+        root = ET.parse(self.dst).getroot()
+        self.assertEqual('Test & Template', root.findtext('name'))
+        processor = self.properties(root, 'snippet/processGroups/contents/processors/config/properties/entry')
+        self.assertEqual({'channel': 'prod', 'icon': ':robot:'}, processor)
+        service = self.properties(root, 'snippet/processGroups/contents/controllerServices/properties/entry')
+        self.assertEqual('cache.prod', service['host'])
+        self.assertIsNone(service['password'])
+
+    def test_is_applied(self):
+        applied = overlay.overlay_template(self.src, self.dst, self.config)
+        self.assertTrue(overlay.is_applied(applied, overlay.PROCESSORS, 'PutSlack', 'channel'))
+        self.assertFalse(overlay.is_applied(applied, overlay.PROCESSORS, 'PutSlack', 'webhook-url'))
+        self.assertFalse(overlay.is_applied(None, overlay.PROCESSORS, 'PutSlack', 'channel'))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,76 @@
+import unittest
+import threading
+from nifiapi.plan import DeployPlan, PlanExecutor, PlanError, Operation
+
+
+class Test(unittest.TestCase):
+
+    def test_dependencies_run_first(self):
+        plan = DeployPlan()
+        order = []
+        plan.add('a', lambda: order.append('a'))
+        plan.add('b', lambda: order.append('b'), depends_on=['a'])
+        plan.add('c', lambda: order.append('c'), depends_on=['b'])
+        self.assertTrue(PlanExecutor(plan, 4).run())
+        self.assertEqual(['a', 'b', 'c'], order)
+
+    def test_independent_operations_overlap(self):
+        plan = DeployPlan()
+        barrier = threading.Barrier(2, timeout=5)
+        plan.add('a', barrier.wait)
+        plan.add('b', barrier.wait)
+        self.assertTrue(PlanExecutor(plan, 2).run())
+
+    def test_failure_skips_dependents(self):
+        plan = DeployPlan()
+
+        def fail():
+            raise PlanError("boom")
+
+        plan.add('a', fail)
+        plan.add('b', lambda: None, depends_on=['a'])
+        self.assertFalse(PlanExecutor(plan, 2).run())
+        self.assertEqual(Operation.FAILED, plan.operations['a'].state)
+        self.assertEqual(Operation.SKIPPED, plan.operations['b'].state)
+
+    def test_abort(self):
+        plan = DeployPlan()
+        executor = PlanExecutor(plan, 2)
+        plan.add('a', lambda: executor.abort("watcher saw an error"))
+        plan.add('b', lambda: None, depends_on=['a'])
+        self.assertFalse(executor.run())
+        self.assertEqual(Operation.DONE, plan.operations['a'].state)
+        self.assertEqual(Operation.SKIPPED, plan.operations['b'].state)
+        self.assertEqual("watcher saw an error", executor.aborted)
+
+    def test_runtime_expansion(self):
+        plan = DeployPlan()
+        done = []
+
+        def expand():
+            for i in range(3):
+                plan.add('child{}'.format(i), lambda i=i: done.append(i), depends_on=['parent'],
+                         required_by=['join'])
+
+        plan.add('parent', expand)
+        plan.add('join', lambda: len(done), depends_on=['parent'])
+        self.assertTrue(PlanExecutor(plan, 2).run())
+        self.assertEqual(3, plan.result('join'))
+
+    def test_critical_path(self):
+        plan = DeployPlan()
+        plan.add('a', lambda: None, cost=1.0)
+        plan.add('b', lambda: None, cost=5.0)
+        plan.add('c', lambda: None, depends_on=['a', 'b'], cost=1.0)
+        path, total = plan.critical_path()
+        self.assertEqual(['b', 'c'], [op.name for op in path])
+        self.assertEqual(6.0, total)
+
+    def test_unknown_dependency(self):
+        plan = DeployPlan()
+        with self.assertRaises(ValueError):
+            plan.add('a', lambda: None, depends_on=['missing'])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,145 @@
+import unittest
+import configparser
+import os
+import tempfile
+from nifiapi import preflight
+
+TEMPLATE = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<template encoding-version="1.1">
+    <description>Not the name</description>
+    <name>Ingest</name>
+    <snippet>
+        <processGroups>
+            <id>pg-1</id>
+            <contents>
+                <controllerServices>
+                    <descriptors>
+                        <entry>
+                            <key>password</key>
+                            <value><required>true</required><sensitive>true</sensitive></value>
+                        </entry>
+                    </descriptors>
+                    <id>cs-1</id>
+                    <name>Cache</name>
+                    <properties>
+                        <entry><key>config_section</key><value>CacheProd</value></entry>
+                        <entry><key>host</key><value>dev</value></entry>
+                        <entry><key>password</key></entry>
+                    </properties>
+                </controllerServices>
+                <connections>
+                    <destination><groupId>pg-1</groupId><id>{destination}</id></destination>
+                    <id>conn-1</id>
+                    <name>success</name>
+                    <source><groupId>pg-1</groupId><id>{processor}</id></source>
+                </connections>
+                <processGroups>
+                    <id>pg-2</id>
+                    <contents>
+                        <inputPorts><id>in-1</id><name>In</name></inputPorts>
+                    </contents>
+                    <name>Nested</name>
+                </processGroups>
+                <processors>
+                    <config>
+                        <descriptors>
+                            <entry>
+                                <key>webhook-url</key>
+                                <value>
+                                    <name>webhook-url</name><required>true</required><sensitive>true</sensitive>
+                                </value>
+                            </entry>
+                            <entry>
+                                <key>cache</key>
+                                <value><identifiesControllerService>Cache</identifiesControllerService></value>
+                            </entry>
+                        </descriptors>
+                        <properties>
+                            <entry><key>cache</key><value>{service}</value></entry>
+                            <entry><key>channel</key><value>dev</value></entry>
+                            <entry><key>webhook-url</key></entry>
+                        </properties>
+                    </config>
+                    <id>{processor}</id>
+                    <name>PutSlack</name>
+                </processors>
+            </contents>
+            <name>Group</name>
+        </processGroups>
+    </snippet>
+</template>
+"""
+
+CONFIG = """
+[PutSlack]
+webhook-url = https://hooks/secret
+channel = prod
+
+[CacheProd]
+host = cache.prod
+password = secret
+_requires_service = Server
+"""
+
+
+class Test(unittest.TestCase):
+
+    def setUp(self):
+        self.filename = os.path.join(tempfile.mkdtemp(), 'template.xml')
+
+    def tearDown(self):
+        os.remove(self.filename)
+
+    def validate(self, config=None, destination="in-1", service="cs-1", processor="proc-1", template=TEMPLATE):
+        with open(self.filename, "w") as f:
+            f.write(template.format(destination=destination, service=service, processor=processor))
+        if config is not None:
+            parser = configparser.RawConfigParser()
+            parser.optionxform = str
+            parser.read_string(config)
+            config = parser
+        return preflight.validate_template(self.filename, config)
+
+    def messages(self, info, level=preflight.ERROR):
+        return [problem.message for problem in info.problems if problem.level == level]
+
+    def test_valid(self):
+        info = self.validate(CONFIG)
+        self.assertEqual([], info.problems)
+        self.assertEqual("Ingest", info.name)
+        self.assertEqual("Group", info.process_group_name)
+
+    def test_dangling_connection(self):
+        info = self.validate(destination="gone")
+        self.assertEqual(["Connection success has destination gone which isn't in the template"], self.messages(info))
+
+    def test_missing_controller_service(self):
+        info = self.validate(service="cs-2")
+        self.assertEqual(["cache of PutSlack references controller service cs-2, which isn't in the template"],
+                         self.messages(info))
+
+    def test_duplicate_id(self):
+        info = self.validate(processor="cs-1")
+        self.assertEqual(["Id cs-1 is used by 2 components"], self.messages(info))
+
+    def test_unset_sensitive_property(self):
+        info = self.validate(CONFIG.replace("webhook-url = https://hooks/secret\n", ""))
+        self.assertEqual(["Sensitive property webhook-url of PutSlack isn't set in the template or [PutSlack] of the "
+                          "sensitive config"], self.messages(info))
+
+    def test_config_typos(self):
+        info = self.validate(CONFIG.replace("host =", "hots =") + "\n[PutSlak]\nchannel = prod\n")
+        self.assertEqual([], self.messages(info))
+        self.assertEqual(["[CacheProd] sets hots, which CacheProd doesn't have",
+                          "Section [PutSlak] matches no processor or controller service in the template"],
+                         self.messages(info, preflight.WARNING))
+
+    def test_no_config(self):
+        self.assertEqual([], self.validate().problems)
+
+    def test_not_well_formed(self):
+        info = self.validate(template=TEMPLATE.replace("</template>", ""))
+        self.assertEqual(1, len(info.errors))
+        self.assertTrue(info.errors[0].message.startswith("Not well formed XML"))
+        self.assertEqual(["The template has no name", "The template has no process group"],
+                         self.messages(self.validate(template="<template><snippet/></template>")))
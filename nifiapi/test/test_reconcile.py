@@ -0,0 +1,116 @@
+import unittest
+import configparser
+from nifiapi import reconcile
+from nifiapi.model import ControllerService, Processor
+from nifiapi.nifiapi import NifiApi
+
+
+def processor(id, state):
+    return {"processorStatusSnapshot": {"id": id, "name": id, "runStatus": state}}
+
+
+def connection(source, destination):
+    return {"connectionStatusSnapshot": {"id": source + destination, "sourceId": source,
+                                         "destinationId": destination}}
+
+
+def group(id, name, processors=(), connections=(), children=()):
+    return {"id": id, "name": name, "processorStatusSnapshots": list(processors),
+            "connectionStatusSnapshots": list(connections),
+            "processGroupStatusSnapshots": [{"processGroupStatusSnapshot": child} for child in children]}
+
+
+def desired(text):
+    config = configparser.RawConfigParser()
+    config.optionxform = str
+    config.read_string(text)
+    return reconcile.DesiredState.parse(config)
+
+
+class FakeApi:
+
+    def __init__(self, status, states):
+        self.status = status
+        self.states = states
+        self.changes = []
+        self.gets = 0
+
+    def get_process_group_status(self, id, recursive=False):
+        self.gets += 1
+        pending = [self.status]
+        while pending:
+            snapshot = pending.pop()
+            for processor in snapshot["processorStatusSnapshots"]:
+                processor = processor["processorStatusSnapshot"]
+                processor["runStatus"] = self.states[processor["id"]].title()
+            pending.extend(child["processGroupStatusSnapshot"] for child in snapshot["processGroupStatusSnapshots"])
+        return {"processGroupStatus": {"aggregateSnapshot": self.status}}
+
+    def remote_get(self, path, id):
+        return {"id": id, "revision": {"version": 1}, "component": {"id": id, "name": id, "state": self.states[id]}}
+
+    def change_component_status(self, component, status):
+        self.changes.append((component.id, status))
+        self.states[component.id] = status
+        return True
+
+    def update_controller_status(self, controller, state):
+        self.changes.append((controller.id, state))
+        return {}
+
+
+class Test(unittest.TestCase):
+
+    def setUp(self):
+        # root: gen -> put, Ingest: read -> parse, Ingest/Staging: stage
+        self.states = {"gen": "RUNNING", "put": "STOPPED", "read": "STOPPED", "parse": "STOPPED", "stage": "RUNNING",
+                       "off": "DISABLED"}
+        staging = group("s", "Staging", [processor("stage", "Running")])
+        ingest = group("i", "Ingest", [processor("read", "Stopped"), processor("parse", "Stopped"),
+                                       processor("off", "Disabled")],
+                       [connection("read", "parse")], [staging])
+        self.api = FakeApi(group("root", "NiFi Flow", [processor("gen", "Running"), processor("put", "Stopped")],
+                                 [connection("gen", "put")], [ingest]), self.states)
+        self.flow = reconcile.read_flow_state(self.api)
+
+    def test_read_flow_state(self):
+        self.assertEqual({"root": "/", "i": "/Ingest", "s": "/Ingest/Staging"}, self.flow.paths)
+        self.assertEqual(["/Ingest/Staging", "/Ingest", "/"], self.flow.ancestor_paths("s"))
+        self.assertEqual(6, len(self.flow.components))
+
+    def test_closest_group_and_names_win(self):
+        state = desired("[/Ingest]\nstate = running\n[/Ingest/Stag*]\nstate = STOPPED\n[put]\nstate = RUNNING\n")
+        self.assertEqual(NifiApi.PROCESSOR_RUNNING, state.component_state("read", self.flow.ancestor_paths("i")))
+        self.assertEqual(NifiApi.PROCESSOR_STOPPED, state.component_state("stage", self.flow.ancestor_paths("s")))
+        self.assertEqual(NifiApi.PROCESSOR_RUNNING, state.component_state("put", self.flow.ancestor_paths("root")))
+        self.assertIsNone(state.component_state("gen", self.flow.ancestor_paths("root")))
+
+    def test_only_drifted_components_change_in_order(self):
+        state = desired("[/Ingest]\nstate = RUNNING\n[/Ingest/Staging]\nstate = STOPPED\n[gen]\nstate = RUNNING\n")
+        transitions = reconcile.diff(state, self.flow)
+        self.assertEqual(["parse", "read", "stage"], sorted(t.component.id for t in transitions))
+        reconcile.apply(self.api, transitions, self.flow)
+        self.assertTrue(all(t.ok for t in transitions))
+        # Stops first, then starts from the sink back to the source.
+        self.assertEqual([("stage", "STOPPED"), ("parse", "RUNNING"), ("read", "RUNNING")], self.api.changes)
+        self.assertEqual([], reconcile.diff(state, reconcile.read_flow_state(self.api)))
+        self.assertEqual(2, self.api.gets)
+
+    def test_controller_services(self):
+        state = desired("[/Ingest]\ncontrollers = ENABLED\n[Cache]\nstate = DISABLED\n")
+        self.assertTrue(state.wants_controllers())
+        services = [ControllerService("db", "DB", "s", state="DISABLED"),
+                    ControllerService("cache", "Cache", "i", state="ENABLED"),
+                    ControllerService("other", "Other", "root", state="DISABLED")]
+        transitions = reconcile.diff(state, self.flow, services)
+        reconcile.apply(self.api, transitions, self.flow)
+        self.assertEqual([("db", "ENABLED"), ("cache", "DISABLED")], self.api.changes)
+
+    def test_invalid_state(self):
+        self.assertRaises(ValueError, desired, "[/Ingest]\nstate = ENABLED\n")
+        self.assertRaises(ValueError, desired, "[PutSlack]\nstate = GO\n")
+        self.assertFalse(desired("[/]\nstate = STOPPED\n").wants_controllers())
+
+
+if __name__ == "__main__":
+    unittest.main()
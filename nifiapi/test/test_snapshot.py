@@ -0,0 +1,71 @@
+import unittest
+import os
+import tempfile
+from nifiapi import snapshot
+from nifiapi.model import ProcessGroup, Processor, ControllerService
+from nifiapi.walker import WalkError
+
+
+class FakeApi:
+    url = 'http://localhost:8080/nifi-api'
+
+    def __init__(self, missing=False):
+        self.missing = missing
+
+    def walk_process_groups(self, root_id, strict=False):
+        if self.missing and strict:
+            raise WalkError("Could not fetch process group g1")
+        root = ProcessGroup('root', 'NiFi Flow')
+        ingest = ProcessGroup('g1', 'Ingest', 'root')
+        ingest.processors = [
+            Processor('p1', 'Slack', 'g1', type='org.apache.nifi.processors.slack.PutSlack', state='RUNNING',
+                      properties={'channel': 'nifi-alerts', 'webhook-url': None}),
+            Processor('p2', 'Fetch', 'g1', type='org.apache.nifi.processors.standard.GetFile', state='STOPPED',
+                      properties={'Input Directory': '/data/in'}),
+        ]
+        return iter([root, ingest])
+
+    def get_controller_service_models(self, pg_id, include_descendants=False):
+        return [ControllerService('c1', 'Cache', 'g1', type='org.apache.nifi.DistributedMapCacheClientService',
+                                  state='ENABLED', properties={'Server Port': '4557'})]
+
+
+class Test(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.filename = os.path.join(tempfile.mkdtemp(), 'snapshot.db')
+        snapshot.export_snapshot(FakeApi(), cls.filename)
+        cls.store = snapshot.SnapshotStore(cls.filename)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.store.close()
+
+    def test_find_by_simple_type(self):
+        results = self.store.find(type='PutSlack')
+        self.assertEqual(['p1'], [r['id'] for r in results])
+        self.assertEqual('/Ingest', results[0]['path'])
+
+    def test_find_by_property(self):
+        self.assertEqual(['p2'], [r['id'] for r in self.store.find(properties=[('Input Directory', '/data/*')])])
+        self.assertEqual([], self.store.find(properties=[('webhook-url', None)]))
+
+    def test_find_controller_service(self):
+        results = self.store.find(kind=snapshot.CONTROLLER_SERVICE, group='/Ingest*')
+        self.assertEqual('4557', results[0]['properties']['Server Port'])
+
+    def test_find_by_name_glob(self):
+        self.assertEqual(['p2', 'p1'], [r['id'] for r in self.store.find(name='*', group_name='Ingest')])
+
+    def test_partial_flow_not_written(self):
+        self.assertIsNone(snapshot.export_snapshot(FakeApi(missing=True), self.filename))
+        self.assertFalse(os.path.exists(self.filename + '.tmp'))
+        # The previous snapshot is left as it was.
+        store = snapshot.SnapshotStore(self.filename)
+        self.assertEqual(1, len(store.find(type='PutSlack')))
+        store.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
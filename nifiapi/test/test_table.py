@@ -0,0 +1,15 @@
+import unittest
+from nifiapi.table import format_table
+
+
+class Test(unittest.TestCase):
+
+    def test_format_table(self):
+        rows = [("", ["before", "after"]), ("requests", ["120", "7"]), ("time (s)", ["3.50", "12.25"])]
+        self.assertEqual("          before  after\n"
+                         "requests     120      7\n"
+                         "time (s)    3.50  12.25", format_table(rows))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,36 @@
+import unittest
+from nifiapi import targets
+from nifiapi import tree
+from nifiapi.targets import GroupPattern
+from nifiapi.test.fixtures import FakeApi, snapshot
+
+
+class Test(unittest.TestCase):
+
+    def setUp(self):
+        self.api = FakeApi({"root": snapshot(
+            "root", "NiFi Flow",
+            snapshot("a", "Ingest", snapshot("a1", "Load-1"), snapshot("a2", "Load-2")),
+            snapshot("b", "Export-S3"),
+            snapshot("c", "Export-Kafka", snapshot("c1", "Load-10")))})
+        self.groups = tree.list_process_groups(self.api)
+
+    def resolve(self, *patterns):
+        found, unmatched = targets.resolve_targets(self.groups, [GroupPattern(p) for p in patterns])
+        return [group[0] for group in found], [pattern.pattern for pattern in unmatched]
+
+    def test_exact_name(self):
+        self.assertEqual((["b"], []), self.resolve("Export-S3"))
+        self.assertEqual(([], ["Export"]), self.resolve("Export"))
+
+    def test_glob_and_regex(self):
+        self.assertEqual((["b", "c"], []), self.resolve("Export-*"))
+        self.assertEqual((["a1", "a2"], []), self.resolve(r"re:^Load-\d$"))
+
+    def test_path(self):
+        self.assertEqual((["a1", "a2", "c1"], []), self.resolve("/*/Load-*"))
+        self.assertEqual((["root"], []), self.resolve("/"))
+
+    def test_nested_targets_are_dropped(self):
+        self.assertEqual((["a", "c1"], ["Missing"]), self.resolve("Load-*", "Ingest", "Missing"))
+        self.assertEqual((["a"], []), self.resolve("Ingest", "Ingest"))
@@ -0,0 +1,47 @@
+import unittest
+from nifiapi.model import Connection, Port, ProcessGroup, Processor
+from nifiapi.topology import FlowGraph
+
+
+def connect(group, source, destination):
+    return Connection("{}-{}".format(source, destination), parent_group_id=group,
+                      source={"id": source, "groupId": group}, destination={"id": destination, "groupId": group})
+
+
+class Test(unittest.TestCase):
+
+    def setUp(self):
+        # source -> mid <-> retry, mid -> [child] in -> sink, mid -> funnel -> log
+        parent = ProcessGroup("pg")
+        parent.processors = [Processor(name, parent_group_id="pg") for name in ("source", "mid", "retry", "log")]
+        parent.connections = [connect("pg", "source", "mid"), connect("pg", "mid", "retry"),
+                              connect("pg", "retry", "mid"), connect("pg", "mid", "in"),
+                              connect("pg", "mid", "funnel"), connect("pg", "funnel", "log"),
+                              connect("pg", "log", "log")]
+        child = ProcessGroup("child", parent_group_id="pg")
+        child.input_ports = [Port("in", parent_group_id="child", port_type=Port.INPUT)]
+        child.processors = [Processor("sink", parent_group_id="child")]
+        child.connections = [connect("child", "in", "sink")]
+        self.graph = FlowGraph()
+        self.graph.add_group(parent)
+        self.graph.add_group(child)
+
+    def names(self, levels):
+        return [sorted(component.id for component in level) for level in levels]
+
+    def test_start_sinks_first(self):
+        self.assertEqual([["log", "sink"], ["in"], ["mid", "retry"], ["source"]],
+                         self.names(self.graph.levels(downstream_first=True)))
+
+    def test_stop_sources_first(self):
+        self.assertEqual([["source"], ["mid", "retry"], ["in"], ["log", "sink"]],
+                         self.names(self.graph.levels(downstream_first=False)))
+
+    def test_cycles_collapse(self):
+        components = [sorted(members) for members in self.graph.strongly_connected_components()]
+        self.assertIn(["mid", "retry"], components)
+        self.assertEqual(5, len(self.graph.processors()))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,44 @@
+import unittest
+import os
+import tempfile
+from nifiapi import trace
+
+
+class Test(unittest.TestCase):
+
+    def test_self_time_and_groups(self):
+        events = [
+            {"name": "start", "ph": "X", "tid": 1, "ts": 0, "dur": 100, "args": {"group": "A"}},
+            {"name": "controller_enable", "ph": "X", "tid": 1, "ts": 10, "dur": 40, "args": {"group": "A"}},
+            {"name": "start", "ph": "X", "tid": 1, "ts": 100, "dur": 50, "args": {"group": "B"}},
+            {"name": "drain", "ph": "X", "tid": 2, "ts": 0, "dur": 30, "args": {}},
+        ]
+        summary = trace.summarize(events)
+        self.assertEqual(2, summary["phases"]["start"]["count"])
+        self.assertAlmostEqual(0.00015, summary["phases"]["start"]["total"])
+        self.assertAlmostEqual(0.00011, summary["phases"]["start"]["self"])
+        self.assertAlmostEqual(0.0001, summary["groups"]["A"])
+        self.assertAlmostEqual(0.00005, summary["groups"]["B"])
+        self.assertAlmostEqual(0.00015, summary["wall_time"])
+
+    def test_nested_spans_inherit_group(self):
+        tracer = trace.Tracer()
+        with tracer.span("stop", group="Ingest", id="pg-1"):
+            with tracer.span("controller_disable"):
+                pass
+        names = dict((event["name"], event) for event in tracer.events)
+        self.assertEqual("Ingest", names["controller_disable"]["args"]["group"])
+        self.assertEqual("pg-1", names["stop"]["args"]["id"])
+        self.assertIn("Ingest", tracer.summary())
+
+        filename = os.path.join(tempfile.mkdtemp(), "trace.json")
+        tracer.export(filename)
+        self.assertEqual(["stop", "controller_disable"], [event["name"] for event in trace.load_trace(filename)])
+
+    def test_null_tracer(self):
+        with trace.NullTracer().span("stop", group="Ingest"):
+            pass
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,39 @@
+import unittest
+from nifiapi import tree
+from nifiapi.test.fixtures import FakeApi, snapshot
+
+
+class Test(unittest.TestCase):
+
+    def setUp(self):
+        self.api = FakeApi({"root": snapshot(
+            "root", "NiFi Flow",
+            snapshot("a", "Ingest", snapshot("a1", "Load-1"), snapshot("a2", "Load-2")),
+            snapshot("b", "Export-S3"),
+            snapshot("c", "Export-Kafka", snapshot("c1", "Load-10")))})
+
+    def test_group_path(self):
+        self.assertEqual("/", tree.group_path(None, "NiFi Flow"))
+        self.assertEqual("/Ingest", tree.group_path("/", "Ingest"))
+        self.assertEqual("/Ingest/Load-1", tree.group_path("/Ingest", "Load-1"))
+
+    def test_status_snapshots(self):
+        status = self.api.get_process_group_status("root")
+        walked = [(snapshot["id"], parent["id"] if parent else None, path, depth)
+                  for snapshot, parent, path, depth in tree.status_snapshots(status)]
+        self.assertEqual([("root", None, "/", 0), ("a", "root", "/Ingest", 1), ("b", "root", "/Export-S3", 1),
+                          ("c", "root", "/Export-Kafka", 1), ("a1", "a", "/Ingest/Load-1", 2),
+                          ("a2", "a", "/Ingest/Load-2", 2), ("c1", "c", "/Export-Kafka/Load-10", 2)], walked)
+
+    def test_list_process_groups(self):
+        groups = tree.list_process_groups(self.api)
+        self.assertEqual([("status", "root", True)], self.api.requests)
+        self.assertEqual(("root", "NiFi Flow", "/"), groups[0])
+        self.assertIn(("c1", "Load-10", "/Export-Kafka/Load-10"), groups)
+
+    def test_list_process_groups_failed(self):
+        self.assertIsNone(tree.list_process_groups(FakeApi({})))
+
+
+if __name__ == "__main__":
+    unittest.main()
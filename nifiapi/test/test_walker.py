@@ -0,0 +1,60 @@
+import unittest
+import threading
+from nifiapi import walker
+from nifiapi.model import ProcessGroup
+
+TREE = {'root': ['a', 'b'], 'a': ['a1', 'a2'], 'b': ['b1'], 'a1': [], 'a2': [], 'b1': []}
+
+
+class Test(unittest.TestCase):
+
+    def setUp(self):
+        self.fetched = []
+        self.lock = threading.Lock()
+
+    def fetch(self, group_id):
+        with self.lock:
+            self.fetched.append(group_id)
+        pg = ProcessGroup(group_id)
+        pg.process_groups = [ProcessGroup(child) for child in TREE[group_id]]
+        return pg
+
+    def walk(self, **kwargs):
+        return [pg.id for pg in walker.walk_process_groups(self.fetch, 'root', **kwargs)]
+
+    def test_bfs(self):
+        self.assertEqual(['root', 'a', 'b', 'a1', 'a2', 'b1'], self.walk(order=walker.BFS))
+
+    def test_dfs(self):
+        self.assertEqual(['root', 'a', 'a1', 'a2', 'b', 'b1'], self.walk(order=walker.DFS))
+
+    def test_no_prefetch(self):
+        self.assertEqual(['root', 'a', 'a1', 'a2', 'b', 'b1'], self.walk(order=walker.DFS, prefetch=0))
+
+    def test_prune(self):
+        self.assertEqual(['root', 'a', 'b', 'b1'], self.walk(prune=lambda pg: pg.id == 'a'))
+        self.assertNotIn('a1', self.fetched)
+
+    def test_each_group_fetched_once(self):
+        self.walk(prefetch=3)
+        self.assertEqual(sorted(TREE), sorted(self.fetched))
+
+    def test_missing_group_skipped(self):
+        def fetch(group_id):
+            return None if group_id == 'a' else self.fetch(group_id)
+        ids = [pg.id for pg in walker.walk_process_groups(fetch, 'root')]
+        self.assertEqual(['root', 'b', 'b1'], ids)
+
+    def test_missing_group_strict(self):
+        def fetch(group_id):
+            return None if group_id == 'a' else self.fetch(group_id)
+        with self.assertRaises(walker.WalkError):
+            list(walker.walk_process_groups(fetch, 'root', strict=True))
+        with self.assertRaises(walker.WalkError):
+            list(walker.walk_process_groups(lambda group_id: None, 'root', strict=True))
+        with self.assertRaises(walker.WalkError):
+            list(walker.walk_process_groups(self.fetch, None, strict=True))
+
+
+if __name__ == "__main__":
+    unittest.main()
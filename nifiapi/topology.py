@@ -0,0 +1,118 @@
+from collections import OrderedDict, defaultdict
+
+from nifiapi.model import Port
+
+
+##
+# The connection graph of a flow: processors and ports as nodes, connections as edges. Groups are added one at a time
+# (e.g. straight from walk_process_groups), so the graph spans every nested group; connections into and out of child
+# groups link their ports to the parent's components. Funnels, remote ports and components outside the walked tree
+# take part in the ordering but are never returned.
+#
+# Cycles (retry loops, self connections) are collapsed into one node, so every component gets a level.
+##
+class FlowGraph:
+
+    def __init__(self):
+        self.components = OrderedDict()
+        self.successors = defaultdict(set)
+        self.predecessors = defaultdict(set)
+
+    def add_group(self, pg):
+        """
+        Add the processors, ports and connections of a process group.
+        :param pg: ProcessGroup with its contents
+        """
+        for component in pg.processors + pg.input_ports + pg.output_ports:
+            self.components[component.id] = component
+        for connection in pg.connections:
+            if connection.source_id is None or connection.destination_id is None:
+                continue
+            self.successors[connection.source_id].add(connection.destination_id)
+            self.predecessors[connection.destination_id].add(connection.source_id)
+
+    def processors(self):
+        """
+        :return: list of the Processors in the graph
+        """
+        return [component for component in self.components.values() if not isinstance(component, Port)]
+
+    def levels(self, downstream_first=True):
+        """
+        Group the components into levels that can each be changed in parallel.
+        :param downstream_first: True to order sinks first and sources last (for starting), False to order sources
+        first and sinks last (for stopping)
+        :return: list of levels, each a list of components
+        """
+        components = self.strongly_connected_components()
+        component_of = {}
+        for index, members in enumerate(components):
+            for node in members:
+                component_of[node] = index
+        # strongly_connected_components returns downstream components before the components feeding them.
+        order = range(len(components)) if downstream_first else range(len(components) - 1, -1, -1)
+        edges = self.successors if downstream_first else self.predecessors
+        depth = {}
+        for index in order:
+            neighbours = set(component_of[neighbour] for node in components[index] for neighbour in edges[node])
+            neighbours.discard(index)
+            depth[index] = 1 + max(depth[neighbour] for neighbour in neighbours) if neighbours else 0
+
+        levels = defaultdict(list)
+        for component_id, component in self.components.items():
+            levels[depth[component_of[component_id]]].append(component)
+        return [levels[level] for level in sorted(levels)]
+
+    def strongly_connected_components(self):
+        """
+        Tarjan's algorithm, without recursion so deep flows can't hit the recursion limit.
+        :return: list of lists of node ids. A component comes before every component with an edge into it.
+        """
+        nodes = list(self.components)
+        for source, destinations in list(self.successors.items()):
+            nodes.append(source)
+            nodes.extend(destinations)
+        index = {}
+        lowlink = {}
+        on_stack = set()
+        stack = []
+        result = []
+        counter = 0
+        for start in nodes:
+            if start in index:
+                continue
+            work = [(start, iter(sorted(self.successors[start])))]
+            index[start] = lowlink[start] = counter
+            counter += 1
+            stack.append(start)
+            on_stack.add(start)
+            while work:
+                node, neighbours = work[-1]
+                advanced = False
+                for neighbour in neighbours:
+                    if neighbour not in index:
+                        index[neighbour] = lowlink[neighbour] = counter
+                        counter += 1
+                        stack.append(neighbour)
+                        on_stack.add(neighbour)
+                        work.append((neighbour, iter(sorted(self.successors[neighbour]))))
+                        advanced = True
+                        break
+                    if neighbour in on_stack:
+                        lowlink[node] = min(lowlink[node], index[neighbour])
+                if advanced:
+                    continue
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    lowlink[parent] = min(lowlink[parent], lowlink[node])
+                if lowlink[node] == index[node]:
+                    members = []
+                    while True:
+                        member = stack.pop()
+                        on_stack.discard(member)
+                        members.append(member)
+                        if member == node:
+                            break
+                    result.append(members)
+        return result
@@ -0,0 +1,153 @@
+import json
+import os
+import threading
+import time
+
+from contextlib import contextmanager
+
+
+##
+# Lightweight timing spans, exported in the Chrome trace event format (load the file in chrome://tracing or
+# https://ui.perfetto.dev). Spans nest per thread; a span without a group inherits the group of the span it runs in,
+# so time can be attributed to process groups without double counting.
+##
+class Tracer:
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.events = []
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.threads = {}
+
+    @contextmanager
+    def span(self, name, category="phase", group=None, **args):
+        """
+        Time the enclosed block.
+        :param name: phase name, e.g. stop, drain, upload
+        :param category: (optional) event category
+        :param group: (optional) name of the process group the work is done for
+        :param args: (optional) extra values shown with the span, e.g. ids
+        """
+        stack = getattr(self.local, "stack", None)
+        if stack is None:
+            stack = self.local.stack = []
+        if group is None and stack:
+            group = stack[-1]
+        stack.append(group)
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            finished = time.monotonic()
+            stack.pop()
+            if group is not None:
+                args["group"] = group
+            event = {"name": name, "cat": category, "ph": "X", "pid": os.getpid(), "tid": self._thread_id(),
+                     "ts": int((started - self.started) * 1000000), "dur": int((finished - started) * 1000000),
+                     "args": args}
+            with self.lock:
+                self.events.append(event)
+
+    def export(self, filename):
+        """
+        Write the spans recorded so far as a Chrome trace event JSON file.
+        :param filename: file to write
+        """
+        with self.lock:
+            events = sorted(self.events, key=lambda e: (e["ts"], -e["dur"]))
+        with open(filename, "w") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+
+    def summary(self, top=10):
+        """
+        :param top: number of phases and groups to list
+        :return: text summary of the slowest phases and groups
+        """
+        with self.lock:
+            events = list(self.events)
+        return format_summary(summarize(events), top)
+
+    def _thread_id(self):
+        # Small, stable thread numbers read better in the trace viewer than thread idents.
+        ident = threading.get_ident()
+        with self.lock:
+            return self.threads.setdefault(ident, len(self.threads) + 1)
+
+
+##
+# Stands in for a Tracer when tracing is off.
+##
+class NullTracer:
+
+    @contextmanager
+    def span(self, name, category="phase", group=None, **args):
+        yield
+
+
+def load_trace(filename):
+    """
+    Read the events of a trace written by Tracer.export.
+    :param filename: trace file
+    :return: list of event dicts
+    """
+    with open(filename) as f:
+        return json.load(f)["traceEvents"]
+
+
+def summarize(events):
+    """
+    Aggregate spans per phase and per process group. Self time is the time of a span minus the time of the spans
+    nested in it, so self times add up to the traced time of each thread.
+    :param events: list of complete ("X") trace events
+    :return: dict with wall_time, phases {name: {count, total, self, max}} and groups {name: self time}, in seconds
+    """
+    phases = {}
+    groups = {}
+    wall_time = 0
+    self_times = {}
+    by_thread = {}
+    for event in events:
+        by_thread.setdefault(event["tid"], []).append(event)
+    for thread_events in by_thread.values():
+        stack = []
+        for event in sorted(thread_events, key=lambda e: (e["ts"], -e["dur"])):
+            while stack and stack[-1]["ts"] + stack[-1]["dur"] <= event["ts"]:
+                stack.pop()
+            if stack:
+                self_times[id(stack[-1])] -= event["dur"]
+            self_times[id(event)] = event["dur"]
+            stack.append(event)
+    for event in events:
+        wall_time = max(wall_time, event["ts"] + event["dur"])
+        seconds = event["dur"] / 1000000.0
+        self_time = self_times[id(event)] / 1000000.0
+        stats = phases.setdefault(event["name"], {"count": 0, "total": 0.0, "self": 0.0, "max": 0.0})
+        stats["count"] += 1
+        stats["total"] += seconds
+        stats["self"] += self_time
+        stats["max"] = max(stats["max"], seconds)
+        group = event.get("args", {}).get("group")
+        if group is not None:
+            groups[group] = groups.get(group, 0.0) + self_time
+    return {"wall_time": wall_time / 1000000.0, "phases": phases, "groups": groups}
+
+
+def format_summary(summary, top=10):
+    """
+    :param summary: result of summarize
+    :param top: number of phases and groups to list
+    :return: text table of the slowest phases (by self time) and process groups
+    """
+    lines = ["Traced {:.2f}s".format(summary["wall_time"]),
+             "{:<32} {:>6} {:>9} {:>9} {:>9}".format("phase", "count", "self (s)", "total (s)", "max (s)")]
+    phases = sorted(summary["phases"].items(), key=lambda item: item[1]["self"], reverse=True)
+    for name, stats in phases[:top]:
+        lines.append("{:<32} {:>6} {:>9.2f} {:>9.2f} {:>9.2f}".format(name, stats["count"], stats["self"],
+                                                                     stats["total"], stats["max"]))
+    groups = sorted(summary["groups"].items(), key=lambda item: item[1], reverse=True)
+    if groups:
+        lines.append("{:<32} {:>9}".format("process group", "self (s)"))
+        for name, seconds in groups[:top]:
+            lines.append("{:<32} {:>9.2f}".format(name, seconds))
+    return "\n".join(lines)
@@ -0,0 +1,38 @@
+from collections import deque
+
+
+def group_path(parent_path, name):
+    """
+    :param parent_path: path of the parent group, None for the group the tree starts from
+    :param name: name of the group
+    :return: path of the group, / for the group the tree starts from
+    """
+    return "/" if parent_path is None else parent_path.rstrip("/") + "/" + name
+
+
+def status_snapshots(status):
+    """
+    Walk the process group snapshots of a recursive status response.
+    :param status: result of NifiApi.get_process_group_status(id, recursive=True)
+    :return: generator of (snapshot, parent snapshot or None, path, depth), parents before their children
+    """
+    pending = deque([(status["processGroupStatus"]["aggregateSnapshot"], None, None, 0)])
+    while pending:
+        snapshot, parent, parent_path, depth = pending.popleft()
+        path = group_path(parent_path, snapshot["name"])
+        yield snapshot, parent, path, depth
+        for child in snapshot.get("processGroupStatusSnapshots") or []:
+            pending.append((child["processGroupStatusSnapshot"], snapshot, path, depth + 1))
+
+
+def list_process_groups(api, root_id="root"):
+    """
+    Every process group in the tree, from a single recursive status request.
+    :param api: NifiApi instance
+    :param root_id: id of the group to start from
+    :return: list of (id, name, path) tuples, parents before their children. None if the request failed.
+    """
+    status = api.get_process_group_status(root_id, recursive=True)
+    if status is None:
+        return None
+    return [(snapshot["id"], snapshot["name"], path) for snapshot, parent, path, depth in status_snapshots(status)]
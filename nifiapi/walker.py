@@ -0,0 +1,77 @@
+import logging
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from nifiapi.model import ProcessGroup
+
+BFS = "bfs"
+DFS = "dfs"
+
+
+class WalkError(Exception):
+    """
+    Raised by a strict walk when a process group can't be fetched.
+    """
+    pass
+
+
+def walk_process_groups(fetch, root, order=BFS, prefetch=4, prune=None, strict=False):
+    """
+    Lazily walk a tree of process groups, yielding each group with its contents. While the caller works on one group
+    the next `prefetch` groups in walk order are fetched in the background. Only ids are queued for groups that
+    haven't been reached yet, so at most `prefetch` groups are held in memory ahead of the caller.
+    :param fetch: callable taking a process group id and returning a ProcessGroup (or None if it failed)
+    :param root: id of the group to start from, or an already fetched processGroupFlow/ProcessGroup
+    :param order: BFS or DFS (pre-order)
+    :param prefetch: number of groups to fetch ahead. 0 disables prefetching.
+    :param prune: (optional) callable taking a ProcessGroup. If it returns True the group's children are skipped.
+    :param strict: raise WalkError if a group can't be fetched. Otherwise it is logged and skipped together with its
+    children, which is only right for callers that can live with a partial tree.
+    :return: generator of ProcessGroup
+    """
+    if order not in (BFS, DFS):
+        raise ValueError("Unknown walk order {}".format(order))
+    logger = logging.getLogger(__name__)
+    frontier = deque()
+    pending = {}
+    group = None
+    if isinstance(root, str):
+        frontier.append(root)
+    else:
+        group = ProcessGroup.of(root)
+        if group is None and strict:
+            raise WalkError("No process group to walk")
+    pool = ThreadPoolExecutor(max_workers=prefetch) if prefetch > 0 else None
+    try:
+        while group is not None or frontier:
+            if group is None:
+                group_id = frontier.popleft() if order == BFS else frontier.pop()
+                future = pending.pop(group_id, None)
+                group = future.result() if future is not None else fetch(group_id)
+                if group is None and strict:
+                    raise WalkError("Could not get process group {}".format(group_id))
+                if group is None:
+                    logger.error("Could not get process group {}. Skipping it and its children.".format(group_id))
+                    continue
+
+            if prune is None or not prune(group):
+                children = [child.id for child in group.process_groups]
+                if order == BFS:
+                    frontier.extend(children)
+                else:
+                    frontier.extend(reversed(children))
+
+            if pool is not None:
+                upcoming = iter(frontier) if order == BFS else reversed(frontier)
+                for group_id in upcoming:
+                    if len(pending) >= prefetch:
+                        break
+                    if group_id not in pending:
+                        pending[group_id] = pool.submit(fetch, group_id)
+
+            current, group = group, None
+            yield current
+    finally:
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)